@@ -1,4 +1,6 @@
+import time
 import itertools
+import threading
 from datetime import datetime
 
 import pandas as pd
@@ -16,6 +18,41 @@ def get_container_ipaddr(container: DockerContainer) -> str:
     return str(ipaddr)
 
 
+CONTAINER_IPADDR_TTL_SECONDS = 300
+_containers_ipaddrs = {'expires_at': 0.0, 'ipaddrs': {}}
+_containers_ipaddrs_lock = threading.Lock()
+
+
+def find_container_ipaddr(
+    container_name: str, 
+    ttl_seconds: float=CONTAINER_IPADDR_TTL_SECONDS,
+) -> str:
+    """Returns the ipaddr of the only running docker container, which name contains container_name.
+    Containers are listed once and their ipaddrs are cached for ttl_seconds for the whole process, 
+    so that docker socket isn't queried on every client creation"""
+
+    with _containers_ipaddrs_lock:
+        if time.monotonic() >= _containers_ipaddrs['expires_at']:
+            docker_client = docker.from_env()
+            _containers_ipaddrs['ipaddrs'] = {
+                str(container.name).lower(): get_container_ipaddr(container) 
+                for container in docker_client.containers.list()
+            }
+            _containers_ipaddrs['expires_at'] = time.monotonic() + ttl_seconds
+        ipaddrs = [
+            ipaddr for name, ipaddr in _containers_ipaddrs['ipaddrs'].items() 
+            if container_name.lower() in name
+        ]
+    assert len(ipaddrs) == 1, f'There should be only one {container_name} container!'
+    return ipaddrs[0]
+
+
+def clear_containers_ipaddrs_cache() -> None:
+    """Makes the next find_container_ipaddr call list containers again (ex. after containers were restarted)"""
+    with _containers_ipaddrs_lock:
+        _containers_ipaddrs['expires_at'] = 0.0
+
+
 def prepare_date(date_col: pd.Series) -> pd.Series:
     """convert 'date' column of dataframe from raw_data.all_fights_info to datetime format"""
 
@@ -9,27 +9,34 @@ if 'PYTHONPATH' in os.environ:
 else:
 	PROJECT_PATH = '..'
 
-import docker
+import io
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL
 from sqlalchemy.engine.base import Engine
 
-from src.common_utils import get_container_ipaddr  
+from src.common_utils import find_container_ipaddr
 
 
-def get_pg_engine(
+_pg_engines = {}
+_pg_engines_lock = threading.Lock()
+
+
+def get_pg_credentials(
     postgress_user: t.Optional[str]=None,
     postgress_password: t.Optional[str]=None,
     postgress_ipaddr: t.Optional[str]=None,
-) -> Engine:
-    """Returns initialized engine to use is in pd.sql('...', engine)"""
-    
-    if postgress_ipaddr is None:
-        docker_client = docker.from_env()
-        pg_container = [container for container in docker_client.containers.list() 
-        if 'pgdatabase' in str(container.name).lower()]
-        assert len(pg_container) == 1, 'There should be only one postgres container!'
-        pg_container = pg_container[0]
-        postgress_ipaddr = get_container_ipaddr(pg_container)
+) -> t.Tuple[str, str, str]:
+    """Returns (user, password, ipaddr) of postgres. Not given ones are taken from POSTGRES_USER, 
+    POSTGRES_PASSWORD and POSTGRES_IPADDR env variables (.env included). POSTGRES_IPADDR takes precedence 
+    over the pgdatabase container, whose ipaddr is used only if POSTGRES_IPADDR isn't set (see Readme)"""
 
     if (
           postgress_user is None or 
@@ -49,11 +56,128 @@ def get_pg_engine(
     )
     postgress_ipaddr = (
 	    postgress_ipaddr if postgress_ipaddr is not None
-	    else os.getenv("POSTGRES_IPADDR", "")
+	    else os.getenv("POSTGRES_IPADDR") or find_container_ipaddr(container_name='pgdatabase')
+    )
+    return postgress_user, postgress_password, postgress_ipaddr
+
+
+def get_pg_engine(
+    postgress_user: t.Optional[str]=None,
+    postgress_password: t.Optional[str]=None,
+    postgress_ipaddr: t.Optional[str]=None,
+    postgress_port: int=5432,
+    postgress_db: t.Optional[str]=None,
+) -> Engine:
+    """Returns initialized engine to use is in pd.sql('...', engine).
+    Not given credentials are taken from env variables or the postgres container (see get_pg_credentials),
+    postgress_db defaults to the user's database (as psql does). 
+    Engine keeps a connection pool, so one engine per (ipaddr, port, user, db) is created lazily and reused 
+    by the whole process. Pooled connections are checked before use (pool_pre_ping) 
+    instead of opening a throwaway connection on every call"""
+
+    postgress_user, postgress_password, postgress_ipaddr = get_pg_credentials(
+        postgress_user=postgress_user,
+        postgress_password=postgress_password,
+        postgress_ipaddr=postgress_ipaddr,
+    )
+    postgress_db = postgress_db if postgress_db is not None else postgress_user
+    # password isn't a part of the key, so it's never kept in plain text outside of the engine
+    engine_key = (postgress_ipaddr, postgress_port, postgress_user, postgress_db)
+    with _pg_engines_lock:
+        if engine_key not in _pg_engines:
+            eng = create_engine(
+                URL.create(
+                    drivername='postgresql+psycopg2',
+                    username=postgress_user,
+                    password=postgress_password,
+                    host=postgress_ipaddr,
+                    port=postgress_port,
+                    database=postgress_db,
+                ),
+                pool_pre_ping=True,
+            )
+            # checking engine creation
+            with eng.connect():
+                pass
+            _pg_engines[engine_key] = eng
+    return _pg_engines[engine_key]
+
+
+async def create_pg_pool(
+    postgress_user: t.Optional[str]=None,
+    postgress_password: t.Optional[str]=None,
+    postgress_ipaddr: t.Optional[str]=None,
+    postgress_port: int=5432,
+    postgress_db: t.Optional[str]=None,
+    min_size: int=1,
+    max_size: int=4,
+) -> 'asyncpg.Pool':
+    """Returns asyncpg connection pool to the same database get_pg_engine connects to.
+    The pool belongs to the running event loop, so it should be closed (or used as async context manager) there"""
+    assert asyncpg is not None, 'asyncpg should be installed to load data to postgres asynchronously!'
+    postgress_user, postgress_password, postgress_ipaddr = get_pg_credentials(
+        postgress_user=postgress_user,
+        postgress_password=postgress_password,
+        postgress_ipaddr=postgress_ipaddr,
     )
-    
-    eng = create_engine(
-        f'postgresql+psycopg2://{postgress_user}:{postgress_password}@{postgress_ipaddr}'
+    return await asyncpg.create_pool(
+        user=postgress_user,
+        password=postgress_password,
+        host=postgress_ipaddr,
+        port=postgress_port,
+        database=postgress_db if postgress_db is not None else postgress_user,
+        min_size=min_size,
+        max_size=max_size,
     )
-    eng.connect()
-    return eng
+
+
+class DeferredCommitLoad:
+    """Runs async load in a background thread with its own event loop, so that it overlaps with whatever 
+    the caller does meanwhile (ex. saving the same data to minio). load gets commit_signal future and 
+    should commit its transaction only if commit_signal resolves to something other than None: 
+    commit(value) resolves it to value (ex. revision of the saved data) and returns load's result, 
+    rollback() resolves it to None
+
+    Args:
+        load: coroutine function, which takes commit_signal
+    """
+
+    def __init__(self, load: t.Callable[[Future], t.Awaitable[t.Any]]):
+        self._commit_signal = Future()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._result = self._executor.submit(asyncio.run, load(self._commit_signal))
+        self._executor.shutdown(wait=False)
+
+    def commit(self, value: t.Any=True) -> t.Any:
+        assert value is not None, 'None means rollback!'
+        if not self._commit_signal.done():
+            self._commit_signal.set_result(value)
+        return self._result.result()
+
+    def rollback(self) -> None:
+        if not self._commit_signal.done():
+            self._commit_signal.set_result(None)
+        # waiting for the load to finish, its errors don't matter anymore
+        self._result.exception()
+
+
+def _copy_text_value(value: t.Any) -> str:
+    """Formats value for COPY ... FROM STDIN text format (None -> NULL)"""
+    if value is None or (isinstance(value, float) and value != value):
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(
+    cursor: t.Any, 
+    table_sql: str, 
+    columns: t.List[str], 
+    rows: t.Iterable[t.Dict[str, t.Any]],
+) -> None:
+    """Streams rows (dicts, missing keys are NULL) into table_sql (ex. '"raw_data"."all_fights_info"') 
+    with COPY FROM STDIN using psycopg2 cursor"""
+    rows_text = io.StringIO(''.join(
+        '\t'.join(_copy_text_value(row.get(column)) for column in columns) + '\n' for row in rows
+    ))
+    columns_sql = ', '.join(f'"{column}"' for column in columns)
+    cursor.copy_expert(f'COPY {table_sql} ({columns_sql}) FROM STDIN', rows_text)
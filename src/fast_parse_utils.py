@@ -0,0 +1,167 @@
+import os
+import sys
+from typing import List, Tuple, Dict, Set, Any, Optional, Callable, Union
+if 'PYTHONPATH' in os.environ:
+	PROJECT_PATH = os.environ["PYTHONPATH"]
+	sys.path.insert(0, PROJECT_PATH)
+else:
+	PROJECT_PATH = '..'
+
+from lxml import etree
+from bs4.dammit import EncodingDetector
+
+
+def _find_all(tag: str, class_name: str) -> etree.XPath:
+	"""
+	Returns precompiled xpath, which finds the same descendants as BeautifulSoup's
+	.find_all(tag, {'class': class_name}): when class_name contains spaces the whole class
+	attribute should match, otherwise class_name should be one of element's classes
+	"""
+	if ' ' in class_name:
+		condition = f"normalize-space(@class)='{class_name}'"
+	else:
+		condition = f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+	return etree.XPath(f".//{tag}[{condition}]")
+
+
+_PERSONS = _find_all('div', 'b-fight-details__persons clearfix')
+_PERSON = _find_all('div', 'b-fight-details__person')
+_PERSON_TEXT = _find_all('div', 'b-fight-details__person-text')
+_PERSON_NAME = _find_all('h3', 'b-fight-details__person-name')
+_PERSON_LINK = _find_all('a', 'b-link b-fight-details__person-link')
+_PERSON_STATUS = _find_all('i', 'b-fight-details__person-status')
+_FIGHT = _find_all('div', 'b-fight-details__fight')
+_FIGHT_TITLE = _find_all('i', 'b-fight-details__fight-title')
+_FIGHT_CONTENT = _find_all('div', 'b-fight-details__content')
+_SECTION = _find_all('section', 'b-fight-details__section js-fight-section')
+_TABLE = _find_all('table', 'b-fight-details__table js-fight-table')
+_TABLE_HEAD = _find_all('thead', 'b-fight-details__table-head_rnd')
+_TABLE_BODY = _find_all('tbody', 'b-fight-details__table-body')
+_TABLE_ROW = _find_all('tr', 'b-fight-details__table-row')
+_ROUND_HEAD = _find_all('thead', 'b-fight-details__table-row b-fight-details__table-row_type_head')
+_TABLE_TH = _find_all('th', 'b-fight-details__table-col')
+_TABLE_TD = _find_all('td', 'b-fight-details__table-col')
+_TABLE_TEXT = _find_all('p', 'b-fight-details__table-text')
+
+
+def _contents(element: etree._Element) -> List[Union[str, etree._Element]]:
+	"""Returns element's children the way BeautifulSoup's Tag.contents does: text chunks and elements"""
+	contents = [element.text] if element.text else []
+	for child in element:
+		# comments and processing instructions are strings in BeautifulSoup
+		contents.append(child if isinstance(child.tag, str) else (child.text or ''))
+		if child.tail:
+			contents.append(child.tail)
+	return contents
+
+
+def _to_str(node: Union[str, etree._Element]) -> str:
+	if isinstance(node, str):
+		return node
+	return etree.tostring(node, method='html', encoding='unicode', with_tail=False)
+
+
+def _fight_page_root(content: bytes) -> etree._Element:
+	"""Parses raw page with lxml using the same encoding BeautifulSoup(content, 'lxml') would choose"""
+	detector = EncodingDetector(content, is_html=True)
+	encoding = next(iter(detector.encodings), None)
+	parser = etree.HTMLParser(recover=True, strip_cdata=False, encoding=encoding)
+	return etree.fromstring(detector.markup, parser=parser)
+
+
+def _fighters_names(root: etree._Element) -> List[str]:
+	return [_contents(_PERSON_LINK(name)[0])[0].strip() for name in _PERSON_NAME(root)]
+
+
+def _fight_name(root: etree._Element) -> str:
+	return _contents(_FIGHT_TITLE(_FIGHT(root)[0])[0])[-1].strip().lower()
+
+
+def _winloose_status(root: etree._Element) -> Dict[str, str]:
+	persons = _PERSON(_PERSONS(root)[0])
+	assert len(persons) == 2, f'expected to see only 2 person, but got {len(persons)}!'
+
+	resulting_dict = {}
+	for person in persons:
+		name = _contents(_contents(_PERSON_NAME(_PERSON_TEXT(person)[0])[0])[1])[0].strip()
+		resulting_dict[name] = _contents(_PERSON_STATUS(person)[0])[0].strip()
+	return resulting_dict
+
+
+def _fight_details(root: etree._Element) -> Dict[str, str]:
+	details = _contents(_contents(_FIGHT_CONTENT(_FIGHT(root)[0])[0])[1])
+	details_dict = {}
+	for i in range(1, len(details), 2):
+		needed_rows = [val for val in _contents(details[i]) if _to_str(val).strip() != '']
+		if len(needed_rows) > 2:
+			print(f'Expected to see 2 rows, but {len(needed_rows)} arge given!')
+		key, value = [
+			_to_str(_contents(row)[0] if not isinstance(row, str) else row).strip()
+			for row in needed_rows[:2]
+		]
+		details_dict[key] = value
+	return details_dict
+
+
+def _stats_table(section: etree._Element) -> Dict[str, Dict[str, List[str]]]:
+	stats_table = _TABLE(section)[0]
+	stats_table_columns = [
+		_contents(name)[0].strip() for name in _TABLE_TH(_TABLE_ROW(_TABLE_HEAD(stats_table)[0])[0])
+	]
+	table_body = _TABLE_BODY(stats_table)[0]
+	rounds = [_contents(_TABLE_TH(round_)[0])[0].strip() for round_ in _ROUND_HEAD(table_body)]
+
+	stats_per_rounds_dict = {}
+	for round_number, one_round in enumerate(_TABLE_ROW(table_body)):
+		stats_per_rounds_dict[rounds[round_number]] = {}
+		for i, elem in enumerate(_TABLE_TD(one_round)):
+			elem_list = _TABLE_TEXT(elem)
+			if i == 0:
+				elem_list = [
+					[_contents(val)[0] for val in _contents(elem) if _to_str(val).lower().strip() != ''][0].strip()
+					for elem in elem_list
+				]
+			else:
+				elem_list = [_contents(val)[0].strip() for val in elem_list]
+			stats_per_rounds_dict[rounds[round_number]][stats_table_columns[i]] = elem_list
+	return stats_per_rounds_dict
+
+
+def _per_round_stats(root: etree._Element) -> Dict[str, Any]:
+	# [2] - total strikes table, [4] - significant strikes table
+	sections = _SECTION(root)
+	total_stats_dict = _stats_table(sections[2])
+	signif_strikes_dict = _stats_table(sections[4])
+	return {
+		round_number: {
+			**total_stats_dict.get(round_number, {}),
+			**signif_strikes_dict.get(round_number, {})
+		}
+		for round_number in total_stats_dict
+	}
+
+
+def parse_one_fight_page_fast(content: bytes) -> Dict[Any, Any]:
+	"""
+	Returns the same fight statistics as parse_utils.parse_one_fight_page(BeautifulSoup(content, 'lxml')),
+	but parses raw page with lxml once and extracts every field with precompiled xpaths
+	instead of walking BeautifulSoup tree with find_all for every field
+
+	Args:
+		content: raw fight page (ex. http://www.ufcstats.com/fight-details/72c3e5eacde4f0e5)
+	Returns:
+		fight_stats_dict: see parse_utils.get_one_fight_stats for example
+	"""
+
+	root = _fight_page_root(content)
+	fight_stats_dict = {}
+	fight_stats_dict['names'] = _fighters_names(root)
+	fight_stats_dict['fight_name'] = _fight_name(root)
+	fight_stats_dict['winloose'] = _winloose_status(root)
+	fight_stats_dict.update(_fight_details(root))
+	try:
+		fight_stats_dict['per_round_stats'] = _per_round_stats(root)
+	except Exception as e:
+		print("can't get per round statistics!")
+		print(e, end='\n\n')
+	return fight_stats_dict
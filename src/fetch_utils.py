@@ -0,0 +1,365 @@
+import os
+import sys
+import time
+import gzip
+import json
+import hashlib
+import asyncio
+from abc import ABC, abstractmethod
+from datetime import datetime
+from urllib.parse import urlparse
+import typing as t
+
+if 'PYTHONPATH' in os.environ:
+	PROJECT_PATH = os.environ["PYTHONPATH"]
+	sys.path.insert(0, PROJECT_PATH)
+else:
+	PROJECT_PATH = '..'
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+DEFAULT_HEADERS = {
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+
+class PageFetcher(ABC):
+    """Base class for everything that can turn page url into raw page content. Fetchers, which make 
+    http requests, also override optional fetch, so that cached pages could be revalidated through them 
+    with conditional GET (see CachingFetcher)"""
+
+    @abstractmethod
+    def get(self, url: str) -> bytes:
+        """Returns raw content of the page or raises if there is no such page"""
+
+    def fetch(self, url: str, headers: t.Optional[t.Dict[str, str]]=None) -> requests.Response:
+        """Makes GET request with headers and returns the whole response (with status code and headers)"""
+        raise NotImplementedError(f"{type(self).__name__} can't make conditional requests!")
+
+    @property
+    def can_fetch(self) -> bool:
+        """Whether the fetcher implements fetch"""
+        return type(self).fetch is not PageFetcher.fetch
+
+
+def raise_for_status(response: requests.Response) -> None:
+    """Raises requests.HTTPError on any non-2xx response, so that error pages are never parsed as fights"""
+    if not 200 <= response.status_code < 300:
+        raise requests.HTTPError(f'{response.status_code} response for url: {response.url}', response=response)
+
+
+class HttpFetcher(PageFetcher):
+    """Downloads pages through one requests.Session with keep-alive connection pool,
+    so that consecutive requests to ufcstats.com reuse already opened connections
+
+    Args:
+        pool_maxsize: max number of connections kept alive per host
+        max_retries: how many times to retry failed connections and 429/5xx responses 
+            (get raises if the last response is still not 2xx)
+        backoff_factor: retries are made after backoff_factor * 2**(retry_number - 1) seconds
+        connect_timeout: seconds to wait for connection to be established
+        read_timeout: seconds to wait for server response
+    """
+
+    def __init__(
+        self,
+        pool_maxsize: int=10,
+        max_retries: int=3,
+        backoff_factor: float=0.5,
+        connect_timeout: float=5.0,
+        read_timeout: float=30.0,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(
+            pool_connections=pool_maxsize,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(
+                total=max_retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=[429, 500, 502, 503, 504],
+                raise_on_status=False,
+            ),
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url: str, headers: t.Optional[t.Dict[str, str]]=None) -> requests.Response:
+        """Makes GET request and returns the whole response"""
+        return self.session.get(url, headers=headers, timeout=self.timeout)
+
+    def get(self, url: str) -> bytes:
+        response = self.fetch(url)
+        raise_for_status(response)
+        return response.content
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_default_fetcher = None
+
+def get_default_fetcher() -> HttpFetcher:
+    """Returns process-wide HttpFetcher, which is used when no fetcher is passed explicitly"""
+    global _default_fetcher
+    if _default_fetcher is None:
+        _default_fetcher = HttpFetcher()
+    return _default_fetcher
+
+
+class PageCache:
+    """On-disk cache of raw pages. Every page is stored gzipped under sha256 of its url 
+    (<cache_dir>/<first 2 hash chars>/<hash>.html.gz) together with <hash>.json file 
+    containing url, ETag, Last-Modified and the time when page was fetched
+
+    Args:
+        cache_dir: directory where to keep cached pages
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url: str) -> t.Tuple[str, str]:
+        url_hash = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        page_dir = os.path.join(self.cache_dir, url_hash[:2])
+        return (
+            os.path.join(page_dir, url_hash + '.html.gz'),
+            os.path.join(page_dir, url_hash + '.json'),
+        )
+
+    def __contains__(self, url: str) -> bool:
+        content_path, meta_path = self._paths(url)
+        return os.path.exists(content_path) and os.path.exists(meta_path)
+
+    def get(self, url: str) -> t.Optional[bytes]:
+        """Returns cached page content or None if url isn't cached"""
+        content_path, _ = self._paths(url)
+        try:
+            with gzip.open(content_path, mode='rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def get_meta(self, url: str) -> t.Optional[t.Dict[str, t.Any]]:
+        """Returns {'url': ..., 'etag': ..., 'last_modified': ..., 'fetched_at': ...} or None if url isn't cached"""
+        _, meta_path = self._paths(url)
+        try:
+            with open(meta_path, mode='r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def conditional_headers(self, url: str) -> t.Dict[str, str]:
+        """Returns If-None-Match/If-Modified-Since headers to revalidate cached page with"""
+        meta = self.get_meta(url) or {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def put(
+        self, 
+        url: str, 
+        content: bytes, 
+        etag: t.Optional[str]=None, 
+        last_modified: t.Optional[str]=None,
+    ) -> None:
+        """Saves page content and its metadata. Files are written to temporary paths first and then
+        renamed, so that interrupted write never leaves broken page in cache"""
+        content_path, meta_path = self._paths(url)
+        os.makedirs(os.path.dirname(content_path), exist_ok=True)
+        with gzip.open(content_path + '.tmp', mode='wb') as f:
+            f.write(content)
+        os.replace(content_path + '.tmp', content_path)
+        self._write_meta(
+            meta_path=meta_path,
+            meta={
+                'url': url,
+                'etag': etag,
+                'last_modified': last_modified,
+                'fetched_at': datetime.now().isoformat(),
+            }
+        )
+
+    def touch(self, url: str) -> None:
+        """Updates fetch time of the page, which was revalidated and didn't change"""
+        _, meta_path = self._paths(url)
+        meta = self.get_meta(url)
+        if meta is not None:
+            meta['fetched_at'] = datetime.now().isoformat()
+            self._write_meta(meta_path=meta_path, meta=meta)
+
+    @staticmethod
+    def _write_meta(meta_path: str, meta: t.Dict[str, t.Any]) -> None:
+        with open(meta_path + '.tmp', mode='w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(meta_path + '.tmp', meta_path)
+
+
+class CachingFetcher(PageFetcher):
+    """Serves pages from PageCache and downloads (and caches) only pages that aren't there yet
+
+    Args:
+        cache: where to keep downloaded pages
+        fetcher: what to download missing pages with. If None - shared HttpFetcher is used
+        revalidate: if True - every cached page is revalidated with conditional GET and 
+            downloaded again only if server says it has changed. Requires fetcher, which implements fetch
+    """
+
+    def __init__(
+        self,
+        cache: PageCache,
+        fetcher: t.Optional[PageFetcher]=None,
+        revalidate: bool=False,
+    ):
+        self.cache = cache
+        self.fetcher = fetcher if fetcher is not None else get_default_fetcher()
+        self.revalidate = revalidate
+        assert not revalidate or self.fetcher.can_fetch, \
+            f"{type(self.fetcher).__name__} doesn't implement fetch, so cached pages can't be revalidated with it!"
+
+    def get(self, url: str) -> bytes:
+        content = self.cache.get(url)
+        if content is not None and not self.revalidate:
+            return content
+
+        if not self.fetcher.can_fetch:
+            content = self.fetcher.get(url)
+            self.cache.put(url=url, content=content)
+            return content
+
+        headers = self.cache.conditional_headers(url) if content is not None else {}
+        response = self.fetcher.fetch(url, headers=headers or None)
+        if response.status_code == 304 and content is not None:
+            self.cache.touch(url)
+            return content
+        raise_for_status(response)
+        if response.status_code == 200:
+            self.cache.put(
+                url=url,
+                content=response.content,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+            )
+        return response.content
+
+
+class RecordingFetcher(PageFetcher):
+    """Downloads every page and records it to corpus, so that the run can be replayed
+    later with ReplayFetcher without network
+
+    Args:
+        corpus: where to record pages
+        fetcher: what to download pages with. If None - shared HttpFetcher is used
+    """
+
+    def __init__(self, corpus: PageCache, fetcher: t.Optional[PageFetcher]=None):
+        self.corpus = corpus
+        self.fetcher = fetcher if fetcher is not None else get_default_fetcher()
+
+    def get(self, url: str) -> bytes:
+        content = self.fetcher.get(url)
+        self.corpus.put(url=url, content=content)
+        return content
+
+
+class ReplayFetcher(PageFetcher):
+    """Serves pages recorded by RecordingFetcher and never goes to network
+
+    Args:
+        corpus: recorded pages
+    """
+
+    def __init__(self, corpus: PageCache):
+        self.corpus = corpus
+
+    def get(self, url: str) -> bytes:
+        content = self.corpus.get(url)
+        if content is None:
+            raise KeyError(f'{url} is not in the recorded corpus {self.corpus.cache_dir}!')
+        return content
+
+
+class AsyncRateLimiter:
+    """Spaces out requests to the same host, so that there are
+    no more than requests_per_second requests to one host per second"""
+
+    def __init__(self, requests_per_second: float=10.0):
+        assert requests_per_second > 0, 'requests_per_second should be positive!'
+        self.min_interval = 1.0 / requests_per_second
+        self._next_slot = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, url: str) -> None:
+        """Sleeps until the next request to the url's host is allowed"""
+        host = urlparse(url).netloc
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def fetch_page_async(
+    session: aiohttp.ClientSession,
+    url: str,
+    semaphore: asyncio.Semaphore,
+    rate_limiter: t.Optional[AsyncRateLimiter]=None,
+    page_cache: t.Optional[PageCache]=None,
+    revalidate: bool=False,
+    max_retries: int=3,
+    retry_delay_seconds: float=1.0,
+) -> bytes:
+    """Downloads url and returns raw page content
+
+    Args:
+        session: aiohttp session to make the request with
+        url: page to download
+        semaphore: bounds the number of requests in flight
+        rate_limiter: if not None - spaces out requests to the same host
+        page_cache: if not None - page is taken from it when cached and saved to it after download
+        revalidate: whether to revalidate cached page with conditional GET
+        max_retries: how many times to retry failed request
+        retry_delay_seconds: delay before the first retry, doubled on every next one
+    Returns:
+        bytes: page content
+    """
+
+    cached_content = page_cache.get(url) if page_cache is not None else None
+    if cached_content is not None and not revalidate:
+        return cached_content
+    headers = page_cache.conditional_headers(url) if cached_content is not None else {}
+
+    for attempt in range(max_retries + 1):
+        async with semaphore:
+            if rate_limiter is not None:
+                await rate_limiter.wait(url)
+            try:
+                async with session.get(url, headers=headers or None) as response:
+                    if response.status == 304 and cached_content is not None:
+                        page_cache.touch(url)
+                        return cached_content
+                    response.raise_for_status()
+                    content = await response.read()
+                    if page_cache is not None:
+                        page_cache.put(
+                            url=url,
+                            content=content,
+                            etag=response.headers.get('ETag'),
+                            last_modified=response.headers.get('Last-Modified'),
+                        )
+                    return content
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == max_retries:
+                    raise
+        await asyncio.sleep(retry_delay_seconds * 2**attempt)
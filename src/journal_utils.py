@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import typing as t
+
+if 'PYTHONPATH' in os.environ:
+	PROJECT_PATH = os.environ["PYTHONPATH"]
+	sys.path.insert(0, PROJECT_PATH)
+else:
+	PROJECT_PATH = '..'
+
+
+def _load_jsonl(path: str) -> t.List[t.Dict[str, t.Any]]:
+    """Reads json lines file. If the process was killed in the middle of writing a line,
+    the file is truncated to the last complete line, so that the next lines are appended correctly"""
+    records = []
+    if not os.path.exists(path):
+        return records
+    good_size = 0
+    with open(path, mode='rb') as f:
+        for line in f:
+            try:
+                if not line.endswith(b'\n'):
+                    raise ValueError('incomplete line')
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            good_size += len(line)
+    if good_size != os.path.getsize(path):
+        with open(path, mode='r+b') as f:
+            f.truncate(good_size)
+    return records
+
+
+def remove_journal(journal_path: str) -> None:
+    """Removes journal files written by FightsJournal(journal_path)"""
+    for path in [journal_path, journal_path + '.events']:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class FightsJournal:
+    """Append-only journal of parsed fights, which lets long crawl resume after a crash.
+    Every parsed fight is written as one json line to journal_path and flushed to disk right away.
+    When all fights of an event are parsed, a line {"event_uri": ..., "fight_uris": [...]} is written
+    to <journal_path>.events, so that on resume even the event page doesn't have to be downloaded again
+
+    Args:
+        journal_path: where to keep the journal
+        resume: if True - fights and events already in the journal are loaded, otherwise the journal is cleared
+    """
+
+    def __init__(self, journal_path: str, resume: bool=True):
+        self.journal_path = journal_path
+        self.events_path = journal_path + '.events'
+        os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+        if not resume:
+            remove_journal(journal_path=journal_path)
+        self.fights = {record['fight_uri']: record for record in _load_jsonl(self.journal_path)}
+        self.events = {
+            record['event_uri']: record['fight_uris'] for record in _load_jsonl(self.events_path)
+        }
+        self._fights_file = open(self.journal_path, mode='a', encoding='utf-8')
+        self._events_file = open(self.events_path, mode='a', encoding='utf-8')
+
+    def __contains__(self, fight_uri: str) -> bool:
+        return fight_uri in self.fights
+
+    def __len__(self) -> int:
+        return len(self.fights)
+
+    def get(self, fight_uri: str) -> t.Optional[t.Dict[str, t.Any]]:
+        return self.fights.get(fight_uri)
+
+    def get_event_fights(self, event_uri: str) -> t.Optional[t.List[t.Dict[str, t.Any]]]:
+        """Returns all fights of the event in the order they are on the event page
+        or None if the event isn't fully parsed yet"""
+        if event_uri not in self.events:
+            return None
+        return [self.fights[fight_uri] for fight_uri in self.events[event_uri]]
+
+    @staticmethod
+    def _append(f: t.TextIO, record: t.Dict[str, t.Any]) -> None:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+    def write_fight(self, fight_stats_dict: t.Dict[str, t.Any]) -> None:
+        """Journals one parsed fight (it should have fight_uri key)"""
+        if fight_stats_dict['fight_uri'] in self.fights:
+            return
+        self._append(self._fights_file, fight_stats_dict)
+        self.fights[fight_stats_dict['fight_uri']] = fight_stats_dict
+
+    def write_event(self, event_uri: str, fight_uris: t.List[str]) -> None:
+        """Marks event as fully parsed. All its fights should be journaled already"""
+        if event_uri in self.events:
+            return
+        self._append(self._events_file, {'event_uri': event_uri, 'fight_uris': fight_uris})
+        self.events[event_uri] = fight_uris
+
+    def close(self) -> None:
+        self._fights_file.close()
+        self._events_file.close()
+
+    def clear(self) -> None:
+        """Removes the journal, e.g. when its fights are safely saved elsewhere"""
+        self.close()
+        remove_journal(journal_path=self.journal_path)
+
+    def __enter__(self) -> 'FightsJournal':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
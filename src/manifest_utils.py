@@ -0,0 +1,335 @@
+import os
+import sys
+import json
+import hashlib
+from datetime import datetime
+import typing as t
+
+if 'PYTHONPATH' in os.environ:
+	PROJECT_PATH = os.environ["PYTHONPATH"]
+	sys.path.insert(0, PROJECT_PATH)
+else:
+	PROJECT_PATH = '..'
+
+import minio
+from minio.error import S3Error
+
+from src.processing import fight_fingerprint
+from src.minio_utils import event_partition_name, load_json_from_minio, save_json_to_minio
+
+
+MANIFEST_VERSION = 1
+
+
+def manifest_object_name(
+    object_name: t.Optional[str]=None,
+    events_prefix: t.Optional[str]=None,
+) -> str:
+    """Returns name of the manifest kept alongside fights saved to object_name
+    (ex. ufc_stats.manifest.json) or partitioned under events_prefix (ex. events.manifest.json)"""
+    assert (object_name is None) != (events_prefix is None), \
+        'Exactly one of object_name and events_prefix should be passed!'
+    if events_prefix is not None:
+        return events_prefix.rstrip('/') + '.manifest.json'
+    return os.path.splitext(object_name)[0] + '.manifest.json'
+
+
+def new_manifest() -> t.Dict[str, t.Any]:
+    """Returns manifest of empty dataset:
+        {
+            'version': 1,
+            'revision': 3,  # number of saves with changes, see save_changes_to_minio
+            'updated_at': '2023-05-20T12:00:00',
+            'n_events': 1,
+            'n_fights': 2,
+            'objects': {'ufc_stats.json': <sha256 of saved object>},
+            'events': {
+                'http://www.ufcstats.com/event-details/...': {
+                    'object_name': 'ufc_stats.json',
+                    'n_fights': 2,
+                    'fingerprint': <event_fingerprint>,
+                }
+            },
+        }
+    Fingerprints of every fight are kept in a separate object per event (see save_fingerprints_to_minio), 
+    so the manifest stays small"""
+    return {
+        'version': MANIFEST_VERSION,
+        'revision': 0,
+        'updated_at': None,
+        'n_events': 0,
+        'n_fights': 0,
+        'objects': {},
+        'events': {},
+    }
+
+
+def get_events_fingerprints(
+    fights: t.Iterable[t.Dict[str, t.Any]],
+) -> t.Dict[str, t.Dict[str, str]]:
+    """Returns {event_uri: {fight_uri: processing.fight_fingerprint}}"""
+    events_fingerprints = {}
+    for fight_stats_dict in fights:
+        events_fingerprints.setdefault(fight_stats_dict['event_uri'], {})[fight_stats_dict['fight_uri']] = \
+            fight_fingerprint(fight_stats_dict)
+    return events_fingerprints
+
+
+def event_fingerprint(fights_fingerprints: t.Dict[str, str]) -> str:
+    """Returns sha256 of event's {fight_uri: fight_fingerprint}, which changes 
+    when any fight of the event is added, removed or changed"""
+    return hashlib.sha256(json.dumps(fights_fingerprints, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def update_manifest(
+    manifest: t.Dict[str, t.Any],
+    fights: t.Iterable[t.Dict[str, t.Any]],
+    objects_hashes: t.Optional[t.Dict[str, str]]=None,
+    object_name: t.Optional[str]=None,
+    events_prefix: t.Optional[str]=None,
+    events_fingerprints: t.Optional[t.Dict[str, t.Dict[str, str]]]=None,
+) -> t.Dict[str, t.Any]:
+    """Records saved fights in manifest (inplace). Fights should contain all fights of every their event,
+    since events' entries are replaced
+
+    Args:
+        manifest: manifest to update (see new_manifest)
+        fights: saved fights
+        objects_hashes: {saved object name: sha256 of its content} (see minio_utils.save_json_to_minio)
+        object_name: where fights are saved if they are in one object
+        events_prefix: where fights are saved if they are partitioned by events
+        events_fingerprints: if given - fingerprints of fights of updated events are added there 
+            (see get_events_fingerprints), so that they are saved with save_fingerprints_to_minio
+    Returns:
+        manifest
+    """
+
+    assert (object_name is None) != (events_prefix is None), \
+        'Exactly one of object_name and events_prefix should be passed!'
+
+    fights = list(fights)
+    updated_events_fingerprints = get_events_fingerprints(fights)
+    if events_fingerprints is not None:
+        events_fingerprints.update(updated_events_fingerprints)
+
+    events_dates = {}
+    for fight_stats_dict in fights:
+        events_dates.setdefault(fight_stats_dict['event_uri'], fight_stats_dict.get('date'))
+    for event_uri, event_date in events_dates.items():
+        manifest['events'][event_uri] = {
+            'object_name': object_name if object_name is not None else event_partition_name(
+                event_uri=event_uri, event_date=event_date, prefix=events_prefix
+            ),
+            'n_fights': len(updated_events_fingerprints[event_uri]),
+            'fingerprint': event_fingerprint(updated_events_fingerprints[event_uri]),
+        }
+    manifest['objects'].update(objects_hashes or {})
+    manifest['n_events'] = len(manifest['events'])
+    manifest['n_fights'] = sum(event['n_fights'] for event in manifest['events'].values())
+    manifest['updated_at'] = datetime.now().isoformat()
+    return manifest
+
+
+def load_manifest_from_minio(
+    minio_client: minio.api.Minio,
+    bucket_name: str='ufc-raw-data',
+    manifest_name: str='ufc_stats.manifest.json',
+) -> t.Optional[t.Dict[str, t.Any]]:
+    """Returns manifest or None if there is no manifest yet"""
+    try:
+        return load_json_from_minio(
+            minio_client=minio_client,
+            bucket_name=bucket_name,
+            object_name=manifest_name,
+        )
+    except S3Error as e:
+        if e.code == 'NoSuchKey':
+            return None
+        raise
+
+
+def save_manifest_to_minio(
+    manifest: t.Dict[str, t.Any],
+    minio_client: minio.api.Minio,
+    bucket_name: str='ufc-raw-data',
+    manifest_name: str='ufc_stats.manifest.json',
+) -> None:
+    """Saves manifest with one PUT request, so that readers see either the old or the new manifest.
+    Should be called after the data is saved, so that manifest never lists fights, which aren't saved yet"""
+    save_json_to_minio(
+        obj=manifest,
+        minio_client=minio_client,
+        bucket_name=bucket_name,
+        object_name=manifest_name,
+    )
+    return
+
+
+def fingerprints_object_name(manifest_name: str, event_uri: str) -> str:
+    """Returns name of the object with fingerprints of the event's fights 
+    (ex. ufc_stats.fingerprints/319c15b8aac5bfde.json for ufc_stats.manifest.json)"""
+    event_id = event_uri.rstrip('/').split('/')[-1]
+    return manifest_name[:-len('.manifest.json')] + f'.fingerprints/{event_id}.json'
+
+
+def save_fingerprints_to_minio(
+    events_fingerprints: t.Dict[str, t.Dict[str, str]],
+    minio_client: minio.api.Minio,
+    bucket_name: str='ufc-raw-data',
+    manifest_name: str='ufc_stats.manifest.json',
+) -> None:
+    """Saves {fight_uri: fingerprint} of every event (see get_events_fingerprints) to its own object. 
+    Should be called before the manifest is saved, so that manifest never has an event fingerprint 
+    without fights fingerprints"""
+    for event_uri, fights_fingerprints in events_fingerprints.items():
+        save_json_to_minio(
+            obj=fights_fingerprints,
+            minio_client=minio_client,
+            bucket_name=bucket_name,
+            object_name=fingerprints_object_name(manifest_name=manifest_name, event_uri=event_uri),
+            indent=None,
+        )
+    return
+
+
+def load_known_fights_from_minio(
+    manifest: t.Dict[str, t.Any],
+    fights: t.Iterable[t.Dict[str, t.Any]],
+    minio_client: minio.api.Minio,
+    bucket_name: str='ufc-raw-data',
+    manifest_name: str='ufc_stats.manifest.json',
+    events_fingerprints: t.Optional[t.Dict[str, t.Dict[str, str]]]=None,
+) -> t.Dict[str, str]:
+    """Returns {fight_uri: fingerprint} of saved fights of the events, which fights belong to 
+    (see processing.get_changed_fights). Fingerprints are loaded only for events, which fingerprint 
+    differs from the one in manifest - unchanged events' fights are the saved ones, and new events have no saved fights
+
+    Args:
+        manifest: manifest of the dataset
+        fights: parsed fights (all fights of every their event)
+        minio_client: minio client
+        bucket_name: bucket where the dataset is
+        manifest_name: name of the dataset's manifest
+        events_fingerprints: fingerprints, which aren't saved yet (ex. of the manifest built in this run),
+            they are used instead of the saved ones
+    Returns:
+        Dict[str, str]: {fight_uri: processing.fight_fingerprint}
+    """
+
+    known_fights = {}
+    for event_uri, fights_fingerprints in get_events_fingerprints(fights).items():
+        event = manifest['events'].get(event_uri)
+        if event is None:
+            continue
+        if event['fingerprint'] == event_fingerprint(fights_fingerprints):
+            known_fights.update(fights_fingerprints)
+            continue
+        if events_fingerprints is not None and event_uri in events_fingerprints:
+            known_fights.update(events_fingerprints[event_uri])
+            continue
+        try:
+            known_fights.update(load_json_from_minio(
+                minio_client=minio_client,
+                bucket_name=bucket_name,
+                object_name=fingerprints_object_name(manifest_name=manifest_name, event_uri=event_uri),
+            ))
+        except S3Error as e:
+            # then all fights of the event are taken as changed
+            if e.code != 'NoSuchKey':
+                raise
+    return known_fights
+
+
+def changes_prefix(manifest_name: str) -> str:
+    """Returns where change sets of the dataset are kept (ex. ufc_stats.changes for ufc_stats.manifest.json)"""
+    return manifest_name[:-len('.manifest.json')] + '.changes'
+
+
+def change_set_object_name(manifest_name: str, revision: int) -> str:
+    """Returns name of the change set of the revision (ex. ufc_stats.changes/00000003.json)"""
+    return f'{changes_prefix(manifest_name)}/{revision:08d}.json'
+
+
+def save_changes_to_minio(
+    previous_revision: int,
+    fights: t.List[t.Dict[str, t.Any]],
+    minio_client: minio.api.Minio,
+    bucket_name: str='ufc-raw-data',
+    manifest_name: str='ufc_stats.manifest.json',
+) -> int:
+    """Saves added and changed fights of one save as the change set of the next revision.
+    The returned revision should be recorded in the manifest (manifest['revision']) after the data is saved 
+    and before the manifest is saved, so that manifest never has a revision without change set
+
+    Args:
+        previous_revision: manifest's revision before the save (manifest.get('revision', 0))
+        fights: added and changed fights (see processing.get_changed_fights)
+        minio_client: minio client
+        bucket_name: bucket where the dataset is
+        manifest_name: name of the dataset's manifest
+    Returns:
+        int: new revision
+    """
+
+    revision = previous_revision + 1
+    save_json_to_minio(
+        obj={
+            'revision': revision,
+            'previous_revision': revision - 1,
+            'saved_at': datetime.now().isoformat(),
+            'n_fights': len(fights),
+            'fights': fights,
+        },
+        minio_client=minio_client,
+        bucket_name=bucket_name,
+        object_name=change_set_object_name(manifest_name=manifest_name, revision=revision),
+    )
+    return revision
+
+
+def load_changes_from_minio(
+    minio_client: minio.api.Minio,
+    since_revision: int,
+    until_revision: t.Optional[int]=None,
+    bucket_name: str='ufc-raw-data',
+    manifest_name: str='ufc_stats.manifest.json',
+) -> t.List[t.Dict[str, t.Any]]:
+    """Returns fights added or changed after since_revision up to until_revision (inclusive), 
+    so that consumers, which remember the last processed revision, don't have to load the whole dataset. 
+    Every fight is returned once in its latest version
+
+    Args:
+        minio_client: minio client
+        since_revision: revision already processed by the consumer (manifest['revision'] at that time)
+        until_revision: the last revision to take changes from (current revision if None)
+        bucket_name: bucket where the dataset is
+        manifest_name: name of the dataset's manifest
+    Returns:
+        List[Dict[str, Any]]: added and changed fights
+    """
+
+    if until_revision is None:
+        manifest = load_manifest_from_minio(
+            minio_client=minio_client, bucket_name=bucket_name, manifest_name=manifest_name
+        )
+        until_revision = manifest.get('revision', 0) if manifest is not None else 0
+
+    changed_fights = {}
+    for revision in range(since_revision + 1, until_revision + 1):
+        try:
+            change_set = load_json_from_minio(
+                minio_client=minio_client,
+                bucket_name=bucket_name,
+                object_name=change_set_object_name(manifest_name=manifest_name, revision=revision),
+            )
+        except S3Error as e:
+            if e.code == 'NoSuchKey':
+                raise ValueError(
+                    f'There is no change set of revision {revision}, the whole dataset should be loaded instead!'
+                )
+            raise
+        for fight_stats_dict in change_set['fights']:
+            # the latest version of the fight goes to the end
+            changed_fights.pop(fight_stats_dict['fight_uri'], None)
+            changed_fights[fight_stats_dict['fight_uri']] = fight_stats_dict
+    return list(changed_fights.values())
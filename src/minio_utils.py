@@ -1,9 +1,18 @@
+import io
 import os
+import base64
+import re
 import sys
-import random
 import json
-from datetime import datetime
+import mmap
+import zlib
+import codecs
+import hashlib
+import itertools
+import threading
 import typing as t
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 if 'PYTHONPATH' in os.environ:
 	PROJECT_PATH = os.environ["PYTHONPATH"]
@@ -11,24 +20,36 @@ if 'PYTHONPATH' in os.environ:
 else:
 	PROJECT_PATH = '..'
 
-import docker
 import minio
 from minio import Minio
+from minio.datatypes import Part
+from minio.error import S3Error
 
-from src.common_utils import get_container_ipaddr  
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from src.common_utils import find_container_ipaddr
+from src.serialization_utils import (
+    SERIALIZATIONS,
+    dumps_json,
+    is_msgpack,
+    iter_msgpack_array,
+    iter_msgpack_chunks,
+    loads_json,
+    loads_msgpack,
+)
 
 
 def minio_container_ipaddr(minio_container_name: str='minio') -> str:
-    """Return minio container ipaddr as a string"""
-    docker_client = docker.from_env()
-    minio_container = [
-         container for container in docker_client.containers.list() 
-        if minio_container_name in str(container.name).lower()
-    ]
-    assert len(minio_container) == 1, 'There should be only one minio container'
-    minio_container = minio_container[0]
-    ipaddr = get_container_ipaddr(minio_container)
-    return ipaddr
+    """Return minio container ipaddr as a string (cached, see common_utils.find_container_ipaddr)"""
+    return find_container_ipaddr(container_name=minio_container_name)
+
+
+_minio_clients = {}
+_minio_clients_lock = threading.Lock()
+
 
 def initialize_minio_client(
 		ipaddr: t.Optional[str]=None,
@@ -36,16 +57,12 @@ def initialize_minio_client(
 		secret_key: t.Optional[str]=None,
 		port_number: int=9000,
 ) -> minio.api.Minio:
-    """Returns initialized minio client"""
+    """Returns initialized minio client. 
+    If ipaddr isn't given - it's taken from MINIO_IPADDR env variable or from the minio container.
+    Minio client is thread-safe and keeps its own connection pool, so one client per endpoint and credentials
+    is created lazily and reused by the whole process, and only its creation is checked with list_buckets"""
     if ipaddr is None:
-        docker_client = docker.from_env()
-        minio_container = [
-            container for container in docker_client.containers.list() 
-            if 'minio' in str(container.name).lower()
-        ]
-        assert len(minio_container) == 1, 'There should be only one minio container'
-        minio_container = minio_container[0]
-        ipaddr = get_container_ipaddr(container=minio_container)
+        ipaddr = os.getenv('MINIO_IPADDR') or minio_container_ipaddr()
 
     minio_access_key = (
 	    access_key if access_key is not None else os.getenv('MINIO_ACCESS_KEY', "")
@@ -53,43 +70,533 @@ def initialize_minio_client(
     minio_secret_key = (
 	    secret_key if secret_key is not None else os.getenv('MINIO_SECRET_KEY', "")
     )
-    minio_client = Minio(
-        endpoint=f"{ipaddr}:{port_number}",
-        access_key=minio_access_key,
-        secret_key=minio_secret_key,
-        secure=False,
-    )
-    # checking client creation
-    assert isinstance(minio_client.list_buckets(), list), \
-	    'minio_client if not initialized!'
+    client_key = (f"{ipaddr}:{port_number}", minio_access_key, minio_secret_key)
+    with _minio_clients_lock:
+        if client_key in _minio_clients:
+            return _minio_clients[client_key]
+        minio_client = Minio(
+            endpoint=f"{ipaddr}:{port_number}",
+            access_key=minio_access_key,
+            secret_key=minio_secret_key,
+            secure=False,
+        )
+        # checking client creation
+        assert isinstance(minio_client.list_buckets(), list), \
+	        'minio_client if not initialized!'
+        _minio_clients[client_key] = minio_client
     
     return minio_client
 
-def load_json_from_minio(
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_JSON_NUMBER_END = re.compile(r'[ \t\n\r,\]]')
+
+
+def iter_json_array(chunks: t.Iterable[bytes]) -> t.Iterator[t.Any]:
+    """Incrementally parses utf-8 json array, which comes in chunks of bytes, 
+    and yields its elements one by one as soon as they are read, 
+    so that only one element and one chunk are in memory at a time"""
+
+    chunks = iter(chunks)
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    json_decoder = json.JSONDecoder()
+    buffer, position = '', 0
+
+    def read_more() -> bool:
+        nonlocal buffer, position
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        buffer = buffer[position:] + text_decoder.decode(chunk)
+        position = 0
+        return True
+
+    # 'start' -> '[' -> 'first' -> value -> 'separator' -> ',' -> 'value' -> ...
+    state = 'start'
+    while True:
+        position = _JSON_WHITESPACE.match(buffer, position).end()
+        if position == len(buffer):
+            if not read_more():
+                raise ValueError('Unexpected end of json array!')
+            continue
+        char = buffer[position]
+        if state == 'start':
+            if char != '[':
+                raise ValueError(f'Expected json array, but got {char!r}!')
+            position += 1
+            state = 'first'
+        elif char == ']' and state in ('first', 'separator'):
+            return
+        elif state == 'separator':
+            if char != ',':
+                raise ValueError(f'Expected "," or "]" in json array, but got {char!r}!')
+            position += 1
+            state = 'value'
+        else:
+            # number at the end of the buffer could continue in the next chunk
+            if char in '-0123456789' and _JSON_NUMBER_END.search(buffer, position) is None and read_more():
+                continue
+            try:
+                value, end = json_decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # value is cut by the chunk end
+                if not read_more():
+                    raise
+                continue
+            position = end
+            state = 'separator'
+            yield value
+
+
+COMPRESSION_METADATA_KEY = 'compression'
+SERIALIZATION_METADATA_KEY = 'serialization'
+JSON_COMPRESSIONS = ['gzip', 'zstd']
+
+
+def _get_compressor(compression: str) -> t.Any:
+    """Returns object with .compress(bytes) and .flush() methods"""
+    if compression == 'gzip':
+        return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if compression == 'zstd':
+        assert zstandard is not None, 'zstandard should be installed to use zstd compression!'
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    raise ValueError(f'compression should be one of {JSON_COMPRESSIONS}, but got {compression}!')
+
+
+def _get_decompressor(compression: str) -> t.Any:
+    """Returns object with .decompress(bytes) and .flush() methods"""
+    if compression == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if compression == 'zstd':
+        assert zstandard is not None, 'zstandard should be installed to read zstd compressed objects!'
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f'Unknown compression {compression}!')
+
+
+def _decompress_chunks(chunks: t.Iterable[bytes], compression: str) -> t.Iterator[bytes]:
+    decompressor = _get_decompressor(compression)
+    for chunk in chunks:
+        yield decompressor.decompress(chunk)
+    yield decompressor.flush()
+
+
+class MinioObjectCache:
+    """Local read-through cache of minio objects. Object's (decompressed) content is stored under 
+    sha256 of its bucket, name, ETag and version_id (<cache_dir>/<first 2 hash chars>/<hash>.bin), 
+    so that a changed object never matches a stale file and needs no invalidation. 
+    Files are served memory-mapped and modification time of the file is its last access time, 
+    by which least recently used files are evicted when the cache grows over max_size_bytes.
+    Cache size is counted once and then tracked as files are written, so the directory is walked 
+    again only when files have to be evicted
+
+    Args:
+        cache_dir: directory where to keep cached objects
+        max_size_bytes: cache size limit
+    """
+
+    def __init__(self, cache_dir: str, max_size_bytes: int=2*1024**3):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_size_bytes = max_size_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._size_bytes = None
+        self._size_lock = threading.Lock()
+
+    def _list_files(self) -> t.List[t.Tuple[float, int, str]]:
+        """Returns [(mtime, size, path), ...] of all cached files"""
+        files = []
+        for root, _, file_names in os.walk(self.cache_dir):
+            for file_name in file_names:
+                if not file_name.endswith('.bin'):
+                    continue
+                path = os.path.join(root, file_name)
+                try:
+                    file_stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((file_stat.st_mtime, file_stat.st_size, path))
+        return files
+
+    def _path(
+        self, 
+        bucket_name: str, 
+        object_name: str, 
+        etag: str, 
+        version_id: t.Optional[str]=None,
+    ) -> str:
+        key_hash = hashlib.sha256(
+            json.dumps([bucket_name, object_name, etag, version_id]).encode('utf-8')
+        ).hexdigest()
+        return os.path.join(self.cache_dir, key_hash[:2], key_hash + '.bin')
+
+    def iter_chunks(
+        self, 
+        bucket_name: str, 
+        object_name: str, 
+        etag: str, 
+        version_id: t.Optional[str]=None,
+        chunk_size: int=1024*1024,
+    ) -> t.Optional[t.Iterator[bytes]]:
+        """Returns iterator over chunks of cached content or None if the object isn't cached"""
+        path = self._path(bucket_name=bucket_name, object_name=object_name, etag=etag, version_id=version_id)
+        try:
+            f = open(path, mode='rb')
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+
+        def iter_mmap_chunks() -> t.Iterator[bytes]:
+            with f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return
+                with mmap.mmap(f.fileno(), length=0, access=mmap.ACCESS_READ) as mm:
+                    for start in range(0, len(mm), chunk_size):
+                        yield mm[start:start + chunk_size]
+        return iter_mmap_chunks()
+
+    def put_chunks(
+        self, 
+        chunks: t.Iterable[bytes], 
+        bucket_name: str, 
+        object_name: str, 
+        etag: str, 
+        version_id: t.Optional[str]=None,
+    ) -> t.Iterator[bytes]:
+        """Yields chunks through while writing them to cache. The file is written to temporary path first 
+        and renamed only when all chunks are read, so that interrupted read never leaves broken file in cache"""
+        path = self._path(bucket_name=bucket_name, object_name=object_name, etag=etag, version_id=version_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        completed = False
+        try:
+            with open(tmp_path, mode='wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+                written_size = f.tell()
+            replaced_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            completed = True
+        finally:
+            if not completed and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._size_lock:
+            if self._size_bytes is None:
+                self._size_bytes = sum(size for _, size, _ in self._list_files())
+            else:
+                self._size_bytes += written_size - replaced_size
+            over_limit = self._size_bytes > self.max_size_bytes
+        if over_limit:
+            self.evict()
+
+    def evict(self) -> None:
+        """Removes least recently used files until the cache fits into max_size_bytes"""
+        with self._size_lock:
+            files = self._list_files()
+            cache_size = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if cache_size <= self.max_size_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                cache_size -= size
+            # the walk also picks up files written or removed by other processes
+            self._size_bytes = cache_size
+
+
+def _iter_object_chunks(
     minio_client: minio.api.Minio,
-    bucket_name: str='ufc-raw-data',
-    object_name: str='ufc_stats.json',
+    bucket_name: str,
+    object_name: str,
     version_id: t.Optional[str]=None,
-) -> object:
-    """Minio -> local -> load local -> delete local"""
+    chunk_size: int=1024*1024,
+    cache: t.Optional[MinioObjectCache]=None,
+) -> t.Iterator[bytes]:
+    """Yields object's content chunk by chunk straight from get_object response.
+    If cache is given - the object is revalidated with stat_object and served from cache when unchanged"""
+    request_headers = None
+    if cache is not None:
+        object_stat = minio_client.stat_object(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            version_id=version_id,
+        )
+        cache_key = dict(
+            bucket_name=bucket_name, 
+            object_name=object_name, 
+            etag=object_stat.etag, 
+            version_id=object_stat.version_id,
+        )
+        cached_chunks = cache.iter_chunks(**cache_key, chunk_size=chunk_size)
+        if cached_chunks is not None:
+            yield from cached_chunks
+            return
+        # so that object changed after stat_object is never cached under the old ETag
+        request_headers = {'If-Match': object_stat.etag}
 
+    response = minio_client.get_object(
+        bucket_name=bucket_name,
+        object_name=object_name,
+        version_id=version_id,
+        request_headers=request_headers,
+    )
     try:
-        now_str = str(datetime.now().strftime(format='%Y%m%d%H%M%S%m'))
-    except: 
-        now_str = 'abc124'
-    random_number = str(int(random.random()*1e6))
+        # objects saved by save_json_to_minio(compression=...) are decompressed transparently
+        compression = response.headers.get(f'x-amz-meta-{COMPRESSION_METADATA_KEY}')
+        chunks = (
+            response.stream(chunk_size) if compression is None else 
+            _decompress_chunks(response.stream(chunk_size), compression=compression)
+        )
+        if cache is not None:
+            chunks = cache.put_chunks(chunks, **cache_key)
+        yield from chunks
+    finally:
+        response.close()
+        response.release_conn()
 
-    tmp_data_local_path = now_str + random_number + '.json'
-    minio_client.fget_object(
+
+def iter_json_from_minio(
+    minio_client: minio.api.Minio,
+    bucket_name: str='ufc-raw-data',
+    object_name: str='ufc_stats.json',
+    version_id: t.Optional[str]=None,
+    chunk_size: int=1024*1024,
+    cache: t.Optional[MinioObjectCache]=None,
+) -> t.Iterator[t.Any]:
+    """Streams json array object (ex. list of fights) from minio and yields its elements one by one.
+    Neither the whole object nor temporary file is kept, so memory tracks the size of one element.
+    Objects saved with serialization='msgpack' are read the same way.
+    If cache is given - unchanged object is read from local cache (see MinioObjectCache)"""
+    chunks = _iter_object_chunks(
+        minio_client=minio_client,
         bucket_name=bucket_name,
         object_name=object_name,
-        file_path=tmp_data_local_path,
         version_id=version_id,
+        chunk_size=chunk_size,
+        cache=cache,
+    )
+    first_chunk = next((chunk for chunk in chunks if len(chunk) > 0), b'')
+    chunks = itertools.chain([first_chunk], chunks)
+    if is_msgpack(first_chunk):
+        yield from iter_msgpack_array(chunks)
+    else:
+        yield from iter_json_array(chunks)
+    # parsers return at the end of the array, the rest of the response (ex. trailing newline,
+    # decompressor flush) is read, so that cache.put_chunks sees the whole object and keeps it
+    for _ in chunks:
+        pass
+
+
+def load_json_from_minio(
+    minio_client: minio.api.Minio,
+    bucket_name: str='ufc-raw-data',
+    object_name: str='ufc_stats.json',
+    version_id: t.Optional[str]=None,
+    cache: t.Optional[MinioObjectCache]=None,
+) -> object:
+    """Minio -> json.loads straight from get_object response (without temporary local file).
+    Use iter_json_from_minio to read json arrays element by element. 
+    Objects saved with serialization='msgpack' are read the same way. 
+    If cache is given - unchanged object is read from local cache (see MinioObjectCache), ex.:
+
+        cache = MinioObjectCache(cache_dir='~/.cache/ufc_minio', max_size_bytes=1024**3)
+        all_fights_list = load_json_from_minio(minio_client, object_name='ufc_stats.json', cache=cache)
+    """
+
+    content = b''.join(
+        _iter_object_chunks(
+            minio_client=minio_client,
+            bucket_name=bucket_name,
+            object_name=object_name,
+            version_id=version_id,
+            cache=cache,
+        )
+    )
+    return loads_msgpack(content) if is_msgpack(content) else loads_json(content)
+
+
+class _ChunksReader(io.RawIOBase):
+    """File-like object, which reads bytes from iterator of chunks, so that put_object 
+    could upload data, which is being generated, without writing it to disk first"""
+
+    def __init__(self, chunks: t.Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = bytearray()
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int=-1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        size = len(self._buffer) if size < 0 else size
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+def _iter_json_chunks(obj: t.Any, indent: t.Optional[int]=None) -> t.Iterator[bytes]:
+    """Encodes obj to json piece by piece: lists and iterators element by element, 
+    everything else at once. The result is the same as json.dumps(obj) with the same indent 
+    (and compact separators when indent is None)"""
+
+    if not isinstance(obj, (list, tuple, Iterator)):
+        yield dumps_json(obj, indent=indent)
+        return
+
+    newline = b'' if indent is None else b'\n' + b' ' * indent
+    n_elements = 0
+    yield b'['
+    for element in obj:
+        element_json = dumps_json(element, indent=indent)
+        if indent is not None:
+            # json strings never contain raw newlines, so only indentation newlines are replaced
+            element_json = element_json.replace(b'\n', newline)
+        yield (b',' if n_elements > 0 else b'') + newline + element_json
+        n_elements += 1
+    yield (b'\n' if indent is not None and n_elements > 0 else b'') + b']'
+
+
+def _compress_chunks(chunks: t.Iterable[bytes], compression: str) -> t.Iterator[bytes]:
+    compressor = _get_compressor(compression)
+    for chunk in chunks:
+        compressed_chunk = compressor.compress(chunk)
+        if compressed_chunk:
+            yield compressed_chunk
+    yield compressor.flush()
+
+
+def _hash_chunks(chunks: t.Iterable[bytes], content_hash: t.Any) -> t.Iterator[bytes]:
+    for chunk in chunks:
+        content_hash.update(chunk)
+        yield chunk
+
+
+# minio versions (major, minor), whose private multipart upload methods _MultipartApi calls 
+# were checked to have the same signatures. requirements.txt pins minio==7.1.11
+MULTIPART_API_MINIO_VERSIONS = ((7, 1), (7, 2))
+
+
+def _check_multipart_api_version(version: str=minio.__version__) -> None:
+    """Raises RuntimeError if private multipart upload methods of this minio version weren't checked"""
+    major_minor = tuple(int(number) for number in re.findall(r'\d+', version)[:2])
+    if major_minor not in MULTIPART_API_MINIO_VERSIONS:
+        raise RuntimeError(
+            f'Multipart uploads of minio_utils rely on private methods of minio.Minio, which were checked '
+            f'only for minio {", ".join(".".join(map(str, v)) for v in MULTIPART_API_MINIO_VERSIONS)}, '
+            f'but minio {version} is installed! Install minio from requirements.txt or check '
+            f'tests/test_minio_utils.py against minio {version} and add it to MULTIPART_API_MINIO_VERSIONS'
+        )
+
+
+class _MultipartApi:
+    """The only place, which calls private multipart upload methods of minio.Minio (public put_object 
+    can't upload parts in parallel, resume an upload or send Content-MD5 of every part). 
+    Minio version is checked on creation, so an upgrade fails here and not in the middle of an upload"""
+
+    def __init__(self, minio_client: minio.api.Minio):
+        _check_multipart_api_version()
+        self.minio_client = minio_client
+
+    def create(self, bucket_name: str, object_name: str, headers: t.Dict[str, str]) -> str:
+        """Starts multipart upload and returns its upload_id"""
+        return self.minio_client._create_multipart_upload(bucket_name, object_name, headers)
+
+    def upload_part(
+        self, 
+        bucket_name: str, 
+        object_name: str, 
+        upload_id: str, 
+        part_number: int, 
+        data: bytes, 
+        headers: t.Optional[t.Dict[str, str]]=None,
+    ) -> str:
+        """Uploads one part (numbered from 1) and returns its ETag"""
+        return self.minio_client._upload_part(bucket_name, object_name, data, headers, upload_id, part_number)
+
+    def list_parts(
+        self, 
+        bucket_name: str, 
+        object_name: str, 
+        upload_id: str, 
+        part_number_marker: t.Optional[str]=None,
+    ) -> t.Any:
+        """Returns one page of uploaded parts (with parts, is_truncated and next_part_number_marker)"""
+        return self.minio_client._list_parts(
+            bucket_name, object_name, upload_id, part_number_marker=part_number_marker
+        )
+
+    def complete(self, bucket_name: str, object_name: str, upload_id: str, parts: t.List[Part]) -> None:
+        self.minio_client._complete_multipart_upload(bucket_name, object_name, upload_id, parts)
+
+    def abort(self, bucket_name: str, object_name: str, upload_id: str) -> None:
+        self.minio_client._abort_multipart_upload(bucket_name, object_name, upload_id)
+
+
+def _put_chunks_to_minio(
+    minio_client: minio.api.Minio,
+    bucket_name: str,
+    object_name: str,
+    chunks: t.Iterable[bytes],
+    content_type: str,
+    metadata: t.Dict[str, str],
+    part_size: int,
+    num_parallel_uploads: int,
+) -> None:
+    """Uploads stream of chunks of unknown length. Content that fits into one part is uploaded with one PUT,
+    bigger one - with multipart upload, where the next part is read only when one of num_parallel_uploads 
+    parts in flight is uploaded (minio_client.put_object(length=-1) reads parts ahead without limit)"""
+
+    reader = _ChunksReader(chunks)
+    data = reader.read(part_size)
+    if len(data) < part_size:
+        minio_client.put_object(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            data=io.BytesIO(data),
+            length=len(data),
+            content_type=content_type,
+            metadata=metadata,
+        )
+        return
+
+    multipart_api = _MultipartApi(minio_client)
+    upload_id = multipart_api.create(
+        bucket_name, 
+        object_name, 
+        {'Content-Type': content_type, **{f'x-amz-meta-{key}': value for key, value in metadata.items()}},
     )
+    parts_in_flight = threading.BoundedSemaphore(num_parallel_uploads)
+
+    def upload_part(part_data: bytes, part_number: int) -> Part:
+        try:
+            etag = multipart_api.upload_part(bucket_name, object_name, upload_id, part_number, part_data)
+            return Part(part_number, etag)
+        finally:
+            parts_in_flight.release()
 
-    loaded_object = json.load(open(tmp_data_local_path, mode='r', encoding='utf-8'))
-    os.remove(tmp_data_local_path)
-    return loaded_object
+    try:
+        with ThreadPoolExecutor(max_workers=num_parallel_uploads) as executor:
+            futures = []
+            part_number = 1
+            while len(data) > 0:
+                parts_in_flight.acquire()
+                # the upload stops at the first failed part instead of reading the rest of the stream
+                for future in futures:
+                    if future.done():
+                        future.result()
+                futures.append(executor.submit(upload_part, data, part_number))
+                data = reader.read(part_size)
+                part_number += 1
+            parts = [future.result() for future in futures]
+        multipart_api.complete(bucket_name, object_name, upload_id, parts)
+    except BaseException:
+        multipart_api.abort(bucket_name, object_name, upload_id)
+        raise
+    return
 
 
 def save_json_to_minio(
@@ -97,26 +604,384 @@ def save_json_to_minio(
     minio_client: minio.api.Minio,
     bucket_name: str='ufc-raw-data',
     object_name: str='ufc_stats.json',
-) -> None:
-    """save local -> put from local to minio -> delete local"""
+    compression: t.Optional[str]=None,
+    indent: t.Optional[int]=2,
+    part_size: int=16*1024*1024,
+    num_parallel_uploads: int=4,
+    serialization: str='json',
+) -> str:
+    """Encodes obj to json and streams it straight to minio with multipart upload (without temporary 
+    local file). Lists and iterators (ex. parse_all_fights.iter_fights()) are encoded element by element, 
+    so no more than num_parallel_uploads + 1 parts are in memory at a time
 
-    try:
-        now_str = str(datetime.now().strftime(format='%Y%m%d%H%M%S%m'))
-    except: 
-        now_str = 'abc124'
-    random_number = str(int(random.random()*1e6))
-
-    tmp_data_local_path = now_str + random_number + '.json'
-    json.dump(
-         obj, 
-         open(tmp_data_local_path, mode='w', encoding='utf-8'), 
-         ensure_ascii=False, indent=2
-    )
+    Args:
+        obj: what to save
+        minio_client: minio client
+        bucket_name: bucket to save to
+        object_name: object to save to
+        compression: None, 'gzip' or 'zstd'. Compression is saved to object's metadata, 
+            so that load_json_from_minio and iter_json_from_minio decompress the object transparently
+        indent: json indent (2 as json.dump(obj, f, ensure_ascii=False, indent=2) always wrote). 
+            If None - json is written with compact separators, which is ~30% smaller
+        part_size: size of one part of multipart upload (at least 5MB)
+        num_parallel_uploads: how many parts are uploaded in parallel
+        serialization: 'json' or 'msgpack' (compact binary encoding, which load_json_from_minio 
+            and iter_json_from_minio tell from json by the first byte). Msgpack array starts with 
+            the number of its elements, so with msgpack obj can't be an iterator (lists are still 
+            encoded element by element)
+    Returns:
+        str: sha256 of the uploaded (compressed) content
+    """
+
+    assert serialization in SERIALIZATIONS, f'serialization should be one of {SERIALIZATIONS}!'
+    if serialization == 'msgpack':
+        assert not isinstance(obj, Iterator), \
+            "msgpack array needs its length upfront, pass a list or use serialization='json' for iterators!"
+        chunks = iter_msgpack_chunks(obj=obj)
+    else:
+        chunks = _iter_json_chunks(obj=obj, indent=indent)
+    metadata = {SERIALIZATION_METADATA_KEY: serialization}
+    if compression is not None:
+        chunks = _compress_chunks(chunks=chunks, compression=compression)
+        metadata[COMPRESSION_METADATA_KEY] = compression
+    content_hash = hashlib.sha256()
+    chunks = _hash_chunks(chunks=chunks, content_hash=content_hash)
 
-    minio_client.fput_object(
+    _put_chunks_to_minio(
+        minio_client=minio_client,
         bucket_name=bucket_name,
         object_name=object_name,
-        file_path=tmp_data_local_path,
+        chunks=chunks,
+        content_type='application/json' if serialization == 'json' else 'application/msgpack',
+        metadata=metadata,
+        part_size=part_size,
+        num_parallel_uploads=num_parallel_uploads,
+    )
+    return content_hash.hexdigest()
+
+
+EVENTS_PREFIX = 'events'
+
+
+def event_partition_name(event_uri: str, event_date: str, prefix: str=EVENTS_PREFIX) -> str:
+    """Returns name of the object with event's fights: <prefix>/<year>/<event_id>.json
+    (ex. events/2023/319c15b8aac5bfde.json for http://www.ufcstats.com/event-details/319c15b8aac5bfde)"""
+    event_id = event_uri.rstrip('/').split('/')[-1]
+    year = re.search(r'\d{4}', str(event_date))
+    return f"{prefix}/{year.group(0) if year is not None else 'unknown'}/{event_id}.json"
+
+
+def save_events_partitions_to_minio(
+    fights: t.Iterable[t.Dict[str, t.Any]],
+    minio_client: minio.api.Minio,
+    bucket_name: str='ufc-raw-data',
+    prefix: str=EVENTS_PREFIX,
+    compression: t.Optional[str]=None,
+    serialization: str='json',
+) -> t.Dict[str, str]:
+    """Groups fights by event and saves every event's fights to its own object (see event_partition_name),
+    replacing the previous version of the partition. So fights should contain all fights of every event, 
+    which partition is written
+
+    Args:
+        fights: list or iterator of fights with event_uri and date keys
+        minio_client: minio client
+        bucket_name: bucket to save to
+        prefix: where partitions are kept in the bucket
+        compression: None, 'gzip' or 'zstd' (see save_json_to_minio)
+        serialization: 'json' or 'msgpack' (see save_json_to_minio)
+    Returns:
+        Dict[str, str]: {name of written partition: sha256 of its content}
+    """
+
+    partitions = {}
+    for fight_stats_dict in fights:
+        partition_name = event_partition_name(
+            event_uri=fight_stats_dict['event_uri'], event_date=fight_stats_dict.get('date'), prefix=prefix
+        )
+        partitions.setdefault(partition_name, []).append(fight_stats_dict)
+
+    partitions_hashes = {}
+    for partition_name, event_fights in partitions.items():
+        partitions_hashes[partition_name] = save_json_to_minio(
+            obj=event_fights,
+            minio_client=minio_client,
+            bucket_name=bucket_name,
+            object_name=partition_name,
+            compression=compression,
+            serialization=serialization,
+        )
+    return partitions_hashes
+
+
+def list_events_partitions(
+    minio_client: minio.api.Minio,
+    bucket_name: str='ufc-raw-data',
+    prefix: str=EVENTS_PREFIX,
+    years: t.Optional[t.Iterable[t.Union[int, str]]]=None,
+) -> t.List[str]:
+    """Returns sorted names of events partitions of the given years (all years if None)"""
+    years_prefixes = [f'{prefix}/'] if years is None else [f'{prefix}/{year}/' for year in years]
+    return sorted(
+        minio_object.object_name
+        for years_prefix in years_prefixes
+        for minio_object in minio_client.list_objects(bucket_name, prefix=years_prefix, recursive=True)
+        if minio_object.object_name.endswith('.json')
+    )
+
+
+def iter_fights_from_events_partitions(
+    minio_client: minio.api.Minio,
+    bucket_name: str='ufc-raw-data',
+    prefix: str=EVENTS_PREFIX,
+    years: t.Optional[t.Iterable[t.Union[int, str]]]=None,
+) -> t.Iterator[t.Dict[str, t.Any]]:
+    """Streams fights of the given years (all years if None) partition by partition. 
+    Partitions are read in order of their names, i.e. by year and then by event id"""
+    for partition_name in list_events_partitions(
+        minio_client=minio_client, bucket_name=bucket_name, prefix=prefix, years=years
+    ):
+        yield from iter_json_from_minio(
+            minio_client=minio_client, bucket_name=bucket_name, object_name=partition_name
+        )
+
+
+SHA256_METADATA_KEY = 'sha256'
+
+
+def _file_hashes(file_path: str, chunk_size: int=16*1024*1024) -> t.Tuple[str, str]:
+    """Returns (sha256, md5) of the file's content"""
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    with open(file_path, mode='rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+            md5.update(chunk)
+    return sha256.hexdigest(), md5.hexdigest()
+
+
+def _load_transfer_state(state_path: str, expected: t.Dict[str, t.Any]) -> t.Optional[t.Dict[str, t.Any]]:
+    """Returns saved transfer state if it's the state of the same transfer (all expected keys match)"""
+    try:
+        with open(state_path, mode='r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if any(state.get(key) != value for key, value in expected.items()):
+        return None
+    return state
+
+
+def _save_transfer_state(state_path: str, state: t.Dict[str, t.Any]) -> None:
+    with open(state_path + '.tmp', mode='w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(state_path + '.tmp', state_path)
+
+
+def download_object_from_minio(
+    minio_client: minio.api.Minio,
+    bucket_name: str,
+    object_name: str,
+    file_path: str,
+    version_id: t.Optional[str]=None,
+    part_size: int=16*1024*1024,
+    num_workers: int=8,
+) -> str:
+    """Parallel and resumable counterpart of minio_client.fget_object. The object is downloaded 
+    with ranged GETs of part_size bytes by num_workers threads into <file_path>.part, 
+    and completed parts are recorded in <file_path>.part.json, so that interrupted download 
+    is resumed from the completed parts (if the object hasn't changed since). 
+    The downloaded file is checked against sha256 saved by upload_object_to_minio or against ETag 
+    of objects uploaded with one PUT, and only then renamed to file_path
+
+    Args:
+        minio_client: minio client
+        bucket_name: bucket to download from
+        object_name: object to download
+        file_path: where to save the object
+        version_id: object's version (the latest if None)
+        part_size: size of one ranged GET
+        num_workers: how many parts are downloaded in parallel
+    Returns:
+        str: sha256 of the downloaded file
+    """
+
+    object_stat = minio_client.stat_object(bucket_name=bucket_name, object_name=object_name, version_id=version_id)
+    tmp_path, state_path = file_path + '.part', file_path + '.part.json'
+    expected = {
+        'bucket_name': bucket_name,
+        'object_name': object_name,
+        'etag': object_stat.etag,
+        'version_id': object_stat.version_id,
+        'size': object_stat.size,
+        'part_size': part_size,
+    }
+    state = _load_transfer_state(state_path=state_path, expected=expected)
+    if state is None or not os.path.exists(tmp_path):
+        state = {**expected, 'completed_parts': []}
+        with open(tmp_path, mode='wb') as f:
+            f.truncate(object_stat.size)
+        _save_transfer_state(state_path=state_path, state=state)
+
+    state_lock = threading.Lock()
+    completed_parts = set(state['completed_parts'])
+
+    def download_part(part_number: int) -> None:
+        offset = part_number * part_size
+        length = min(part_size, object_stat.size - offset)
+        response = minio_client.get_object(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            offset=offset,
+            length=length,
+            version_id=object_stat.version_id,
+            # so that parts of different object's versions are never mixed
+            request_headers={'If-Match': object_stat.etag},
+        )
+        try:
+            data = response.read()
+        finally:
+            response.close()
+            response.release_conn()
+        if len(data) != length:
+            raise IOError(f'Part {part_number} of {object_name} has {len(data)} bytes instead of {length}!')
+        with open(tmp_path, mode='r+b') as f:
+            f.seek(offset)
+            f.write(data)
+        with state_lock:
+            completed_parts.add(part_number)
+            state['completed_parts'] = sorted(completed_parts)
+            _save_transfer_state(state_path=state_path, state=state)
+
+    n_parts = max(1, -(-object_stat.size // part_size))
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = [
+            executor.submit(download_part, part_number) 
+            for part_number in range(n_parts) if part_number not in completed_parts
+        ]
+        for future in as_completed(futures):
+            future.result()
+
+    sha256, md5 = _file_hashes(tmp_path)
+    expected_sha256 = (object_stat.metadata or {}).get(f'x-amz-meta-{SHA256_METADATA_KEY}')
+    if expected_sha256 is not None:
+        checksum_ok = sha256 == expected_sha256
+    elif '-' not in object_stat.etag:
+        # ETag of object uploaded with one PUT is md5 of its content
+        checksum_ok = md5 == object_stat.etag
+    else:
+        checksum_ok = True
+    if not checksum_ok:
+        os.remove(tmp_path)
+        os.remove(state_path)
+        raise IOError(f'Checksum of downloaded {object_name} does not match, download is restarted on retry!')
+    os.replace(tmp_path, file_path)
+    os.remove(state_path)
+    return sha256
+
+
+def upload_object_to_minio(
+    minio_client: minio.api.Minio,
+    bucket_name: str,
+    object_name: str,
+    file_path: str,
+    content_type: str='application/octet-stream',
+    part_size: int=16*1024*1024,
+    num_workers: int=8,
+) -> str:
+    """Parallel and resumable counterpart of minio_client.fput_object. The file is uploaded with multipart 
+    upload by num_workers threads. Every part is sent with Content-MD5, so that minio verifies it, 
+    and uploaded parts are recorded in <file_path>.upload.json, so that interrupted upload of the same file 
+    is resumed from the uploaded parts. sha256 of the file is saved to object's metadata, 
+    so that download_object_from_minio verifies the whole object
+
+    Args:
+        minio_client: minio client
+        bucket_name: bucket to upload to
+        object_name: object to upload to
+        file_path: file to upload
+        content_type: object's content type
+        part_size: size of one part (at least 5MB)
+        num_workers: how many parts are uploaded in parallel
+    Returns:
+        str: sha256 of the uploaded file
+    """
+
+    multipart_api = _MultipartApi(minio_client)
+    sha256, _ = _file_hashes(file_path)
+    file_size = os.path.getsize(file_path)
+    state_path = file_path + '.upload.json'
+    expected = {
+        'bucket_name': bucket_name,
+        'object_name': object_name,
+        'sha256': sha256,
+        'size': file_size,
+        'part_size': part_size,
+    }
+    state = _load_transfer_state(state_path=state_path, expected=expected)
+    uploaded_parts = {}
+    if state is not None:
+        # only parts, which minio still has for this upload, are skipped
+        try:
+            part_number_marker = None
+            while True:
+                parts_list = multipart_api.list_parts(
+                    bucket_name, object_name, state['upload_id'], part_number_marker=part_number_marker
+                )
+                for part in parts_list.parts:
+                    if state['parts'].get(str(part.part_number)) == part.etag:
+                        uploaded_parts[part.part_number] = part.etag
+                if not parts_list.is_truncated:
+                    break
+                part_number_marker = parts_list.next_part_number_marker
+        except S3Error as e:
+            if e.code != 'NoSuchUpload':
+                raise
+            state = None
+    if state is None:
+        upload_id = multipart_api.create(
+            bucket_name, 
+            object_name, 
+            {'Content-Type': content_type, f'x-amz-meta-{SHA256_METADATA_KEY}': sha256},
+        )
+        state = {**expected, 'upload_id': upload_id, 'parts': {}}
+        _save_transfer_state(state_path=state_path, state=state)
+
+    state_lock = threading.Lock()
+
+    def upload_part(part_number: int) -> None:
+        with open(file_path, mode='rb') as f:
+            f.seek((part_number - 1) * part_size)
+            data = f.read(part_size)
+        md5 = hashlib.md5(data)
+        etag = multipart_api.upload_part(
+            bucket_name, 
+            object_name, 
+            state['upload_id'], 
+            part_number,
+            data, 
+            headers={'Content-MD5': base64.b64encode(md5.digest()).decode('ascii')}, 
+        ).strip('"')
+        if etag != md5.hexdigest():
+            raise IOError(f'Part {part_number} of {file_path} has ETag {etag} instead of {md5.hexdigest()}!')
+        with state_lock:
+            uploaded_parts[part_number] = etag
+            state['parts'][str(part_number)] = etag
+            _save_transfer_state(state_path=state_path, state=state)
+
+    n_parts = max(1, -(-file_size // part_size))
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = [
+            executor.submit(upload_part, part_number) 
+            for part_number in range(1, n_parts + 1) if part_number not in uploaded_parts
+        ]
+        for future in as_completed(futures):
+            future.result()
+
+    multipart_api.complete(
+        bucket_name, 
+        object_name, 
+        state['upload_id'], 
+        [Part(part_number, uploaded_parts[part_number]) for part_number in range(1, n_parts + 1)],
     )
-    os.remove(tmp_data_local_path)
-    return 
+    os.remove(state_path)
+    return sha256
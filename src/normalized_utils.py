@@ -0,0 +1,417 @@
+import os
+import sys
+import asyncio
+import typing as t
+from itertools import islice
+from concurrent.futures import Future
+
+if 'PYTHONPATH' in os.environ:
+	PROJECT_PATH = os.environ["PYTHONPATH"]
+	sys.path.insert(0, PROJECT_PATH)
+else:
+	PROJECT_PATH = '..'
+
+import pyarrow as pa
+from sqlalchemy.engine.base import Engine
+
+from src.db_utils import copy_rows, get_pg_engine
+from src.parquet_utils import ROUND_STATS_SCHEMA, fight_to_rows
+from src.processing import (
+    LOADED_REVISIONS_TABLE, 
+    loaded_revisions_ddl, 
+    record_loaded_revision, 
+    record_loaded_revision_sql,
+)
+
+
+NORMALIZED_SCHEMA = 'normalized_data'
+
+_PG_TYPES = {
+    pa.string(): 'TEXT',
+    pa.int8(): 'SMALLINT',
+    pa.int32(): 'INTEGER',
+    pa.float32(): 'REAL',
+    pa.date32(): 'DATE',
+}
+
+# the same typed columns as in parquet tables (see parquet_utils)
+_ROUND_STATS_COLUMNS = [
+    (field.name, _PG_TYPES[field.type]) for field in ROUND_STATS_SCHEMA
+    if field.name not in ('fight_uri', 'event_date', 'round', 'fighter_number', 'fighter')
+]
+
+_FIGHT_COLUMNS = [
+    'fight_uri', 'event_uri', 'event_date', 'fight_name',
+    'method', 'round', 'time_seconds', 'time_format', 'referee', 'details',
+]
+_EVENT_COLUMNS = ['event_uri', 'event_name', 'event_date', 'location']
+_FIGHTER_FIGHT_COLUMNS = ['fight_uri', 'fighter_number', 'fighter', 'opponent', 'result', 'event_date']
+_ROUND_STATS_ROW_COLUMNS = ['fight_uri', 'round', 'fighter_number', 'fighter', 'event_date'] + [
+    column for column, _ in _ROUND_STATS_COLUMNS
+]
+
+_FIGHTER_CAREER_IS_MISSING_SQL = (
+    'SELECT NOT EXISTS (SELECT 1 FROM "{schema}".fighter_career) AND EXISTS (SELECT 1 FROM "{schema}".fighter_fight)'
+)
+
+
+def normalized_tables_ddl(schema: str=NORMALIZED_SCHEMA) -> t.List[str]:
+    """Returns statements, which create (if they don't exist yet) normalized tables with keys and indexes:
+        events: one row per event
+        fights: one row per fight
+        fighter_fight: one row per fighter per fight (fighter-centric queries should start here)
+        round_stats: one row per fighter per round
+        fighter_career: one row per fighter with record and method breakdown (see refresh_fighter_career)
+    Rows of a fight in fighter_fight and round_stats are deleted together with the fight"""
+    round_stats_columns_ddl = ''.join(f',\n            "{column}" {column_type}' for column, column_type in _ROUND_STATS_COLUMNS)
+    return [
+        f'CREATE SCHEMA IF NOT EXISTS "{schema}"',
+        f'''CREATE TABLE IF NOT EXISTS "{schema}".events (
+            event_uri TEXT PRIMARY KEY,
+            event_name TEXT,
+            event_date DATE,
+            location TEXT
+        )''',
+        f'''CREATE TABLE IF NOT EXISTS "{schema}".fights (
+            fight_uri TEXT PRIMARY KEY,
+            event_uri TEXT NOT NULL REFERENCES "{schema}".events (event_uri),
+            event_date DATE,
+            fight_name TEXT,
+            method TEXT,
+            round INTEGER,
+            time_seconds INTEGER,
+            time_format TEXT,
+            referee TEXT,
+            details TEXT
+        )''',
+        f'''CREATE TABLE IF NOT EXISTS "{schema}".fighter_fight (
+            fight_uri TEXT NOT NULL REFERENCES "{schema}".fights (fight_uri) ON DELETE CASCADE,
+            fighter_number SMALLINT NOT NULL,
+            fighter TEXT NOT NULL,
+            opponent TEXT,
+            result TEXT,
+            event_date DATE,
+            PRIMARY KEY (fight_uri, fighter_number)
+        )''',
+        f'''CREATE TABLE IF NOT EXISTS "{schema}".round_stats (
+            fight_uri TEXT NOT NULL REFERENCES "{schema}".fights (fight_uri) ON DELETE CASCADE,
+            round INTEGER NOT NULL,
+            fighter_number SMALLINT NOT NULL,
+            fighter TEXT,
+            event_date DATE{round_stats_columns_ddl},
+            PRIMARY KEY (fight_uri, round, fighter_number)
+        )''',
+        f'''CREATE TABLE IF NOT EXISTS "{schema}".fighter_career (
+            fighter TEXT PRIMARY KEY,
+            n_fights INTEGER NOT NULL,
+            wins INTEGER NOT NULL,
+            losses INTEGER NOT NULL,
+            draws INTEGER NOT NULL,
+            no_contests INTEGER NOT NULL,
+            wins_ko_tko INTEGER NOT NULL,
+            wins_submission INTEGER NOT NULL,
+            wins_decision INTEGER NOT NULL,
+            losses_ko_tko INTEGER NOT NULL,
+            losses_submission INTEGER NOT NULL,
+            losses_decision INTEGER NOT NULL,
+            first_fight_date DATE,
+            last_fight_date DATE
+        )''',
+        f'CREATE INDEX IF NOT EXISTS events_event_date_idx ON "{schema}".events (event_date)',
+        f'CREATE INDEX IF NOT EXISTS fights_event_uri_idx ON "{schema}".fights (event_uri)',
+        f'CREATE INDEX IF NOT EXISTS fights_event_date_idx ON "{schema}".fights (event_date)',
+        f'CREATE INDEX IF NOT EXISTS fighter_fight_fighter_idx ON "{schema}".fighter_fight (fighter, event_date)',
+        f'CREATE INDEX IF NOT EXISTS fighter_fight_event_date_idx ON "{schema}".fighter_fight (event_date)',
+        f'CREATE INDEX IF NOT EXISTS round_stats_fighter_idx ON "{schema}".round_stats (fighter, event_date)',
+        f'CREATE INDEX IF NOT EXISTS fighter_career_wins_idx ON "{schema}".fighter_career (wins DESC)',
+    ]
+
+
+def fighter_career_sql(schema: str=NORMALIZED_SCHEMA, fighters_param: t.Optional[str]=None) -> t.List[str]:
+    """Returns statements, which recompute fighter_career rows from fighter_fight and fights.
+    If fighters_param (ex. '%s' for psycopg2 or '$1::text[]' for asyncpg) is given - only rows of fighters 
+    in that array parameter are recomputed (every statement takes the same parameter), otherwise all rows"""
+
+    fighters_filter = f' WHERE fighter = ANY({fighters_param})' if fighters_param is not None else ''
+    # psycopg2 formats statements with parameters ('%s') like python's %, so literal % is doubled for it
+    any_chars = '%%' if fighters_param is not None and fighters_param.startswith('%') else '%'
+    # ko_tko, submission and decision methods (ex. 'KO/TKO', "TKO - Doctor's Stoppage", 'Decision - Split').
+    # LIKE instead of starts_with, which appeared only in postgres 11
+    methods = [
+        f"strpos(fights.method, 'KO/TKO') > 0 OR fights.method LIKE 'TKO{any_chars}'",
+        f"fights.method LIKE 'Submission{any_chars}'",
+        f"fights.method LIKE 'Decision{any_chars}'",
+    ]
+    methods_columns = ''.join(
+        f",\n            count(*) FILTER (WHERE f.result = '{result}' AND ({method}))"
+        for result in ['W', 'L'] for method in methods
+    )
+    return [
+        f'DELETE FROM "{schema}".fighter_career{fighters_filter}',
+        f'''INSERT INTO "{schema}".fighter_career
+        SELECT
+            f.fighter,
+            count(*),
+            count(*) FILTER (WHERE f.result = 'W'),
+            count(*) FILTER (WHERE f.result = 'L'),
+            count(*) FILTER (WHERE f.result = 'D'),
+            count(*) FILTER (WHERE f.result = 'NC'){methods_columns},
+            min(f.event_date),
+            max(f.event_date)
+        FROM (SELECT * FROM "{schema}".fighter_fight{fighters_filter}) AS f
+        JOIN "{schema}".fights AS fights USING (fight_uri)
+        GROUP BY f.fighter''',
+    ]
+
+
+def refresh_fighter_career(
+    cursor: t.Any,
+    schema: str=NORMALIZED_SCHEMA,
+    fighters: t.Optional[t.Iterable[str]]=None,
+) -> None:
+    """Recomputes fighter_career rows of the given fighters (all rows if None) in cursor's transaction.
+    Only fights of these fighters are scanned (fighter_fight is indexed by fighter), 
+    so rows are maintained incrementally by refreshing fighters of every loaded fight"""
+    if fighters is None:
+        for statement in fighter_career_sql(schema=schema):
+            cursor.execute(statement)
+        return
+    fighters = sorted(set(fighters))
+    if len(fighters) == 0:
+        return
+    for statement in fighter_career_sql(schema=schema, fighters_param='%s'):
+        cursor.execute(statement, (fighters,))
+    return
+
+
+def fight_to_normalized_rows(
+    fight_stats_dict: t.Dict[str, t.Any],
+) -> t.Dict[str, t.List[t.Dict[str, t.Any]]]:
+    """Returns {'events': [row], 'fights': [row], 'fighter_fight': [row, row], 'round_stats': [rows]}"""
+    fight_row, round_rows = fight_to_rows(fight_stats_dict)
+    fighter_fight_rows = []
+    for fighter_number, opponent_number in [(1, 2), (2, 1)]:
+        if fight_row[f'fighter{fighter_number}'] is None:
+            continue
+        fighter_fight_rows.append({
+            'fight_uri': fight_row['fight_uri'],
+            'fighter_number': fighter_number,
+            'fighter': fight_row[f'fighter{fighter_number}'],
+            'opponent': fight_row[f'fighter{opponent_number}'],
+            'result': fight_row[f'fighter{fighter_number}_result'],
+            'event_date': fight_row['event_date'],
+        })
+    return {
+        'events': [{column: fight_row[column] for column in _EVENT_COLUMNS}],
+        'fights': [{column: fight_row[column] for column in _FIGHT_COLUMNS}],
+        'fighter_fight': fighter_fight_rows,
+        'round_stats': [round_row for round_row in round_rows if round_row['round'] is not None],
+    }
+
+
+def normalized_tables_rows(
+    all_fights_list: t.Iterable[t.Dict[str, t.Any]],
+) -> t.Dict[str, t.List[t.Dict[str, t.Any]]]:
+    """Returns rows of all normalized tables with only the latest version of every fight and event"""
+    tables_rows = {'events': {}, 'fights': {}, 'fighter_fight': {}, 'round_stats': {}}
+    for fight_stats_dict in all_fights_list:
+        normalized_rows = fight_to_normalized_rows(fight_stats_dict)
+        tables_rows['events'][fight_stats_dict['event_uri']] = normalized_rows['events']
+        for table_name in ['fights', 'fighter_fight', 'round_stats']:
+            tables_rows[table_name][fight_stats_dict['fight_uri']] = normalized_rows[table_name]
+    return {
+        table_name: [row for rows in rows_by_key.values() for row in rows]
+        for table_name, rows_by_key in tables_rows.items()
+    }
+
+
+def fights_to_normalized_postgres(
+    all_fights_list: t.Iterable[t.Dict[str, t.Any]],
+    schema: str=NORMALIZED_SCHEMA,
+    engine: t.Optional[Engine]=None,
+    batch_size: int=1000,
+    revision: t.Optional[int]=None,
+) -> int:
+    """Loads fights into normalized tables (see normalized_tables_ddl), creating them if needed.
+    Every loaded fight replaces its previous version with all its fighter_fight and round_stats rows,
+    so both the whole history and only new and changed fights could be loaded.
+    Rows are streamed with COPY FROM STDIN by batch_size fights, everything is done in one transaction
+
+    Args:
+        all_fights_list: list or iterator of parsed fights
+        schema: where normalized tables are
+        engine: sqlalchemy engine
+        batch_size: how many fights are loaded at once
+        revision: if given - it's recorded as the revision of schema.fights (see processing.get_loaded_revision)
+    Returns:
+        int: number of loaded fights
+    """
+
+    if engine is None:
+        engine = get_pg_engine()
+
+    all_fights_list = iter(all_fights_list)
+    n_loaded = 0
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for statement in normalized_tables_ddl(schema=schema):
+            cursor.execute(statement)
+        # fighter_career is built from scratch if it's added to already loaded tables
+        cursor.execute(_FIGHTER_CAREER_IS_MISSING_SQL.format(schema=schema))
+        rebuild_fighter_career = cursor.fetchone()[0]
+        touched_fighters = set()
+        while True:
+            batch = list(islice(all_fights_list, batch_size))
+            if len(batch) == 0:
+                break
+            tables_rows = normalized_tables_rows(batch)
+
+            cursor.execute('DROP TABLE IF EXISTS pg_temp.events_upsert')
+            cursor.execute(f'CREATE TEMP TABLE pg_temp.events_upsert (LIKE "{schema}".events) ON COMMIT DROP')
+            copy_rows(cursor=cursor, table_sql='pg_temp.events_upsert', columns=_EVENT_COLUMNS, rows=tables_rows['events'])
+            cursor.execute(
+                f'INSERT INTO "{schema}".events AS target SELECT * FROM pg_temp.events_upsert '
+                'ON CONFLICT (event_uri) DO UPDATE SET '
+                '(event_name, event_date, location) = ROW(EXCLUDED.event_name, EXCLUDED.event_date, EXCLUDED.location) '
+                'WHERE ROW(target.event_name, target.event_date, target.location) '
+                'IS DISTINCT FROM ROW(EXCLUDED.event_name, EXCLUDED.event_date, EXCLUDED.location)'
+            )
+            fight_uris = [row['fight_uri'] for row in tables_rows['fights']]
+            # fighters of the previous versions of the fights are refreshed too
+            cursor.execute(f'SELECT DISTINCT fighter FROM "{schema}".fighter_fight WHERE fight_uri = ANY(%s)', (fight_uris,))
+            touched_fighters.update(fighter for fighter, in cursor.fetchall())
+            touched_fighters.update(row['fighter'] for row in tables_rows['fighter_fight'])
+            # fighter_fight and round_stats rows of the fights are deleted too (ON DELETE CASCADE)
+            cursor.execute(f'DELETE FROM "{schema}".fights WHERE fight_uri = ANY(%s)', (fight_uris,))
+            for table_name, columns in [
+                ('fights', _FIGHT_COLUMNS),
+                ('fighter_fight', _FIGHTER_FIGHT_COLUMNS),
+                ('round_stats', _ROUND_STATS_ROW_COLUMNS),
+            ]:
+                copy_rows(
+                    cursor=cursor, table_sql=f'"{schema}".{table_name}', columns=columns, rows=tables_rows[table_name]
+                )
+            n_loaded += len(tables_rows['fights'])
+            if len(batch) < batch_size:
+                break
+        refresh_fighter_career(
+            cursor=cursor, schema=schema, fighters=None if rebuild_fighter_career else touched_fighters
+        )
+        if revision is not None:
+            record_loaded_revision(cursor=cursor, schema=schema, table_name='fights', revision=revision)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return n_loaded
+
+
+class _Rollback(Exception):
+    pass
+
+
+async def fights_to_normalized_postgres_async(
+    all_fights_list: t.Iterable[t.Dict[str, t.Any]],
+    pool: 'asyncpg.Pool',
+    schema: str=NORMALIZED_SCHEMA,
+    revision: t.Optional[int]=None,
+    expected_revision: t.Optional[int]=None,
+    commit_signal: t.Optional[Future]=None,
+) -> t.Optional[int]:
+    """asyncpg counterpart of fights_to_normalized_postgres: rows are loaded with copy_records_to_table 
+    by one pooled connection. Tables are created (if needed) in a separate short transaction, then in one transaction 
+    rows are copied into temp tables first and normalized tables are locked and changed only after that 
+    (and after commit_signal resolves), so they are blocked for the time of a few INSERT ... SELECT statements, 
+    not for the time of the copy or of the caller's work
+
+    Args:
+        all_fights_list: list or iterator of parsed fights
+        pool: asyncpg pool (see db_utils.create_pg_pool)
+        schema: where normalized tables are
+        revision: if given - it's recorded as the revision of schema.fights (see processing.get_loaded_revision)
+        expected_revision: if given - fights are loaded only if schema.fights has this revision loaded, 
+            i.e. all_fights_list are changes made right after it
+        commit_signal: if given - staged rows wait for it (see db_utils.DeferredCommitLoad): if it resolves to None - 
+            nothing is loaded, otherwise it's the revision to record (instead of revision)
+    Returns:
+        Optional[int]: number of loaded fights or None if nothing was loaded
+    """
+
+    tables_rows = normalized_tables_rows(all_fights_list)
+    fight_uris = [row['fight_uri'] for row in tables_rows['fights']]
+    staged_tables = [
+        ('events', _EVENT_COLUMNS),
+        ('fights', _FIGHT_COLUMNS),
+        ('fighter_fight', _FIGHTER_FIGHT_COLUMNS),
+        ('round_stats', _ROUND_STATS_ROW_COLUMNS),
+    ]
+    async with pool.acquire() as connection:
+        # CREATE INDEX IF NOT EXISTS takes a SHARE lock even if the index exists, so tables are created 
+        # in their own short transaction, not in the one, which waits for commit_signal
+        async with connection.transaction():
+            for statement in normalized_tables_ddl(schema=schema) + [loaded_revisions_ddl(schema=schema)]:
+                await connection.execute(statement)
+        try:
+            async with connection.transaction():
+                for table_name, columns in staged_tables:
+                    await connection.execute(f'DROP TABLE IF EXISTS pg_temp.{table_name}_stage')
+                    await connection.execute(
+                        f'CREATE TEMP TABLE {table_name}_stage (LIKE "{schema}".{table_name}) ON COMMIT DROP'
+                    )
+                    await connection.copy_records_to_table(
+                        f'{table_name}_stage',
+                        schema_name='pg_temp',
+                        columns=columns,
+                        records=[tuple(row[column] for column in columns) for row in tables_rows[table_name]],
+                    )
+
+                if commit_signal is not None:
+                    revision = await asyncio.wrap_future(commit_signal)
+                    if revision is None:
+                        raise _Rollback()
+
+                # locks are taken from here on
+                if expected_revision is not None:
+                    loaded_revision = await connection.fetchval(
+                        f'SELECT revision FROM "{schema}"."{LOADED_REVISIONS_TABLE}" WHERE table_name = $1 FOR UPDATE', 
+                        'fights'
+                    )
+                    if loaded_revision != expected_revision:
+                        raise _Rollback()
+                rebuild_fighter_career = await connection.fetchval(_FIGHTER_CAREER_IS_MISSING_SQL.format(schema=schema))
+
+                await connection.execute(
+                    f'INSERT INTO "{schema}".events AS target SELECT * FROM pg_temp.events_stage '
+                    'ON CONFLICT (event_uri) DO UPDATE SET '
+                    '(event_name, event_date, location) = ROW(EXCLUDED.event_name, EXCLUDED.event_date, EXCLUDED.location) '
+                    'WHERE ROW(target.event_name, target.event_date, target.location) '
+                    'IS DISTINCT FROM ROW(EXCLUDED.event_name, EXCLUDED.event_date, EXCLUDED.location)'
+                )
+                # fighters of the previous versions of the fights are refreshed too
+                touched_fighters = set(row['fighter'] for row in tables_rows['fighter_fight']) | set(
+                    record['fighter'] for record in await connection.fetch(
+                        f'SELECT DISTINCT fighter FROM "{schema}".fighter_fight WHERE fight_uri = ANY($1::text[])', 
+                        fight_uris
+                    )
+                )
+                # fighter_fight and round_stats rows of the fights are deleted too (ON DELETE CASCADE)
+                await connection.execute(f'DELETE FROM "{schema}".fights WHERE fight_uri = ANY($1::text[])', fight_uris)
+                for table_name in ['fights', 'fighter_fight', 'round_stats']:
+                    await connection.execute(f'INSERT INTO "{schema}".{table_name} SELECT * FROM pg_temp.{table_name}_stage')
+                if rebuild_fighter_career:
+                    for statement in fighter_career_sql(schema=schema):
+                        await connection.execute(statement)
+                elif len(touched_fighters) > 0:
+                    for statement in fighter_career_sql(schema=schema, fighters_param='$1::text[]'):
+                        await connection.execute(statement, sorted(touched_fighters))
+                if revision is not None:
+                    await connection.execute(
+                        record_loaded_revision_sql(schema=schema, table_name_param='$1', revision_param='$2'),
+                        'fights', revision
+                    )
+        except _Rollback:
+            return None
+    return len(tables_rows['fights'])
@@ -0,0 +1,306 @@
+import io
+import os
+import re
+import sys
+from datetime import datetime, date
+import typing as t
+
+if 'PYTHONPATH' in os.environ:
+	PROJECT_PATH = os.environ["PYTHONPATH"]
+	sys.path.insert(0, PROJECT_PATH)
+else:
+	PROJECT_PATH = '..'
+
+import minio
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+PARQUET_PREFIX = 'parquet'
+FIGHTS_TABLE = 'fights'
+ROUND_STATS_TABLE = 'round_stats'
+
+# fight details key -> (column, type)
+_FIGHT_DETAILS_COLUMNS = {
+    'Method:': ('method', 'str'),
+    'Round:': ('round', 'int'),
+    'Time:': ('time_seconds', 'time'),
+    'Time format:': ('time_format', 'str'),
+    'Referee:': ('referee', 'str'),
+    'Details:': ('details', 'str'),
+}
+
+# per round statistics key -> (column, type). 'of' values (ex. '12 of 30')
+# are split into <column>_landed and <column>_attempted columns
+_ROUND_STATS_COLUMNS = {
+    'KD': ('kd', 'int'),
+    'Sig. str.': ('sig_str', 'of'),
+    'Sig. str. %': ('sig_str_pct', 'pct'),
+    'Total str.': ('total_str', 'of'),
+    'Td': ('td', 'of'),
+    'Td %': ('td_pct', 'pct'),
+    'Sub. att': ('sub_att', 'int'),
+    'Rev.': ('rev', 'int'),
+    'Ctrl': ('ctrl_seconds', 'time'),
+    'Head': ('head', 'of'),
+    'Body': ('body', 'of'),
+    'Leg': ('leg', 'of'),
+    'Distance': ('distance', 'of'),
+    'Clinch': ('clinch', 'of'),
+    'Ground': ('ground', 'of'),
+}
+
+_TIME = re.compile(r'(\d+):(\d{2})')
+_PCT = re.compile(r'(\d+(?:\.\d+)?)\s*%')
+_OF = re.compile(r'(\d+)\s+of\s+(\d+)')
+
+_ARROW_TYPES = {'str': pa.string(), 'int': pa.int32(), 'time': pa.int32(), 'pct': pa.float32()}
+
+
+def _fields(columns: t.Dict[str, t.Tuple[str, str]]) -> t.List[pa.Field]:
+    fields = []
+    for column, column_type in columns.values():
+        if column_type == 'of':
+            fields += [pa.field(f'{column}_landed', pa.int32()), pa.field(f'{column}_attempted', pa.int32())]
+        else:
+            fields.append(pa.field(column, _ARROW_TYPES[column_type]))
+    return fields
+
+
+FIGHTS_SCHEMA = pa.schema([
+    pa.field('fight_uri', pa.string()),
+    pa.field('event_uri', pa.string()),
+    pa.field('event_name', pa.string()),
+    pa.field('event_date', pa.date32()),
+    pa.field('location', pa.string()),
+    pa.field('fight_name', pa.string()),
+    pa.field('fighter1', pa.string()),
+    pa.field('fighter2', pa.string()),
+    pa.field('fighter1_result', pa.string()),
+    pa.field('fighter2_result', pa.string()),
+    *_fields(_FIGHT_DETAILS_COLUMNS),
+])
+
+ROUND_STATS_SCHEMA = pa.schema([
+    pa.field('fight_uri', pa.string()),
+    pa.field('event_date', pa.date32()),
+    pa.field('round', pa.int32()),
+    pa.field('fighter_number', pa.int8()),
+    pa.field('fighter', pa.string()),
+    *_fields(_ROUND_STATS_COLUMNS),
+])
+
+
+def _parse_int(value: str) -> t.Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_time(value: str) -> t.Optional[int]:
+    """'4:35' -> 275 seconds"""
+    match = _TIME.fullmatch(str(value).strip())
+    return int(match.group(1)) * 60 + int(match.group(2)) if match is not None else None
+
+
+def _parse_pct(value: str) -> t.Optional[float]:
+    """'45%' -> 0.45"""
+    match = _PCT.fullmatch(str(value).strip())
+    return float(match.group(1)) / 100 if match is not None else None
+
+
+def _parse_of(value: str) -> t.Tuple[t.Optional[int], t.Optional[int]]:
+    """'12 of 30' -> (12, 30)"""
+    match = _OF.fullmatch(str(value).strip())
+    return (int(match.group(1)), int(match.group(2))) if match is not None else (None, None)
+
+
+def _parse_date(value: str) -> t.Optional[date]:
+    """'May 20, 2023' -> date(2023, 5, 20)"""
+    try:
+        return datetime.strptime(str(value).strip(), '%B %d, %Y').date()
+    except ValueError:
+        return None
+
+
+def _typed_columns(
+    values: t.Dict[str, t.Any],
+    columns: t.Dict[str, t.Tuple[str, str]],
+    i: t.Optional[int]=None,
+) -> t.Dict[str, t.Any]:
+    """Turns raw parsed values into typed columns. If i is not None - i-th value of every list is taken"""
+    row = {}
+    for key, (column, column_type) in columns.items():
+        value = values.get(key)
+        if i is not None:
+            value = value[i] if isinstance(value, list) and len(value) > i else None
+        if column_type == 'of':
+            row[f'{column}_landed'], row[f'{column}_attempted'] = _parse_of(value)
+        elif column_type == 'int':
+            row[column] = _parse_int(value)
+        elif column_type == 'time':
+            row[column] = _parse_time(value)
+        elif column_type == 'pct':
+            row[column] = _parse_pct(value)
+        else:
+            row[column] = str(value).strip() if value is not None else None
+    return row
+
+
+def fight_year(fight_stats_dict: t.Dict[str, t.Any]) -> int:
+    """Returns year of the fight's event (0 if event date is unknown), by which tables are partitioned"""
+    event_date = _parse_date(fight_stats_dict.get('date'))
+    return event_date.year if event_date is not None else 0
+
+
+def fight_to_rows(
+    fight_stats_dict: t.Dict[str, t.Any],
+) -> t.Tuple[t.Dict[str, t.Any], t.List[t.Dict[str, t.Any]]]:
+    """Turns one parsed fight into a row of fights table and rows of round_stats table
+    (one row per round per fighter)"""
+
+    event_date = _parse_date(fight_stats_dict.get('date'))
+    names = list(fight_stats_dict.get('names') or [])
+    results = list((fight_stats_dict.get('winloose') or {}).values())
+    fight_row = {
+        'fight_uri': fight_stats_dict['fight_uri'],
+        'event_uri': fight_stats_dict.get('event_uri'),
+        'event_name': fight_stats_dict.get('event_name'),
+        'event_date': event_date,
+        'location': fight_stats_dict.get('location'),
+        'fight_name': fight_stats_dict.get('fight_name'),
+        'fighter1': names[0] if len(names) > 0 else None,
+        'fighter2': names[1] if len(names) > 1 else None,
+        'fighter1_result': results[0] if len(results) > 0 else None,
+        'fighter2_result': results[1] if len(results) > 1 else None,
+        **_typed_columns(values=fight_stats_dict, columns=_FIGHT_DETAILS_COLUMNS),
+    }
+
+    round_rows = []
+    for round_name, round_stats in (fight_stats_dict.get('per_round_stats') or {}).items():
+        for i in range(2):
+            fighters = round_stats.get('Fighter') or []
+            round_rows.append({
+                'fight_uri': fight_stats_dict['fight_uri'],
+                'event_date': event_date,
+                'round': _parse_int(str(round_name).split(' ')[-1]),
+                'fighter_number': i + 1,
+                'fighter': fighters[i] if len(fighters) > i else None,
+                **_typed_columns(values=round_stats, columns=_ROUND_STATS_COLUMNS, i=i),
+            })
+    return fight_row, round_rows
+
+
+def fights_to_arrow_tables(
+    fights: t.Iterable[t.Dict[str, t.Any]],
+) -> t.Dict[str, t.Dict[int, pa.Table]]:
+    """Returns {'fights': {year: pa.Table}, 'round_stats': {year: pa.Table}} (year is event's year,
+    0 if event date is unknown)"""
+
+    rows = {FIGHTS_TABLE: {}, ROUND_STATS_TABLE: {}}
+    for fight_stats_dict in fights:
+        fight_row, round_rows = fight_to_rows(fight_stats_dict)
+        year = fight_year(fight_stats_dict)
+        rows[FIGHTS_TABLE].setdefault(year, []).append(fight_row)
+        rows[ROUND_STATS_TABLE].setdefault(year, []).extend(round_rows)
+
+    schemas = {FIGHTS_TABLE: FIGHTS_SCHEMA, ROUND_STATS_TABLE: ROUND_STATS_SCHEMA}
+    return {
+        table_name: {
+            year: pa.Table.from_pylist(year_rows, schema=schemas[table_name])
+            for year, year_rows in tables_rows.items()
+        }
+        for table_name, tables_rows in rows.items()
+    }
+
+
+def parquet_object_name(table_name: str, year: int, prefix: str=PARQUET_PREFIX) -> str:
+    """Returns name of the object with one year of the table: <prefix>/<table_name>/year=<year>/part-0.parquet"""
+    return f'{prefix}/{table_name}/year={year}/part-0.parquet'
+
+
+def save_parquet_to_minio(
+    fights: t.Iterable[t.Dict[str, t.Any]],
+    minio_client: minio.api.Minio,
+    bucket_name: str='ufc-raw-data',
+    prefix: str=PARQUET_PREFIX,
+    compression: str='zstd',
+) -> t.List[str]:
+    """Saves fights and round_stats tables partitioned by event year as parquet files
+    (see parquet_object_name), replacing the previous version of every written year.
+    So fights should contain all fights of every year, which is written
+
+    Args:
+        fights: list or iterator of parsed fights
+        minio_client: minio client
+        bucket_name: bucket to save to
+        prefix: where tables are kept in the bucket
+        compression: parquet compression codec
+    Returns:
+        List[str]: names of written objects
+    """
+
+    written_objects = []
+    for table_name, tables in fights_to_arrow_tables(fights).items():
+        for year, table in tables.items():
+            buffer = io.BytesIO()
+            pq.write_table(table, buffer, compression=compression)
+            object_name = parquet_object_name(table_name=table_name, year=year, prefix=prefix)
+            minio_client.put_object(
+                bucket_name=bucket_name,
+                object_name=object_name,
+                data=io.BytesIO(buffer.getbuffer()),
+                length=buffer.getbuffer().nbytes,
+                content_type='application/vnd.apache.parquet',
+            )
+            written_objects.append(object_name)
+    return written_objects
+
+
+def load_parquet_from_minio(
+    minio_client: minio.api.Minio,
+    bucket_name: str='ufc-raw-data',
+    table_name: str=FIGHTS_TABLE,
+    prefix: str=PARQUET_PREFIX,
+    years: t.Optional[t.Iterable[int]]=None,
+    columns: t.Optional[t.List[str]]=None,
+    filters: t.Optional[t.List[t.Tuple[str, str, t.Any]]]=None,
+) -> pd.DataFrame:
+    """Loads table saved by save_parquet_to_minio. Only files of the given years are downloaded,
+    only the given columns are decoded and row groups, which don't match filters, are skipped
+
+    Args:
+        minio_client: minio client
+        bucket_name: bucket to load from
+        table_name: 'fights' or 'round_stats'
+        prefix: where tables are kept in the bucket
+        years: which years to load (all if None)
+        columns: which columns to load (all if None)
+        filters: pyarrow filters (ex. [('event_date', '>=', date(2020, 1, 1))])
+    Returns:
+        pd.DataFrame: table with year column
+    """
+
+    years = set(int(year) for year in years) if years is not None else None
+    tables = []
+    for minio_object in minio_client.list_objects(bucket_name, prefix=f'{prefix}/{table_name}/', recursive=True):
+        match = re.search(r'/year=(\d+)/', minio_object.object_name)
+        if match is None or not minio_object.object_name.endswith('.parquet'):
+            continue
+        year = int(match.group(1))
+        if years is not None and year not in years:
+            continue
+        response = minio_client.get_object(bucket_name=bucket_name, object_name=minio_object.object_name)
+        try:
+            content = response.read()
+        finally:
+            response.close()
+            response.release_conn()
+        table = pq.read_table(pa.BufferReader(content), columns=columns, filters=filters)
+        tables.append(table.append_column('year', pa.array([year] * table.num_rows, type=pa.int16())))
+
+    if len(tables) == 0:
+        return pd.DataFrame()
+    return pa.concat_tables(tables).to_pandas()
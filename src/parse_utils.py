@@ -15,9 +15,11 @@ try:
 except Exception as e:
 	color_print = lambda x, color='green': print(x)
 
-import requests
 from bs4 import BeautifulSoup
 
+from src.fetch_utils import PageFetcher, get_default_fetcher
+from src.fast_parse_utils import parse_one_fight_page_fast
+
 fightInfoType = Dict[str, Any]
 
 def get_fight_name(fight_info: fightInfoType) -> str:
@@ -43,6 +45,7 @@ def get_fight_name(fight_info: fightInfoType) -> str:
 def get_events_list(
 		main_page_url: str="http://www.ufcstats.com/statistics/events/completed?page=all",
 		verbose: bool=False,
+		fetcher: Optional[PageFetcher]=None,
 ) -> (List[Dict[str, str]], bool):
 
 	"""
@@ -50,18 +53,35 @@ def get_events_list(
 	fights as list
 	:param main_page_url: "http://www.ufcstats.com/statistics/events/completed?page=all"
 	:param verbose: whether to print error logs, during parsing
+	:param fetcher: what to download pages with. If None - shared HttpFetcher is used
 	:return: List of fights and status_ok - bool variable, which is True, when all the dictionaries have
 		the same amount of keys
 	"""
 
-	page = requests.get(main_page_url)
-	soup = BeautifulSoup(page.content, 'lxml')
-	table_rows = soup.find_all("tr", {"class": "b-statistics__table-row"})
+	if fetcher is None:
+		fetcher = get_default_fetcher()
+	page = fetcher.get(main_page_url)
+	soup = BeautifulSoup(page, 'lxml')
+	return parse_events_list_page(events_list_page=soup, verbose=verbose)
+
+
+def parse_events_list_page(
+		events_list_page: BeautifulSoup,
+		verbose: bool=False,
+) -> (List[Dict[str, str]], bool):
+	"""
+	Parses already downloaded events list page (whole listing or one page of it). See get_events_list
+	:return: List of fights and status_ok
+	"""
+
+	table_rows = events_list_page.find_all("tr", {"class": "b-statistics__table-row"})
 	resulting_list = []
 	status_ok = True
 	n_prev_dict_keys = None
 	for i, elem in enumerate(table_rows):
-		if i < 2:
+		# header, empty spacer row and upcoming event (b-statistics__table-row_type_first) aren't completed
+		# events. How many of them are at the top differs between listing pages, so they are skipped by structure
+		if 'b-statistics__table-row_type_first' in elem.get('class', []) or elem.find("a", href=True) is None:
 			continue
 
 		curr_dict = {}
@@ -115,7 +135,62 @@ def get_events_list(
 	return resulting_list, status_ok
 
 
-def get_events_info(event_urls: List[str]) -> Dict[str, List[Dict[Any, Any]]]:
+def get_new_events_list(
+		known_events_set: Set[str],
+		events_page_url_template: str="http://www.ufcstats.com/statistics/events/completed?page={page}",
+		max_pages: Optional[int]=None,
+		n_known_events: int=0,
+		verbose: bool=False,
+		fetcher: Optional[PageFetcher]=None,
+) -> (List[Dict[str, str]], bool):
+	"""
+	Walks paginated events listing newest-first and stops at the first event, which is already 
+	in known_events_set. So when only a couple of events are new - only the first listing page is downloaded
+	instead of the whole history
+	:param known_events_set: set of already parsed events urls
+	:param events_page_url_template: url of one listing page with {page} placeholder for page number (from 1)
+	:param max_pages: if not None - doesn't download more than max_pages listing pages
+	:param n_known_events: how many already known events to return after the new ones 
+		(ex. to recheck fights of the latest events)
+	:param verbose: whether to print error logs, during parsing
+	:param fetcher: what to download pages with. If None - shared HttpFetcher is used
+	:return: List of new events (newest first, in the same format as get_events_list) and status_ok
+	"""
+
+	if fetcher is None:
+		fetcher = get_default_fetcher()
+	resulting_list = []
+	status_ok = True
+	seen_events_set = set()
+	page_number = 1
+	while max_pages is None or page_number <= max_pages:
+		page = fetcher.get(events_page_url_template.format(page=page_number))
+		events_list, page_status_ok = parse_events_list_page(
+			events_list_page=BeautifulSoup(page, 'lxml'), verbose=verbose
+		)
+		status_ok = status_ok and page_status_ok
+
+		# pages after the last one are either empty or repeat the last page
+		page_events = [event for event in events_list if event.get('event_url') not in seen_events_set]
+		if len(page_events) == 0:
+			break
+		for event in page_events:
+			if event.get('event_url') in known_events_set:
+				if n_known_events <= 0:
+					if verbose:
+						color_print(f"Stopped at known event {event.get('event_url')} (page={page_number})", color='green')
+					return resulting_list, status_ok
+				n_known_events -= 1
+			seen_events_set.add(event.get('event_url'))
+			resulting_list.append(event)
+		page_number += 1
+	return resulting_list, status_ok
+
+
+def get_events_info(
+		event_urls: List[str], 
+		fetcher: Optional[PageFetcher]=None,
+) -> Dict[str, List[Dict[Any, Any]]]:
 
 	"""
 	Parses detailed info about events
@@ -128,6 +203,7 @@ def get_events_info(event_urls: List[str]) -> Dict[str, List[Dict[Any, Any]]]:
 					"http://www.ufcstats.com/event-details/31da66df48c0c1a0",
 					...
 				]
+		:param fetcher: what to download pages with. If None - shared HttpFetcher is used
 	:return:
 		events_stats_dict: Dict with keys - fights_urls, values - dict with fight info
 
@@ -528,10 +604,12 @@ def get_events_info(event_urls: List[str]) -> Dict[str, List[Dict[Any, Any]]]:
 
 	"""
 
+	if fetcher is None:
+		fetcher = get_default_fetcher()
 	events_stats_dict = {}
 	for event_url in tqdm(event_urls):
-		one_event = requests.get(event_url)
-		one_event = BeautifulSoup(one_event.content, 'lxml')
+		one_event = fetcher.get(event_url)
+		one_event = BeautifulSoup(one_event, 'lxml')
 
 		fights_in_1_event = (
 			one_event
@@ -571,12 +649,16 @@ def get_events_info(event_urls: List[str]) -> Dict[str, List[Dict[Any, Any]]]:
 	return events_stats_dict
 
 
-def get_winloose_status(one_fight_page: Union[BeautifulSoup, str]) -> Dict[str, str]:
+def get_winloose_status(
+		one_fight_page: Union[BeautifulSoup, str], 
+		fetcher: Optional[PageFetcher]=None,
+) -> Dict[str, str]:
 	"""
     Returns who of fighters won the fight in form of mapping: {fighter1: status1, fighter2: status2}
 
     Args:
         one_fight_page: fight uri (ex: 'http://www.ufcstats.com/fight-details/72c3e5eacde4f0e5') or Beautiful soup
+        fetcher: what to download the page with, when one_fight_page is uri. If None - shared HttpFetcher is used
     Returns:
         resulting_dict: {fighter1: status1, fighter2: status2}
 
@@ -606,8 +688,10 @@ def get_winloose_status(one_fight_page: Union[BeautifulSoup, str]) -> Dict[str,
     """
 
 	if isinstance(one_fight_page, str):
-		one_fight = requests.get(one_fight_page)
-		one_fight = BeautifulSoup(one_fight.content, 'lxml')
+		if fetcher is None:
+			fetcher = get_default_fetcher()
+		one_fight = fetcher.get(one_fight_page)
+		one_fight = BeautifulSoup(one_fight, 'lxml')
 	else:
 		one_fight = one_fight_page
 
@@ -643,13 +727,17 @@ def get_winloose_status(one_fight_page: Union[BeautifulSoup, str]) -> Dict[str,
 	return resulting_dict
 
 
-def get_fighters_info(fighters_stats_url: str=None) -> (List[Dict[str, Any]], bool):
+def get_fighters_info(
+		fighters_stats_url: str=None, 
+		fetcher: Optional[PageFetcher]=None,
+) -> (List[Dict[str, Any]], bool):
 
 	"""
 	Parses fighters stats page
 
 	Args:
 		:param fighters_stats_url: 'http://www.ufcstats.com/statistics/fighters?char=a&page=all'
+		:param fetcher: what to download pages with. If None - shared HttpFetcher is used
 	Returns:
 		overall_fighters_list: List of dicts with fighters info (weight, height, etc.)
 		status_ok: whether columns_names are the same across different fighters stats pages (
@@ -658,6 +746,8 @@ def get_fighters_info(fighters_stats_url: str=None) -> (List[Dict[str, Any]], bo
 		)
 	"""
 
+	if fetcher is None:
+		fetcher = get_default_fetcher()
 	alphabet = 'abcdefghijklmnopqrstuvwxyz'
 	prev_columns_names_set = None
 	status_ok = True
@@ -669,8 +759,8 @@ def get_fighters_info(fighters_stats_url: str=None) -> (List[Dict[str, Any]], bo
 		else:
 			fighters_stats_url = fighters_stats_url.replace("char=a", f"char={letter}")
 
-		fighters_page_for_one_letter = requests.get(fighters_stats_url)
-		fighters_page_for_one_letter = BeautifulSoup(fighters_page_for_one_letter.content, 'lxml')
+		fighters_page_for_one_letter = fetcher.get(fighters_stats_url)
+		fighters_page_for_one_letter = BeautifulSoup(fighters_page_for_one_letter, 'lxml')
 
 		columns_names = (
 			fighters_page_for_one_letter
@@ -1121,12 +1211,68 @@ def get_per_round_stats(one_fight_page: BeautifulSoup) -> Dict[str, Any]:
 	return full_stats_dict
 
 
-def get_one_fight_stats(fight_uri: str) -> Dict[Any, Any]:
+def get_fight_uris_from_event_page(one_event_page: BeautifulSoup) -> List[str]:
+	"""
+	Returns fights uris listed on event page (ex. http://www.ufcstats.com/event-details/4f853e98886283cf)
+	in the order they appear on the page
+	"""
+	fights_rows = (
+		one_event_page
+		.find_all(
+			"tr", {"class": "b-fight-details__table-row b-fight-details__table-row__hover js-fight-details-click"}
+		)
+	)
+	fight_uris = []
+	for one_fight in fights_rows:
+		fight_uri = [
+			row.replace('data-link', '').replace('=', '').replace('"', '')
+			for row in str(one_fight).split() if 'data-link' in row
+		][0]
+		fight_uris.append(fight_uri)
+	return fight_uris
+
+
+def parse_one_fight_page(one_fight_page: BeautifulSoup) -> Dict[Any, Any]:
+	"""
+	Returns fight statistics from already downloaded fight page. See get_one_fight_stats for the output example
+	"""
+	fight_stats_dict = {}
+	fight_stats_dict['names'] = get_fighters_names(one_fight_page=one_fight_page)
+	fight_stats_dict['fight_name'] = get_one_fight_name(one_fight_page=one_fight_page)
+	fight_stats_dict['winloose'] = get_winloose_status(one_fight_page=one_fight_page)
+	details_dict = get_one_fight_details(one_fight_page=one_fight_page)
+	fight_stats_dict.update(details_dict)
+	try:
+		fight_stats_dict['per_round_stats'] = get_per_round_stats(one_fight_page=one_fight_page)
+	except Exception as e:
+		print("can't get per round statistics!")
+		print(e, end='\n\n')
+	return fight_stats_dict
+
+
+def parse_fight_page_content(content: bytes, use_fast_parser: bool=False) -> Dict[Any, Any]:
+	"""
+	Returns fight statistics from raw fight page. It's a top-level function of bytes, 
+	so that it could be sent to worker processes
+	"""
+	if use_fast_parser:
+		return parse_one_fight_page_fast(content=content)
+	return parse_one_fight_page(one_fight_page=BeautifulSoup(content, 'lxml'))
+
+
+def get_one_fight_stats(
+		fight_uri: str, 
+		fetcher: Optional[PageFetcher]=None,
+		use_fast_parser: bool=False,
+) -> Dict[Any, Any]:
 	"""
     Parses fight_uri page (ex. http://www.ufcstats.com/fight-details/72c3e5eacde4f0e5) and returns fight statistics
 
     Args:
         fight_uri: for example "http://www.ufcstats.com/fight-details/72c3e5eacde4f0e5"
+        fetcher: what to download the page with. If None - shared HttpFetcher is used
+        use_fast_parser: whether to parse the page with fast_parse_utils.parse_one_fight_page_fast 
+            (several times faster, tests/test_fast_parse_utils.py checks that the result is the same)
     Returns:
         fight_stats_dict: see example below
 
@@ -1313,20 +1459,10 @@ def get_one_fight_stats(fight_uri: str) -> Dict[Any, Any]:
                                  'Total str.': ['16 of 24', '42 of 55']}}}
     """
 
-	fight_stats_dict = {}
-	one_fight_stats_page = requests.get(fight_uri)
-	one_fight_stats_page = BeautifulSoup(one_fight_stats_page.content, 'lxml')
-	fight_stats_dict['names'] = get_fighters_names(one_fight_page=one_fight_stats_page)
-	fight_stats_dict['fight_name'] = get_one_fight_name(one_fight_page=one_fight_stats_page)
-	fight_stats_dict['winloose'] = get_winloose_status(one_fight_page=one_fight_stats_page)
-	details_dict = get_one_fight_details(one_fight_page=one_fight_stats_page)
-	fight_stats_dict.update(details_dict)
-	try:
-		fight_stats_dict['per_round_stats'] = get_per_round_stats(one_fight_page=one_fight_stats_page)
-	except Exception as e:
-		print("can't get per round statistics!")
-		print(e, end='\n\n')
-	return fight_stats_dict
+	if fetcher is None:
+		fetcher = get_default_fetcher()
+	one_fight_stats_page = fetcher.get(fight_uri)
+	return parse_fight_page_content(content=one_fight_stats_page, use_fast_parser=use_fast_parser)
 
 
 
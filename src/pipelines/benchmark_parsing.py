@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import cProfile
+import pstats
+import argparse
+from typing import List, Tuple, Dict, Set, Any, Optional, Callable, Union
+if 'PYTHONPATH' in os.environ:
+	PROJECT_PATH = os.environ["PYTHONPATH"]
+	sys.path.insert(0, PROJECT_PATH)
+else:
+	PROJECT_PATH = '..'
+
+try:
+	from fabulous import color as fb_color
+	color_print = lambda x, color='green': print(getattr(fb_color, color)(x)) if 'fb_color' in globals() else print(x)
+except Exception as e:
+	color_print = lambda x, color='green': print(x)
+
+from src.pipelines.parse_all_fights import parse_all_fights
+
+
+def parse_cli():
+
+	parser = argparse.ArgumentParser(
+		description='Replays pages recorded with `parse_all_fights.py --record_dir` through the whole '
+			'parse_all_fights pipeline without network and reports parsing throughput'
+	)
+	parser.add_argument(
+		"--corpus_dir",
+		help='Directory with pages recorded by parse_all_fights.py --record_dir',
+		type=str,
+		required=True
+	)
+	parser.add_argument(
+		"--n_repeats",
+		help='How many times to parse the whole corpus',
+		type=int,
+		default=3
+	)
+	parser.add_argument(
+		'--use_fast_parser', 
+		dest='use_fast_parser', 
+		default=False, 
+		action='store_true',
+		help='Whether to parse fights pages with the fast lxml parser (fast_parse_utils) instead of BeautifulSoup'
+	)
+	parser.add_argument(
+		"--profile_path",
+		help='If given - cProfile stats of the first run are saved there',
+		type=str,
+		default=None
+	)
+	parser.add_argument(
+		"--save_path",
+		help='If given - parsed fights are saved there (to compare parser versions later with --reference_path)',
+		type=str,
+		default=None
+	)
+	parser.add_argument(
+		"--reference_path",
+		help='If given - parsed fights are compared with fights saved there by another parser version',
+		type=str,
+		default=None
+	)
+	parser.add_argument(
+		"--min_fights_per_second",
+		help='If given - exits with non-zero code when throughput is lower',
+		type=float,
+		default=None
+	)
+
+	args = parser.parse_args()
+	return args
+
+
+def fights_list_hash(all_fights_list: List[Dict[str, Any]]) -> str:
+	"""Returns sha256 of fights list, which is the same for the same parsing results"""
+	return hashlib.sha256(
+		json.dumps(all_fights_list, ensure_ascii=False, sort_keys=True).encode('utf-8')
+	).hexdigest()
+
+
+def benchmark_parsing(
+		corpus_dir: str,
+		n_repeats: int=3,
+		profile_path: Optional[str]=None,
+		use_fast_parser: bool=False,
+	) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+	"""
+	Parses recorded corpus n_repeats times and returns parsed fights and timings
+	:param corpus_dir: directory with pages recorded by parse_all_fights(record_dir=...)
+	:param n_repeats: how many times to parse the whole corpus
+	:param profile_path: if not None - cProfile stats of the first run are dumped there
+	:param use_fast_parser: whether to parse fights pages with fast_parse_utils instead of BeautifulSoup
+	:return: (all_fights_list, {'best_seconds': ..., 'mean_seconds': ..., 'fights_per_second': ...})
+	"""
+
+	timings = []
+	all_fights_list = []
+	for i in range(n_repeats):
+		profiler = cProfile.Profile() if profile_path is not None and i == 0 else None
+		st = time.perf_counter()
+		if profiler is not None:
+			profiler.enable()
+		all_fights_list = parse_all_fights(
+			save_path=None, replay_dir=corpus_dir, use_fast_parser=use_fast_parser
+		)
+		if profiler is not None:
+			profiler.disable()
+		timings.append(time.perf_counter() - st)
+		if profiler is not None:
+			profiler.dump_stats(profile_path)
+			pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+	best_seconds = min(timings)
+	stats = {
+		'n_fights': len(all_fights_list),
+		'best_seconds': best_seconds,
+		'mean_seconds': sum(timings) / len(timings),
+		'fights_per_second': len(all_fights_list) / best_seconds if best_seconds > 0 else float('inf'),
+	}
+	return all_fights_list, stats
+
+
+if __name__ == '__main__':
+
+	args = parse_cli()
+	all_fights_list, stats = benchmark_parsing(
+		corpus_dir=args.corpus_dir,
+		n_repeats=args.n_repeats,
+		profile_path=args.profile_path,
+		use_fast_parser=args.use_fast_parser,
+	)
+	print(f"n_fights: {stats['n_fights']:,}")
+	print(f"best: {stats['best_seconds']:.2f}s, mean: {stats['mean_seconds']:.2f}s")
+	print(f"fights per second: {stats['fights_per_second']:.1f}")
+	print(f"result hash: {fights_list_hash(all_fights_list)}")
+
+	if args.save_path is not None:
+		json.dump(
+			all_fights_list,
+			open(args.save_path, mode='w', encoding='utf-8'),
+			ensure_ascii=False,
+			indent=2
+		)
+
+	status_ok = True
+	if args.reference_path is not None:
+		reference_fights_list = json.load(open(args.reference_path, mode='r', encoding='utf-8'))
+		if fights_list_hash(reference_fights_list) == fights_list_hash(all_fights_list):
+			color_print('Parsed fights are the same as in reference!', color='green')
+		else:
+			status_ok = False
+			color_print('Parsed fights differ from reference!', color='red')
+
+	if args.min_fights_per_second is not None and stats['fights_per_second'] < args.min_fights_per_second:
+		status_ok = False
+		color_print(
+			f"Throughput {stats['fights_per_second']:.1f} fights/s is lower than {args.min_fights_per_second}!",
+			color='red'
+		)
+
+	sys.exit(0 if status_ok else 1)
@@ -4,6 +4,7 @@ import logging
 from dotenv import load_dotenv
 import time
 from datetime import datetime
+from concurrent.futures import Future
 import argparse
 from typing import List, Tuple, Dict, Set, Any, Optional, Callable, Union
 if 'PYTHONPATH' in os.environ:
@@ -25,20 +26,49 @@ from prefect import task, flow
 from prefect.task_runners import SequentialTaskRunner
 
 
-from src.processing import minio_data_to_pandas, minio_data_to_postgres
+from src.processing import (
+	minio_data_to_pandas, 
+	minio_data_to_postgres, 
+	upsert_fights_to_postgres,
+	get_loaded_revision,
+	get_changed_events,
+	get_changed_fights,
+	merge_fights,
+)
 from src.pipelines.parse_all_fights import parse_all_fights
 from src.parse_utils import get_events_list, get_one_fight_stats
 from src.minio_utils import (
     initialize_minio_client, 
-    load_json_from_minio, 
-    minio_container_ipaddr,
+    iter_fights_from_events_partitions,
+    iter_json_from_minio, 
+    save_events_partitions_to_minio,
     save_json_to_minio
 )
-from src.db_utils import get_pg_engine
+from src.db_utils import DeferredCommitLoad, asyncpg, create_pg_pool, get_pg_engine
+from src.parquet_utils import fight_year, save_parquet_to_minio
+from src.normalized_utils import (
+	NORMALIZED_SCHEMA, 
+	fights_to_normalized_postgres, 
+	fights_to_normalized_postgres_async,
+)
+from src.manifest_utils import (
+	load_changes_from_minio,
+	load_known_fights_from_minio,
+	load_manifest_from_minio,
+	manifest_object_name,
+	new_manifest,
+	save_changes_to_minio,
+	save_fingerprints_to_minio,
+	save_manifest_to_minio,
+	update_manifest,
+)
+from src.journal_utils import remove_journal
 
 load_dotenv()
 MINIO_ACCESS_KEY = os.environ['MINIO_ACCESS_KEY']
 MINIO_SECRET_KEY = os.environ['MINIO_SECRET_KEY']
+# journal is kept next to the pages cache (see --page_cache_dir), not in the directory the flow is started from
+DEFAULT_JOURNAL_PATH = '~/.cache/ufc_journal/parse_all_fights_journal.jsonl'
 
 
 def parse_cli():
@@ -62,6 +92,70 @@ def parse_cli():
         type=str,
         default='ufc_stats.json'
     )
+	parser.add_argument(
+		"--minio_events_prefix",
+		help='If given - fights are kept in minio partitioned by events under this prefix '
+			'(<prefix>/<year>/<event_id>.json) instead of one --minio_object_name object',
+		type=str,
+		default=None
+	)
+	parser.add_argument(
+		"--minio_compression",
+		help='How to compress fights saved to minio: gzip, zstd or none',
+		type=str,
+		default=None
+	)
+	parser.add_argument(
+		"--minio_serialization",
+		help='How to encode fights saved to minio: json or msgpack (compact binary encoding). '
+			'Both are read back transparently',
+		type=str,
+		default='json'
+	)
+	parser.add_argument(
+		"--journal_path",
+		help='Where to journal parsed fights, so that failed parsing is resumed on retry ("none" - not to journal)',
+		type=str,
+		default=DEFAULT_JOURNAL_PATH
+	)
+	parser.add_argument(
+		"--recheck_last_n_events",
+		help='How many latest already parsed events to check for new and changed fights. '
+			'Every rechecked event costs its event page and all its fights pages (~12) on every run, '
+			'unless they are revalidated from --page_cache_dir',
+		type=int,
+		default=3
+	)
+	parser.add_argument(
+		"--page_cache_dir",
+		help='Where to cache downloaded pages, so that rechecked pages are revalidated with conditional GET '
+			'and downloaded again only if they have changed ("none" - not to cache)',
+		type=str,
+		default='~/.cache/ufc_pages'
+	)
+	parser.add_argument(
+		'--no_parquet', 
+		dest='export_parquet', 
+		default=True, 
+		action='store_false',
+		help='Whether not to export fights and round_stats parquet tables to minio'
+	)
+	parser.add_argument(
+		'--postgres_full_reload', 
+		dest='postgres_upsert', 
+		default=True, 
+		action='store_false',
+		help='Whether to rebuild raw_data.all_fights_info in postgres from all fights '
+			'instead of upserting only new and changed ones'
+	)
+	parser.add_argument(
+		'--no_postgres_async', 
+		dest='postgres_async', 
+		default=True, 
+		action='store_false',
+		help='Whether not to load new and changed fights to normalized postgres tables '
+			'(with asyncpg) while they are saved to minio'
+	)
 	parser.add_argument('--verbose', dest='verbose', default=False, action='store_true')
 	args = parser.parse_args()
 	return args
@@ -69,8 +163,8 @@ def parse_cli():
 def get_initialized_minio_client(verbose: bool=False) -> MinioClient:
 	if verbose:
 		print("initialize_minio_client...")
+	# client is created once and reused by all tasks (see initialize_minio_client)
 	minio_client = initialize_minio_client(
-        ipaddr=minio_container_ipaddr(),
         access_key=MINIO_ACCESS_KEY,
         secret_key=MINIO_SECRET_KEY,
         port_number=9000
@@ -87,31 +181,200 @@ def load_parsed_fights_from_minio(
     bucket_name: str, 
     object_name: str,
     minio_client: Optional[MinioClient]=None,
+	events_prefix: Optional[str]=None,
 	verbose: bool=False
 ) -> List[Dict[Any, Any]]:
 	all_fights_list = None
 	if minio_client is None:
 		minio_client = get_initialized_minio_client(verbose=verbose)
 	
+	if events_prefix is not None:
+		if verbose: 
+			print("iter_fights_from_events_partitions...")
+		return list(iter_fights_from_events_partitions(
+			minio_client=minio_client,
+			bucket_name=bucket_name,
+			prefix=events_prefix,
+		))
+
 	if verbose: 
-		print("load_json_from_minio...")
-	all_fights_list = load_json_from_minio(
+		print("iter_json_from_minio...")
+	all_fights_list = list(iter_json_from_minio(
         minio_client=minio_client,
         bucket_name=bucket_name,
         object_name=object_name,
-    )
+    ))
 	return all_fights_list
 
+@task(
+	name='load_events_fights_from_minio',
+	retries=3,
+	retry_delay_seconds=10,
+	log_prints=True,
+)
+def load_events_fights_from_minio(
+    bucket_name: str, 
+    manifest: Dict[str, Any],
+    event_uris: Set[str],
+    minio_client: Optional[MinioClient]=None,
+	verbose: bool=False
+) -> List[Dict[Any, Any]]:
+	"""Loads only partitions of the given events (which are in manifest)"""
+	if minio_client is None:
+		minio_client = get_initialized_minio_client(verbose=verbose)
+
+	partitions_names = sorted(set(
+		manifest['events'][event_uri]['object_name'] for event_uri in event_uris if event_uri in manifest['events']
+	))
+	if verbose: 
+		print(f"loading {len(partitions_names)} events partitions...")
+	return [
+		fight_info 
+		for partition_name in partitions_names 
+		for fight_info in iter_json_from_minio(
+			minio_client=minio_client,
+			bucket_name=bucket_name,
+			object_name=partition_name,
+		)
+	]
+
+@task(
+	name='load_manifest',
+	retries=3,
+	retry_delay_seconds=10,
+	log_prints=True,
+)
+def load_manifest(
+    bucket_name: str, 
+    manifest_name: str,
+    minio_client: Optional[MinioClient]=None,
+	verbose: bool=False
+) -> Optional[Dict[str, Any]]:
+	if minio_client is None:
+		minio_client = get_initialized_minio_client(verbose=verbose)
+	if verbose: 
+		print("load_manifest_from_minio...")
+	return load_manifest_from_minio(
+		minio_client=minio_client,
+		bucket_name=bucket_name,
+		manifest_name=manifest_name,
+	)
+
+@task(
+	name='saving_manifest_to_minio',
+	retries=3,
+	retry_delay_seconds=10,
+	log_prints=True,
+)
+def saving_manifest_to_minio(
+    manifest: Dict[str, Any],
+    bucket_name: str, 
+    manifest_name: str,
+    minio_client: Optional[MinioClient]=None,
+	verbose: bool=False
+) -> None:
+	if minio_client is None:
+		minio_client = get_initialized_minio_client(verbose=verbose)
+	if verbose: 
+		print(f"save_manifest_to_minio ({manifest['n_events']} events, {manifest['n_fights']} fights)...")
+	save_manifest_to_minio(
+		manifest=manifest,
+		minio_client=minio_client,
+		bucket_name=bucket_name,
+		manifest_name=manifest_name,
+	)
+	return
+
+@task(
+	name='saving_changes_to_minio',
+	retries=3,
+	retry_delay_seconds=10,
+	log_prints=True,
+)
+def saving_changes_to_minio(
+    previous_revision: int,
+    changed_fights: List[Dict[str, Any]],
+    bucket_name: str, 
+    manifest_name: str,
+    minio_client: Optional[MinioClient]=None,
+	verbose: bool=False
+) -> int:
+	if minio_client is None:
+		minio_client = get_initialized_minio_client(verbose=verbose)
+	if verbose: 
+		print(f"save_changes_to_minio ({len(changed_fights)} fights)...")
+	return save_changes_to_minio(
+		previous_revision=previous_revision,
+		fights=changed_fights,
+		minio_client=minio_client,
+		bucket_name=bucket_name,
+		manifest_name=manifest_name,
+	)
+
 @task(
 	name='get_events_set',
 	retries=3,
 	retry_delay_seconds=10,
 	log_prints=True,
 )
-def get_events_set(fights_infos_list: List[Dict[Any, Any]], verbose: bool=False) -> Set:
+def get_events_set(manifest: Dict[str, Any], verbose: bool=False) -> Set:
 	if verbose:
 		print("get_events_set...")
-	return set([fight_info['event_uri'] for fight_info in fights_infos_list])
+	return set(manifest['events'])
+
+@task(
+	name='get_known_fights',
+	retries=3,
+	retry_delay_seconds=10,
+	log_prints=True,
+)
+def get_known_fights(
+    manifest: Dict[str, Any],
+    all_fights_list: List[Dict[str, Any]],
+    bucket_name: str, 
+    manifest_name: str,
+    events_fingerprints: Optional[Dict[str, Dict[str, str]]]=None,
+    minio_client: Optional[MinioClient]=None,
+	verbose: bool=False
+) -> Dict[str, str]:
+	"""Returns fingerprints of saved fights of the parsed events (see load_known_fights_from_minio)"""
+	if minio_client is None:
+		minio_client = get_initialized_minio_client(verbose=verbose)
+	if verbose:
+		print("get_known_fights...")
+	return load_known_fights_from_minio(
+		manifest=manifest,
+		fights=all_fights_list,
+		minio_client=minio_client,
+		bucket_name=bucket_name,
+		manifest_name=manifest_name,
+		events_fingerprints=events_fingerprints,
+	)
+
+@task(
+	name='saving_fingerprints_to_minio',
+	retries=3,
+	retry_delay_seconds=10,
+	log_prints=True,
+)
+def saving_fingerprints_to_minio(
+    events_fingerprints: Dict[str, Dict[str, str]],
+    bucket_name: str, 
+    manifest_name: str,
+    minio_client: Optional[MinioClient]=None,
+	verbose: bool=False
+) -> None:
+	if minio_client is None:
+		minio_client = get_initialized_minio_client(verbose=verbose)
+	if verbose: 
+		print(f"save_fingerprints_to_minio ({len(events_fingerprints)} events)...")
+	save_fingerprints_to_minio(
+		events_fingerprints=events_fingerprints,
+		minio_client=minio_client,
+		bucket_name=bucket_name,
+		manifest_name=manifest_name,
+	)
+	return
 
 @task(
 	name='parsing_fights_not_in_events',
@@ -123,18 +386,31 @@ def parsing_fights_not_in_events(
 	save_path: Optional[str]=None,
     events_set: Optional[set]=None,
     all_fights_list: Optional[List[Dict[Any, Any]]]=None,
+	incremental_discovery: bool=True,
+	journal_path: Optional[str]=None,
+	known_fights: Optional[Dict[str, str]]=None,
+	recheck_last_n_events: int=0,
+	page_cache_dir: Optional[str]=None,
 	verbose: bool=False,
 ) -> List[Dict[Any, Any]]:
 	if verbose:
 		print('parse_all_fights...')
+	# fights parsed before failure are journaled, so retries parse only the rest
 	all_fights_list_added = parse_all_fights(
         save_path=save_path,
         parsed_events_set=events_set,
+        incremental_discovery=incremental_discovery,
+        journal_path=os.path.expanduser(journal_path) if journal_path is not None else None,
+        known_fights=known_fights,
+        recheck_last_n_events=recheck_last_n_events,
+        cache_dir=os.path.expanduser(page_cache_dir) if page_cache_dir is not None else None,
+        revalidate_cache=True,
     )
 	if all_fights_list is None:
 		all_fights_list = all_fights_list_added
 	else:
-		all_fights_list.extend(all_fights_list_added)
+		# rechecked fights replace their old versions
+		all_fights_list = merge_fights(all_fights_list=all_fights_list, new_fights_list=all_fights_list_added)
 	return all_fights_list
 
 @task(
@@ -148,22 +424,240 @@ def saving_fights_to_minio(
     bucket_name: str,
     object_name: str,
     minio_client: Optional[MinioClient]=None,
+	compression: Optional[str]=None,
+	serialization: str='json',
 	verbose: bool=False,
-) -> None:
+) -> Dict[str, str]:
 	
 	if minio_client is None:
 		minio_client = get_initialized_minio_client(verbose=verbose)
 
 	if verbose:
 		print("save_json_to_minio...")
-	save_json_to_minio(
+	object_hash = save_json_to_minio(
         obj=all_fights_list,
         minio_client=minio_client,
         bucket_name=bucket_name,
         object_name=object_name,
+        compression=compression,
+        serialization=serialization,
+    )
+	return {object_name: object_hash}
+
+@task(
+	name='saving_events_partitions_to_minio',
+	retries=3,
+	retry_delay_seconds=10,
+	log_prints=True
+)
+def saving_events_partitions_to_minio(
+    all_fights_list: List[Dict[Any, Any]],
+    events_to_save: Set[str],
+    bucket_name: str,
+    events_prefix: str,
+    minio_client: Optional[MinioClient]=None,
+	compression: Optional[str]=None,
+	serialization: str='json',
+	verbose: bool=False,
+) -> Dict[str, str]:
+	
+	if minio_client is None:
+		minio_client = get_initialized_minio_client(verbose=verbose)
+
+	if verbose:
+		print(f"save_events_partitions_to_minio ({len(events_to_save)} events)...")
+	return save_events_partitions_to_minio(
+        fights=(
+			fight_info for fight_info in all_fights_list if fight_info['event_uri'] in events_to_save
+		),
+        minio_client=minio_client,
+        bucket_name=bucket_name,
+        prefix=events_prefix,
+        compression=compression,
+        serialization=serialization,
+    )
+
+@task(
+	name='saving_parquet_to_minio',
+	retries=3,
+	retry_delay_seconds=10,
+	log_prints=True
+)
+def saving_parquet_to_minio(
+    all_fights_list: List[Dict[Any, Any]],
+    bucket_name: str,
+    minio_client: Optional[MinioClient]=None,
+	verbose: bool=False,
+) -> None:
+	
+	if minio_client is None:
+		minio_client = get_initialized_minio_client(verbose=verbose)
+
+	if verbose:
+		print("save_parquet_to_minio...")
+	save_parquet_to_minio(
+        fights=all_fights_list,
+        minio_client=minio_client,
+        bucket_name=bucket_name,
     )
 	return
 
+def get_fights_changed_since(
+	loaded_revision: Optional[int],
+	manifest: Dict[str, Any],
+	changed_fights: List[Dict[str, Any]],
+	bucket_name: str,
+	manifest_name: str,
+	minio_client: MinioClient,
+) -> Optional[List[Dict[str, Any]]]:
+	"""Returns fights changed since loaded_revision or None if they can't be told apart from the rest"""
+	if loaded_revision is None or loaded_revision >= manifest.get('revision', 0):
+		return None
+	if loaded_revision == manifest.get('revision', 0) - 1 and len(changed_fights) > 0:
+		return changed_fights
+	try:
+		return load_changes_from_minio(
+			minio_client=minio_client,
+			since_revision=loaded_revision,
+			until_revision=manifest.get('revision', 0),
+			bucket_name=bucket_name,
+			manifest_name=manifest_name,
+		)
+	except ValueError as e:
+		print(e)
+		return None
+
+@task(
+	name='loading_fights_to_postgres',
+	retries=3,
+	retry_delay_seconds=10,
+	log_prints=True
+)
+def loading_fights_to_postgres(
+    manifest: Dict[str, Any],
+    changed_fights: List[Dict[str, Any]],
+    events_to_save: Set[str],
+    bucket_name: str,
+    object_name: str,
+    manifest_name: str,
+    all_fights_list: Optional[List[Dict[Any, Any]]]=None,
+    events_prefix: Optional[str]=None,
+	postgres_upsert: bool=True,
+    minio_client: Optional[MinioClient]=None,
+	verbose: bool=False,
+) -> Optional[List[Dict[Any, Any]]]:
+	"""Brings raw_data.all_fights_info to the manifest's revision: upserts fights changed since its loaded 
+	revision or reloads it from all fights. Returns all fights, if they had to be loaded from minio for that"""
+	if minio_client is None:
+		minio_client = get_initialized_minio_client(verbose=verbose)
+
+	eng = get_pg_engine()
+	revision = manifest.get('revision', 0)
+	loaded_revision = get_loaded_revision(
+		schema='raw_data', table_name='all_fights_info', engine=eng
+	) if postgres_upsert else None
+	# only fights changed since the loaded revision are upserted
+	fights_to_upsert = get_fights_changed_since(
+		loaded_revision=loaded_revision,
+		manifest=manifest,
+		changed_fights=changed_fights,
+		bucket_name=bucket_name,
+		manifest_name=manifest_name,
+		minio_client=minio_client,
+	)
+	up_to_date = loaded_revision is not None and loaded_revision == revision
+	if up_to_date and len(changed_fights) > 0:
+		# changed fights always bump the revision, so the loaded revision can't be trusted
+		print(f'raw_data.all_fights_info in postgres has revision {loaded_revision} with unsaved changes, reloading it')
+		up_to_date = False
+	if up_to_date:
+		print('raw_data.all_fights_info in postgres is up to date')
+		return None
+	if fights_to_upsert is not None:
+		print(f'Upserting {len(fights_to_upsert)} fights to raw_data.all_fights_info in postgres...')
+		n_upserted = upsert_fights_to_postgres(
+			all_fights_list=fights_to_upsert,
+			schema='raw_data',
+			table_name='all_fights_info',
+			engine=eng,
+			revision=revision,
+		)
+		print(f'{n_upserted} fights were inserted or updated')
+		return None
+	if not postgres_upsert and len(events_to_save) == 0:
+		return None
+
+	print('Uploading data to raw_data.all_fights_info in postgres...')
+	loaded_fights_list = None
+	if all_fights_list is None:
+		# tasks can't call tasks, so the task's function is called
+		loaded_fights_list = all_fights_list = load_parsed_fights_from_minio.fn(
+			bucket_name=bucket_name, 
+			object_name=object_name,
+			minio_client=minio_client,
+			events_prefix=events_prefix,
+			verbose=verbose
+		)
+	minio_data_to_postgres(
+		all_fights_list=all_fights_list,
+		schema='raw_data',
+		table_name='all_fights_info',
+		engine=eng,
+		revision=revision,
+	)
+	return loaded_fights_list
+
+@task(
+	name='loading_fights_to_normalized_postgres',
+	retries=3,
+	retry_delay_seconds=10,
+	log_prints=True
+)
+def loading_fights_to_normalized_postgres(
+    manifest: Dict[str, Any],
+    changed_fights: List[Dict[str, Any]],
+    bucket_name: str,
+    object_name: str,
+    manifest_name: str,
+    all_fights_list: Optional[List[Dict[Any, Any]]]=None,
+    events_prefix: Optional[str]=None,
+    minio_client: Optional[MinioClient]=None,
+	verbose: bool=False,
+) -> None:
+	"""Brings normalized tables to the manifest's revision with fights changed since their loaded revision 
+	(or with all fights, if the changed ones can't be told apart)"""
+	if minio_client is None:
+		minio_client = get_initialized_minio_client(verbose=verbose)
+
+	eng = get_pg_engine()
+	normalized_revision = get_loaded_revision(schema=NORMALIZED_SCHEMA, table_name='fights', engine=eng)
+	if normalized_revision == manifest.get('revision', 0):
+		return
+	fights_to_load = get_fights_changed_since(
+		loaded_revision=normalized_revision,
+		manifest=manifest,
+		changed_fights=changed_fights,
+		bucket_name=bucket_name,
+		manifest_name=manifest_name,
+		minio_client=minio_client,
+	)
+	if fights_to_load is None:
+		fights_to_load = all_fights_list if all_fights_list is not None else load_parsed_fights_from_minio.fn(
+			bucket_name=bucket_name, 
+			object_name=object_name,
+			minio_client=minio_client,
+			events_prefix=events_prefix,
+			verbose=verbose
+		)
+	print(f'Loading {len(fights_to_load)} fights to {NORMALIZED_SCHEMA} tables in postgres...')
+	fights_to_normalized_postgres(
+		all_fights_list=fights_to_load,
+		schema=NORMALIZED_SCHEMA,
+		engine=eng,
+		revision=manifest.get('revision', 0),
+	)
+	return
+
 @flow(
 	name='main_flow',
 	retries=3,
@@ -176,42 +670,273 @@ def main_flow(
 	minio_object_name: str,
 	save_path: Optional[str]=None,
 	save_to_postgres: bool=True,
+	postgres_upsert: bool=True,
+	postgres_async: bool=True,
+	incremental_discovery: bool=True,
+	journal_path: Optional[str]=DEFAULT_JOURNAL_PATH,
+	recheck_last_n_events: int=3,
+	page_cache_dir: Optional[str]='~/.cache/ufc_pages',
+	minio_compression: Optional[str]=None,
+	minio_serialization: str='json',
+	minio_events_prefix: Optional[str]=None,
+	export_parquet: bool=True,
 	verbose: bool=False,
 ) -> None:
 	minio_client = get_initialized_minio_client(verbose=verbose)
-	parsed_events_from_minio = load_parsed_fights_from_minio(
+	manifest_name = manifest_object_name(
+		object_name=minio_object_name if minio_events_prefix is None else None, 
+		events_prefix=minio_events_prefix,
+	)
+	# manifest lists parsed events and fights, so the whole dataset is loaded only if it has to be changed
+	manifest = load_manifest(
 		bucket_name=minio_bucket_name, 
-		object_name=minio_object_name,
+		manifest_name=manifest_name,
 		minio_client=minio_client,
 		verbose=verbose
 	)
-	events_set = get_events_set(fights_infos_list=parsed_events_from_minio, verbose=verbose)
-	all_fights_list = parsing_fights_not_in_events(
+	manifest_changed = manifest is None
+	# fingerprints of fights of the events written in this run, saved along with the manifest
+	events_fingerprints = {}
+	parsed_fights_from_minio = None
+	seed_partitions = False
+	if manifest is None:
+		# the first run with manifest - it's built from already saved fights
+		parsed_fights_from_minio = load_parsed_fights_from_minio(
+			bucket_name=minio_bucket_name, 
+			object_name=minio_object_name,
+			minio_client=minio_client,
+			events_prefix=minio_events_prefix,
+			verbose=verbose
+		)
+		if minio_events_prefix is not None and len(parsed_fights_from_minio) == 0:
+			# the first run with partitions - fights are taken from minio_object_name and all partitions are written
+			seed_partitions = True
+			parsed_fights_from_minio = load_parsed_fights_from_minio(
+				bucket_name=minio_bucket_name, 
+				object_name=minio_object_name,
+				minio_client=minio_client,
+				verbose=verbose
+			)
+		manifest = update_manifest(
+			manifest=new_manifest(),
+			fights=parsed_fights_from_minio,
+			object_name=minio_object_name if minio_events_prefix is None else None,
+			events_prefix=minio_events_prefix,
+			events_fingerprints=events_fingerprints,
+		)
+
+	events_set = get_events_set(manifest=manifest, verbose=verbose)
+	all_fights_list_added = parsing_fights_not_in_events(
 		save_path=save_path,
 		events_set=events_set,
-    	all_fights_list=parsed_events_from_minio,
+		incremental_discovery=incremental_discovery,
+		journal_path=journal_path,
+		recheck_last_n_events=recheck_last_n_events,
+		page_cache_dir=page_cache_dir,
 		verbose=verbose
 	)
-	saving_fights_to_minio(
-		all_fights_list=all_fights_list,
+	# only fingerprints of rechecked events, which have changed, are loaded
+	known_fights = get_known_fights(
+		manifest=manifest,
+		all_fights_list=all_fights_list_added,
 		bucket_name=minio_bucket_name,
-    	object_name=minio_object_name,
+		manifest_name=manifest_name,
+		events_fingerprints=events_fingerprints,
 		minio_client=minio_client,
 		verbose=verbose
 	)
+	events_to_save = get_changed_events(known_fights=known_fights, all_fights_list=all_fights_list_added)
+	changed_fights = get_changed_fights(known_fights=known_fights, all_fights_list=all_fights_list_added)
+	if seed_partitions:
+		events_to_save |= events_set
+	if len(events_to_save) > 0:
+		manifest_changed = True
+
+	deferred_load = None
+	if save_to_postgres and postgres_async and asyncpg is not None and len(changed_fights) > 0:
+		# changed fights are staged in postgres while they are saved to minio, normalized tables are changed 
+		# (and locked) only after the save succeeds, with the revision the change set is saved under
+		expected_revision = manifest.get('revision', 0)
+
+		async def load_changed_fights(commit_signal: Future) -> Optional[int]:
+			async with await create_pg_pool() as pool:
+				return await fights_to_normalized_postgres_async(
+					all_fights_list=changed_fights,
+					pool=pool,
+					schema=NORMALIZED_SCHEMA,
+					expected_revision=expected_revision,
+					commit_signal=commit_signal,
+				)
+
+		print(f'Loading {len(changed_fights)} fights to {NORMALIZED_SCHEMA} tables in postgres asynchronously...')
+		deferred_load = DeferredCommitLoad(load=load_changed_fights)
+
+	try:
+		all_fights_list = None
+		if minio_events_prefix is not None and len(events_to_save) > 0:
+			# only partitions of new and changed events are loaded and written
+			events_fights_list = (
+				[fight_info for fight_info in parsed_fights_from_minio if fight_info['event_uri'] in events_to_save]
+				if parsed_fights_from_minio is not None else
+				load_events_fights_from_minio(
+					bucket_name=minio_bucket_name,
+					manifest=manifest,
+					event_uris=events_to_save,
+					minio_client=minio_client,
+					verbose=verbose
+				)
+			)
+			events_fights_list = merge_fights(all_fights_list=events_fights_list, new_fights_list=all_fights_list_added)
+			objects_hashes = saving_events_partitions_to_minio(
+				all_fights_list=events_fights_list,
+				events_to_save=events_to_save,
+				bucket_name=minio_bucket_name,
+				events_prefix=minio_events_prefix,
+				minio_client=minio_client,
+				compression=minio_compression,
+				serialization=minio_serialization,
+				verbose=verbose
+			)
+			manifest = update_manifest(
+				manifest=manifest,
+				fights=events_fights_list,
+				objects_hashes=objects_hashes,
+				events_prefix=minio_events_prefix,
+				events_fingerprints=events_fingerprints,
+			)
+		elif minio_events_prefix is None and len(events_to_save) > 0:
+			if parsed_fights_from_minio is None:
+				parsed_fights_from_minio = load_parsed_fights_from_minio(
+					bucket_name=minio_bucket_name, 
+					object_name=minio_object_name,
+					minio_client=minio_client,
+					verbose=verbose
+				)
+			all_fights_list = merge_fights(all_fights_list=parsed_fights_from_minio, new_fights_list=all_fights_list_added)
+			objects_hashes = saving_fights_to_minio(
+				all_fights_list=all_fights_list,
+				bucket_name=minio_bucket_name,
+				object_name=minio_object_name,
+				minio_client=minio_client,
+				compression=minio_compression,
+				serialization=minio_serialization,
+				verbose=verbose
+			)
+			# entries of the other events haven't changed
+			manifest = update_manifest(
+				manifest=manifest,
+				fights=[fight_info for fight_info in all_fights_list if fight_info['event_uri'] in events_to_save],
+				objects_hashes=objects_hashes,
+				object_name=minio_object_name,
+				events_fingerprints=events_fingerprints,
+			)
+		if len(changed_fights) > 0:
+			# consumers can load only fights changed since the revision they've processed (see load_changes_from_minio)
+			# tasks get copies of their arguments, so the new revision is recorded here
+			manifest['revision'] = saving_changes_to_minio(
+				previous_revision=manifest.get('revision', 0),
+				changed_fights=changed_fights,
+				bucket_name=minio_bucket_name,
+				manifest_name=manifest_name,
+				minio_client=minio_client,
+				verbose=verbose
+			)
+		if manifest_changed:
+			if len(events_fingerprints) > 0:
+				saving_fingerprints_to_minio(
+					events_fingerprints=events_fingerprints,
+					bucket_name=minio_bucket_name,
+					manifest_name=manifest_name,
+					minio_client=minio_client,
+					verbose=verbose
+				)
+			# manifest is saved after the data, so it never lists fights that aren't saved
+			saving_manifest_to_minio(
+				manifest=manifest,
+				bucket_name=minio_bucket_name,
+				manifest_name=manifest_name,
+				minio_client=minio_client,
+				verbose=verbose
+			)
+	except BaseException:
+		if deferred_load is not None:
+			deferred_load.rollback()
+		raise
+	if deferred_load is not None:
+		try:
+			deferred_load.commit(manifest['revision'])
+		except Exception as e:
+			print(f'Failed to load data to {NORMALIZED_SCHEMA} tables in postgres asynchronously!')
+			print(e, end='\n'*2)
+	if journal_path is not None:
+		# journaled fights are on minio now
+		remove_journal(journal_path=os.path.expanduser(journal_path))
+	if export_parquet and len(events_to_save) > 0:
+		try:
+			print('Exporting parquet tables to minio...')
+			# only years of new and changed events are rewritten
+			changed_fights_list = events_fights_list if all_fights_list is None else [
+				fight_info for fight_info in all_fights_list if fight_info['event_uri'] in events_to_save
+			]
+			years_to_save = set(fight_year(fight_info) for fight_info in changed_fights_list)
+			years_fights_list = [
+				fight_info 
+				for fight_info in (
+					all_fights_list if all_fights_list is not None else
+					iter_fights_from_events_partitions(
+						minio_client=minio_client,
+						bucket_name=minio_bucket_name,
+						prefix=minio_events_prefix,
+						years=[year if year != 0 else 'unknown' for year in years_to_save],
+					)
+				)
+				if fight_year(fight_info) in years_to_save
+			]
+			saving_parquet_to_minio(
+				all_fights_list=years_fights_list,
+				bucket_name=minio_bucket_name,
+				minio_client=minio_client,
+				verbose=verbose
+			)
+		except Exception as e:
+			print('Failed to export parquet tables to minio!')
+			print(e, end='\n'*2)
 	if save_to_postgres:
 		try:
-			print('Uploading data to raw_data.all_fights_info in postgres...')
-			eng = get_pg_engine()
-			minio_data_to_postgres(
+			loaded_fights_list = loading_fights_to_postgres(
+				manifest=manifest,
+				changed_fights=changed_fights,
+				events_to_save=events_to_save,
+				bucket_name=minio_bucket_name,
+				object_name=minio_object_name,
+				manifest_name=manifest_name,
 				all_fights_list=all_fights_list,
-				schema='raw_data',
-				table_name='all_fights_info',
-				engine=eng
+				events_prefix=minio_events_prefix,
+				postgres_upsert=postgres_upsert,
+				minio_client=minio_client,
+				verbose=verbose
 			)
+			if loaded_fights_list is not None:
+				all_fights_list = loaded_fights_list
 		except Exception as e:
 			print('Failed to upload data to raw_data.all_fights_info in postgres!')
 			print(e, end='\n'*2)
+
+		try:
+			loading_fights_to_normalized_postgres(
+				manifest=manifest,
+				changed_fights=changed_fights,
+				bucket_name=minio_bucket_name,
+				object_name=minio_object_name,
+				manifest_name=manifest_name,
+				all_fights_list=all_fights_list,
+				events_prefix=minio_events_prefix,
+				minio_client=minio_client,
+				verbose=verbose
+			)
+		except Exception as e:
+			print(f'Failed to load data to {NORMALIZED_SCHEMA} tables in postgres!')
+			print(e, end='\n'*2)
 	if verbose:
 		print("OK!")
 	return
@@ -248,6 +973,15 @@ if __name__ == '__main__':
 		save_path=save_path,
 		minio_bucket_name=args.minio_bucket_name,
 		minio_object_name=args.minio_object_name,
+		journal_path=None if str(args.journal_path).lower() == 'none' else args.journal_path,
+		recheck_last_n_events=args.recheck_last_n_events,
+		page_cache_dir=None if str(args.page_cache_dir).lower() == 'none' else args.page_cache_dir,
+		minio_compression=None if str(args.minio_compression).lower() == 'none' else args.minio_compression,
+		minio_serialization=args.minio_serialization,
+		minio_events_prefix=args.minio_events_prefix,
+		export_parquet=args.export_parquet,
+		postgres_upsert=args.postgres_upsert,
+		postgres_async=args.postgres_async,
 		verbose=args.verbose,
 	)
 	end = time.perf_counter()
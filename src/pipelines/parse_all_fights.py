@@ -6,7 +6,7 @@ from tqdm import tqdm
 import time
 from datetime import datetime
 import argparse
-from typing import List, Tuple, Dict, Set, Any, Optional, Callable, Union
+from typing import List, Tuple, Dict, Set, Any, Optional, Callable, Union, Iterator, AsyncIterator
 if 'PYTHONPATH' in os.environ:
 	PROJECT_PATH = os.environ["PYTHONPATH"]
 	sys.path.insert(0, PROJECT_PATH)
@@ -19,11 +19,30 @@ try:
 except Exception as e:
 	color_print = lambda x, color='green': print(x)
 
-import requests
+import asyncio
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+import aiohttp
 from bs4 import BeautifulSoup
 
-from src.processing import eventslist2df
-from src.parse_utils import get_events_list, get_one_fight_stats
+from src.processing import eventslist2df, is_changed_fight, save_fights_to_json
+from src.parse_utils import (
+	get_events_list, 
+	get_new_events_list,
+	get_fight_uris_from_event_page, 
+	parse_fight_page_content,
+)
+from src.fetch_utils import (
+	AsyncRateLimiter, 
+	CachingFetcher,
+	PageCache,
+	PageFetcher, 
+	RecordingFetcher,
+	ReplayFetcher,
+	fetch_page_async, 
+	get_default_fetcher,
+)
+from src.journal_utils import FightsJournal
 
 
 def parse_cli():
@@ -35,69 +54,489 @@ def parse_cli():
 		type=str,
 		default=None
 	)
+	parser.add_argument(
+		'--use_async', 
+		dest='use_async', 
+		default=False, 
+		action='store_true',
+		help='Whether to download pages concurrently with aiohttp'
+	)
+	parser.add_argument(
+		"--max_concurrency",
+		help='Max number of requests in flight (only with --use_async)',
+		type=int,
+		default=8
+	)
+	parser.add_argument(
+		"--requests_per_second",
+		help='Max number of requests per second to one host (only with --use_async)',
+		type=float,
+		default=10.0
+	)
+	parser.add_argument(
+		"--cache_dir",
+		help='Where to cache downloaded events and fights pages',
+		type=str,
+		default=None
+	)
+	parser.add_argument(
+		'--revalidate_cache', 
+		dest='revalidate_cache', 
+		default=False, 
+		action='store_true',
+		help='Whether to revalidate cached pages with conditional GET requests'
+	)
+	parser.add_argument(
+		"--record_dir",
+		help='Where to record all downloaded pages to replay the run later with --replay_dir',
+		type=str,
+		default=None
+	)
+	parser.add_argument(
+		"--replay_dir",
+		help='Where to take pages recorded with --record_dir from instead of downloading them',
+		type=str,
+		default=None
+	)
+	parser.add_argument(
+		'--use_fast_parser', 
+		dest='use_fast_parser', 
+		default=False, 
+		action='store_true',
+		help='Whether to parse fights pages with the fast lxml parser (fast_parse_utils) instead of BeautifulSoup'
+	)
+	parser.add_argument(
+		'--incremental_discovery', 
+		dest='incremental_discovery', 
+		default=False, 
+		action='store_true',
+		help='Whether to walk events listing newest-first and stop at the first already parsed event'
+	)
+	parser.add_argument(
+		"--journal_path",
+		help='Where to journal parsed fights, so that crashed run could be resumed',
+		type=str,
+		default=None
+	)
+	parser.add_argument(
+		'--no_resume', 
+		dest='resume', 
+		default=True, 
+		action='store_false',
+		help="Whether to start from scratch even if there are fights in --journal_path"
+	)
+	parser.add_argument(
+		"--n_parse_workers",
+		help='If given - fights pages are parsed in that many worker processes',
+		type=int,
+		default=None
+	)
 
 	args = parser.parse_args()
 	return args
 
-def parse_all_fights(
-		save_path: str=None,
+
+def add_event_info(
+		fight_stats_dict: Dict[str, Any],
+		event_uri: str,
+		event_date: str,
+		event_location: str,
+		event_name: str,
+		fight_uri: str,
+	) -> Dict[str, Any]:
+	"""Adds event's fields to the parsed fight stats"""
+	fight_stats_dict['date'] = event_date
+	fight_stats_dict['location'] = event_location
+	fight_stats_dict['event_name'] = event_name
+	fight_stats_dict['event_uri'] = event_uri
+	fight_stats_dict['fight_uri'] = fight_uri
+	return fight_stats_dict
+
+
+def _completed_future(result: Any) -> Future:
+	future = Future()
+	future.set_result(result)
+	return future
+
+
+async def parse_one_event_async(
+		session: aiohttp.ClientSession,
+		event: Tuple[str, str, str, str],
+		semaphore: asyncio.Semaphore,
+		rate_limiter: AsyncRateLimiter,
+		page_cache: Optional[PageCache]=None,
+		revalidate_cache: bool=False,
+		use_fast_parser: bool=False,
+		parse_pool: Optional[Executor]=None,
+		parse_slots: Optional[asyncio.Semaphore]=None,
+		journal: Optional[FightsJournal]=None,
+		progress_bar: Optional[tqdm]=None,
+	) -> List[Dict[str, Any]]:
+	"""Downloads event page and all of its fights pages concurrently and returns parsed fights 
+		in the same order as they are on the event page"""
+
+	event_uri, event_date, event_location, event_name = event
+
+	async def fetch_and_parse_one_fight(fight_uri: str) -> Dict[str, Any]:
+		if journal is not None and fight_uri in journal:
+			return journal.get(fight_uri)
+		# parse slot is held from download till the end of parsing, so that there are
+		# no more than <parse_slots> raw pages in memory
+		async with parse_slots:
+			one_fight_page = await fetch_page_async(
+				session=session, 
+				url=fight_uri, 
+				semaphore=semaphore, 
+				rate_limiter=rate_limiter, 
+				page_cache=page_cache, 
+				revalidate=revalidate_cache,
+			)
+			if parse_pool is None:
+				fight_stats_dict = parse_fight_page_content(content=one_fight_page, use_fast_parser=use_fast_parser)
+			else:
+				fight_stats_dict = await asyncio.get_running_loop().run_in_executor(
+					parse_pool, parse_fight_page_content, one_fight_page, use_fast_parser
+				)
+		fight_stats_dict = add_event_info(
+			fight_stats_dict=fight_stats_dict,
+			event_uri=event_uri,
+			event_date=event_date,
+			event_location=event_location,
+			event_name=event_name,
+			fight_uri=fight_uri,
+		)
+		if journal is not None:
+			journal.write_fight(fight_stats_dict)
+		return fight_stats_dict
+
+	if parse_slots is None:
+		parse_slots = asyncio.Semaphore(64)
+
+	one_event_fights_list = journal.get_event_fights(event_uri) if journal is not None else None
+	if one_event_fights_list is None:
+		one_event = await fetch_page_async(
+			session=session, 
+			url=event_uri, 
+			semaphore=semaphore, 
+			rate_limiter=rate_limiter, 
+			page_cache=page_cache, 
+			revalidate=revalidate_cache,
+		)
+		fight_uris = get_fight_uris_from_event_page(one_event_page=BeautifulSoup(one_event, 'lxml'))
+		one_event_fights_list = await asyncio.gather(*[
+			fetch_and_parse_one_fight(fight_uri=fight_uri) for fight_uri in fight_uris
+		])
+		if journal is not None:
+			journal.write_event(event_uri=event_uri, fight_uris=fight_uris)
+
+	if progress_bar is not None:
+		progress_bar.update(1)
+	return list(one_event_fights_list)
+
+
+async def iter_events_fights_async(
+		events: List[Tuple[str, str, str, str]],
+		max_concurrency: int=8,
+		requests_per_second: float=10.0,
+		timeout_seconds: float=60.0,
+		page_cache: Optional[PageCache]=None,
+		revalidate_cache: bool=False,
+		use_fast_parser: bool=False,
+		parse_pool: Optional[Executor]=None,
+		parse_queue_size: int=64,
+		journal: Optional[FightsJournal]=None,
+		max_events_in_flight: int=16,
+	) -> AsyncIterator[Dict[str, Any]]:
+	"""
+	Parses fights of the given events concurrently and yields them event by event
+	:param events: list of (event_uri, event_date, event_location, event_name) tuples
+	:param max_concurrency: max number of requests in flight
+	:param requests_per_second: max number of requests per second to one host
+	:param timeout_seconds: total timeout for one request
+	:param page_cache: if not None - cached pages are taken from it and downloaded ones are saved to it
+	:param revalidate_cache: whether to revalidate cached pages with conditional GET requests
+	:param use_fast_parser: whether to parse fights pages with fast_parse_utils instead of BeautifulSoup
+	:param parse_pool: if not None - fights pages are parsed there instead of the event loop's thread
+	:param parse_queue_size: max number of fights pages downloaded, but not parsed yet
+	:param journal: if not None - journaled fights are taken from it and parsed ones are written to it
+	:param max_events_in_flight: max number of events parsed ahead of the one being yielded
+	:yield: dicts with fights statistics in the same order as the sequential parsing gives
+	"""
+
+	semaphore = asyncio.Semaphore(max_concurrency)
+	parse_slots = asyncio.Semaphore(parse_queue_size)
+	rate_limiter = AsyncRateLimiter(requests_per_second=requests_per_second)
+	async with aiohttp.ClientSession(
+		connector=aiohttp.TCPConnector(limit=max_concurrency),
+		timeout=aiohttp.ClientTimeout(total=timeout_seconds),
+	) as session:
+		with tqdm(total=len(events)) as progress_bar:
+			events_tasks = deque()
+			try:
+				for event in events:
+					events_tasks.append(asyncio.ensure_future(
+						parse_one_event_async(
+							session=session,
+							event=event,
+							semaphore=semaphore,
+							rate_limiter=rate_limiter,
+							page_cache=page_cache,
+							revalidate_cache=revalidate_cache,
+							use_fast_parser=use_fast_parser,
+							parse_pool=parse_pool,
+							parse_slots=parse_slots,
+							journal=journal,
+							progress_bar=progress_bar,
+						)
+					))
+					if len(events_tasks) >= max_events_in_flight:
+						for fight_stats_dict in await events_tasks.popleft():
+							yield fight_stats_dict
+				while events_tasks:
+					for fight_stats_dict in await events_tasks.popleft():
+						yield fight_stats_dict
+			finally:
+				for task in events_tasks:
+					task.cancel()
+				await asyncio.gather(*events_tasks, return_exceptions=True)
+
+
+def iter_async(async_iterator: AsyncIterator[Any]) -> Iterator[Any]:
+	"""Yields items of async iterator from synchronous code. Event loop runs only 
+	while the next item is awaited, so downloading pauses while consumer processes yielded items"""
+	loop = asyncio.new_event_loop()
+	try:
+		while True:
+			try:
+				yield loop.run_until_complete(async_iterator.__anext__())
+			except StopAsyncIteration:
+				break
+	finally:
+		loop.run_until_complete(async_iterator.aclose())
+		loop.close()
+
+
+def iter_events_fights(
+		events: List[Tuple[str, str, str, str]],
+		fetcher: PageFetcher,
+		parse_pool: Optional[Executor]=None,
+		parse_queue_size: int=64,
+		use_fast_parser: bool=False,
+		journal: Optional[FightsJournal]=None,
+	) -> Iterator[Dict[str, Any]]:
+	"""
+	Downloads pages of the given events one by one and parses fights pages. If parse_pool is given - 
+	fights pages are handed to it, so that parsing of downloaded pages goes on while the next ones 
+	are being downloaded
+	:param events: list of (event_uri, event_date, event_location, event_name) tuples
+	:param fetcher: what to download pages with
+	:param parse_pool: if not None - where to parse fights pages
+	:param parse_queue_size: max number of fights pages handed to parse_pool, but not parsed yet.
+		When the queue is full - downloading waits for the oldest page to be parsed
+	:param use_fast_parser: whether to parse fights pages with fast_parse_utils instead of BeautifulSoup
+	:param journal: if not None - journaled fights are taken from it and parsed ones are written to it
+	:yield: dicts with fights statistics in the same order as the sequential parsing gives
+	"""
+
+	# (future with parsed fight, event, fight_uri, all event's fight_uris if it's the last fight of the event)
+	parse_queue = deque()
+
+	def collect_parsed(max_queue_size: int) -> Iterator[Dict[str, Any]]:
+		while len(parse_queue) > max_queue_size:
+			future, event, fight_uri, event_fight_uris = parse_queue.popleft()
+			event_uri, event_date, event_location, event_name = event
+			fight_stats_dict = add_event_info(
+				fight_stats_dict=future.result(),
+				event_uri=event_uri,
+				event_date=event_date,
+				event_location=event_location,
+				event_name=event_name,
+				fight_uri=fight_uri,
+			)
+			if journal is not None:
+				journal.write_fight(fight_stats_dict)
+				if event_fight_uris is not None:
+					journal.write_event(event_uri=event_uri, fight_uris=event_fight_uris)
+			yield fight_stats_dict
+
+	for event in tqdm(events):
+		event_uri = event[0]
+		journaled_event_fights = journal.get_event_fights(event_uri) if journal is not None else None
+		if journaled_event_fights is not None:
+			fight_uris = [fight_stats_dict['fight_uri'] for fight_stats_dict in journaled_event_fights]
+		else:
+			one_event = BeautifulSoup(fetcher.get(event_uri), 'lxml')
+			fight_uris = get_fight_uris_from_event_page(one_event_page=one_event)
+			if journal is not None and len(fight_uris) == 0:
+				journal.write_event(event_uri=event_uri, fight_uris=fight_uris)
+
+		for i, fight_uri in enumerate(fight_uris):
+			if journal is not None and fight_uri in journal:
+				future = _completed_future(journal.get(fight_uri))
+			elif parse_pool is not None:
+				future = parse_pool.submit(parse_fight_page_content, fetcher.get(fight_uri), use_fast_parser)
+			else:
+				future = _completed_future(
+					parse_fight_page_content(content=fetcher.get(fight_uri), use_fast_parser=use_fast_parser)
+				)
+			is_last_event_fight = i == len(fight_uris) - 1
+			parse_queue.append((future, event, fight_uri, fight_uris if is_last_event_fight else None))
+			yield from collect_parsed(max_queue_size=parse_queue_size if parse_pool is not None else 0)
+	yield from collect_parsed(max_queue_size=0)
+
+
+def iter_fights(
 		parsed_events_set: Optional[Set[str]]=None,
 		parse_only_n_fights: Optional[int]=None,
-	) -> List[Dict[str, Any]]:
+		use_async: bool=False,
+		max_concurrency: int=8,
+		requests_per_second: float=10.0,
+		fetcher: Optional[PageFetcher]=None,
+		cache_dir: Optional[str]=None,
+		revalidate_cache: bool=False,
+		record_dir: Optional[str]=None,
+		replay_dir: Optional[str]=None,
+		use_fast_parser: bool=False,
+		n_parse_workers: Optional[int]=None,
+		parse_queue_size: int=64,
+		incremental_discovery: bool=False,
+		journal_path: Optional[str]=None,
+		resume: bool=True,
+		known_fights: Optional[Dict[str, str]]=None,
+		recheck_last_n_events: int=0,
+	) -> Iterator[Dict[str, Any]]:
 
 	"""
-	Parses all fights and returns list of dicts with fights statistics
-	:param save_path: Path where to save resulting list as a .json file
+	Parses all fights and yields dicts with fights statistics one by one as soon as they are parsed, 
+	so that memory doesn't grow with the number of parsed fights
 	:param parsed_events_set: If current parsed event is already in events_set - don't process it
 	:param parse_only_n_fights (int): mainly for debugging purposes. 
 		If not None - stops parsing after <parse_only_n_fights> iterations
-	:return: list of dicts with fights statistics
+	:param use_async: if True - downloads events and fights pages concurrently with aiohttp.
+		The result is the same as with sequential parsing
+	:param max_concurrency: max number of requests in flight (only when use_async=True)
+	:param requests_per_second: max number of requests per second to one host (only when use_async=True)
+	:param fetcher: what to download pages with when use_async=False. If None - shared HttpFetcher is used
+	:param cache_dir: if not None - events and fights pages are cached there, 
+		so that the next run downloads only pages which aren't in cache yet
+	:param revalidate_cache: whether to revalidate cached pages with conditional GET requests
+	:param record_dir: if not None - all downloaded pages (events list included) are recorded there
+	:param replay_dir: if not None - all pages are taken from pages recorded with record_dir 
+		and nothing is downloaded. Works only with use_async=False
+	:param use_fast_parser: whether to parse fights pages with fast_parse_utils.parse_one_fight_page_fast
+		instead of BeautifulSoup (opt-in, tests/test_fast_parse_utils.py checks that the result is the same)
+	:param n_parse_workers: if not None - downloaded fights pages are handed to that many worker processes 
+		to be parsed there, while the next pages are being downloaded
+	:param parse_queue_size: max number of fights pages downloaded, but not parsed yet 
+		(only when n_parse_workers is not None or use_async=True). When the queue is full 
+		downloading waits for parsing, so memory doesn't grow
+	:param incremental_discovery: if True and parsed_events_set is not None - events listing is walked 
+		page by page newest-first and only events newer than the first already parsed one are parsed 
+		(instead of downloading the whole listing and skipping parsed events)
+	:param journal_path: if not None - every parsed fight is appended to this journal as soon as it's parsed,
+		so that if parsing crashes, the next run with the same journal_path doesn't parse them again.
+		The journal isn't removed after successful run - use journal_utils.remove_journal when fights are saved
+	:param resume: if False - journal_path is cleared before parsing
+	:param known_fights: if not None - {fight_uri: processing.fight_fingerprint} of already parsed fights 
+		(see processing.get_fights_index). Fights with the same fingerprint are not returned, 
+		so only new and changed fights are returned
+	:param recheck_last_n_events: how many latest events from parsed_events_set to parse again, so that 
+		fights added to them or their changed results are picked up (should be used with known_fights).
+		With cache_dir and revalidate_cache=True unchanged fights pages aren't downloaded again
+	:yield: dicts with fights statistics
 	"""
 
-	fights_list, status_ok = get_events_list()
+	assert sum(val is not None for val in [cache_dir, record_dir, replay_dir]) <= 1, \
+		'Only one of cache_dir, record_dir and replay_dir could be passed!'
+	assert replay_dir is None or not use_async, 'replay_dir works only with use_async=False!'
+
+	if fetcher is None:
+		fetcher = get_default_fetcher()
+	if replay_dir is not None:
+		fetcher = ReplayFetcher(corpus=PageCache(cache_dir=replay_dir))
+	if record_dir is not None:
+		fetcher = RecordingFetcher(corpus=PageCache(cache_dir=record_dir), fetcher=fetcher)
+		# in async mode pages are recorded through page_cache
+		cache_dir = record_dir if use_async else None
+	page_cache = PageCache(cache_dir=cache_dir) if cache_dir is not None else None
+	pages_fetcher = fetcher
+	# async downloads go through page_cache directly
+	if page_cache is not None and not use_async:
+		pages_fetcher = CachingFetcher(cache=page_cache, fetcher=fetcher, revalidate=revalidate_cache)
+
+	# events list is never cached - it changes with every new event
+	if incremental_discovery and parsed_events_set is not None:
+		fights_list, status_ok = get_new_events_list(
+			known_events_set=parsed_events_set, n_known_events=recheck_last_n_events, fetcher=fetcher
+		)
+	else:
+		fights_list, status_ok = get_events_list(fetcher=fetcher)
 	print("status_ok:", status_ok)
 	fights_df = eventslist2df(fights_list)
 
-	all_fights_list = []
-	for i, (event_uri, event_date, event_location, event_name) in tqdm(
-			enumerate(fights_df[['event_url', 'date', 'location', 'event_name']].itertuples(index=False), start=1),
-			total=len(fights_df)
+	events = []
+	n_rechecked_events = 0
+	for i, event in enumerate(
+			fights_df[['event_url', 'date', 'location', 'event_name']].itertuples(index=False, name=None) 
+			if len(fights_df) > 0 else [], 
+			start=1
 	):
 		if parse_only_n_fights is not None and i == parse_only_n_fights:
 			break
-		if parsed_events_set is not None and event_uri in parsed_events_set:
-			continue
-
-		one_event = requests.get(event_uri)
-		one_event = BeautifulSoup(one_event.content, 'lxml')
-		one_event = (
-			one_event
-			.find_all(
-				"tr", {"class": "b-fight-details__table-row b-fight-details__table-row__hover js-fight-details-click"}
+		if parsed_events_set is not None and event[0] in parsed_events_set:
+			if n_rechecked_events >= recheck_last_n_events:
+				continue
+			n_rechecked_events += 1
+		events.append(event)
+
+	journal = FightsJournal(journal_path=journal_path, resume=resume) if journal_path is not None else None
+	parse_pool = ProcessPoolExecutor(max_workers=n_parse_workers) if n_parse_workers is not None else None
+	try:
+		if use_async:
+			fights = iter_async(
+				iter_events_fights_async(
+					events=events,
+					max_concurrency=max_concurrency,
+					requests_per_second=requests_per_second,
+					page_cache=page_cache,
+					revalidate_cache=revalidate_cache,
+					use_fast_parser=use_fast_parser,
+					parse_pool=parse_pool,
+					parse_queue_size=parse_queue_size,
+					journal=journal,
+				)
 			)
-		)
-		for one_fight in one_event:
-			fight_uri = [
-				row.replace('data-link', '').replace('=', '').replace('"', '')
-				for row in str(one_fight).split() if 'data-link' in row
-			][0]
-
-			fight_stats_dict = get_one_fight_stats(fight_uri=fight_uri)
-			fight_stats_dict['date'] = event_date
-			fight_stats_dict['location'] = event_location
-			fight_stats_dict['event_name'] = event_name
-			fight_stats_dict['event_uri'] = event_uri
-			fight_stats_dict['fight_uri'] = fight_uri
-			all_fights_list.append(fight_stats_dict)
+		else:
+			fights = iter_events_fights(
+				events=events,
+				fetcher=pages_fetcher,
+				parse_pool=parse_pool,
+				parse_queue_size=parse_queue_size,
+				use_fast_parser=use_fast_parser,
+				journal=journal,
+			)
+		for fight_stats_dict in fights:
+			if known_fights is not None and not is_changed_fight(known_fights=known_fights, fight_stats_dict=fight_stats_dict):
+				continue
+			yield fight_stats_dict
+	finally:
+		if parse_pool is not None:
+			parse_pool.shutdown()
+		if journal is not None:
+			journal.close()
 
-	if save_path is not None and len(all_fights_list) > 0:
-		json.dump(
-			all_fights_list, 
-			open(save_path, mode='w', encoding='utf-8'), 
-			ensure_ascii=False, 
-			indent=2
-		)
 
+def parse_all_fights(save_path: str=None, **kwargs) -> List[Dict[str, Any]]:
+	"""
+	Parses all fights and returns list of dicts with fights statistics
+	:param save_path: Path where to save resulting list as a .json file
+	:param kwargs: see iter_fights
+	:return: list of dicts with fights statistics
+	"""
+
+	all_fights_list = list(iter_fights(**kwargs))
+	if save_path is not None and len(all_fights_list) > 0:
+		save_fights_to_json(fights=all_fights_list, save_path=save_path)
 	return all_fights_list
 
 
@@ -119,15 +558,58 @@ if __name__ == '__main__':
 		save_path = args.save_path
 		if str(save_path).lower() == 'none':
 			save_path = None
+		use_async = args.use_async
+		max_concurrency = args.max_concurrency
+		requests_per_second = args.requests_per_second
+		cache_dir = args.cache_dir
+		revalidate_cache = args.revalidate_cache
+		record_dir = args.record_dir
+		replay_dir = args.replay_dir
+		use_fast_parser = args.use_fast_parser
+		n_parse_workers = args.n_parse_workers
+		incremental_discovery = args.incremental_discovery
+		journal_path = args.journal_path
+		resume = args.resume
 		logging.info('done')
 	except Exception as e:
 		save_path = None
+		use_async = False
+		max_concurrency = 8
+		requests_per_second = 10.0
+		cache_dir = None
+		revalidate_cache = False
+		record_dir = None
+		replay_dir = None
+		use_fast_parser = False
+		n_parse_workers = None
+		incremental_discovery = False
+		journal_path = None
+		resume = True
 		color_print("can't parse cli!", color='red')
 		print(e, end='\n\n')
 
 
 	logging.info('Parsing all fights...')
 	st = time.perf_counter()
-	_ = parse_all_fights(save_path=save_path)
+	# fights are written to save_path as soon as they are parsed instead of being collected into a list
+	fights = iter_fights(
+		use_async=use_async,
+		max_concurrency=max_concurrency,
+		requests_per_second=requests_per_second,
+		cache_dir=cache_dir,
+		revalidate_cache=revalidate_cache,
+		record_dir=record_dir,
+		replay_dir=replay_dir,
+		use_fast_parser=use_fast_parser,
+		n_parse_workers=n_parse_workers,
+		incremental_discovery=incremental_discovery,
+		journal_path=journal_path,
+		resume=resume,
+	)
+	if save_path is not None:
+		n_fights = save_fights_to_json(fights=fights, save_path=save_path)
+	else:
+		n_fights = sum(1 for _ in fights)
+	logging.info(f'{n_fights} fights parsed')
 	end = time.perf_counter()
 	logging.info(f'all fights parsed for {(end - st) // 60} minutes {round((end - st) % 60)} seconds')
\ No newline at end of file
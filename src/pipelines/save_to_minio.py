@@ -25,10 +25,19 @@ else:
 from src.pipelines.parse_all_fights import parse_all_fights
 from src.minio_utils import (
     initialize_minio_client, 
-    load_json_from_minio, 
+    iter_json_from_minio, 
     minio_container_ipaddr,
     save_json_to_minio
 )
+from src.manifest_utils import (
+    load_manifest_from_minio,
+    manifest_object_name,
+    new_manifest,
+    save_changes_to_minio,
+    save_fingerprints_to_minio,
+    save_manifest_to_minio,
+    update_manifest,
+)
 
 MINIO_ACCESS_KEY = os.environ['MINIO_ACCESS_KEY']
 MINIO_SECRET_KEY = os.environ['MINIO_SECRET_KEY']
@@ -49,6 +58,12 @@ def parse_cli():
         type=str,
         default='ufc_stats.json'
     )
+    parser.add_argument(
+        "--minio_compression",
+        help='How to compress fights saved to minio: gzip, zstd or none',
+        type=str,
+        default=None
+    )
 
     args = parser.parse_args()
     return args
@@ -67,29 +82,43 @@ if __name__ == '__main__':
 
     args = parse_cli()
 
-    ############################### Loading all fights info from minio ####################################
-    logging.info('\n'+ '='*60 + 'Loading all fights info from minio' + '='*60 + '\n')
+    ############################### Loading manifest from minio ####################################
+    logging.info('\n'+ '='*60 + 'Loading manifest from minio' + '='*60 + '\n')
     all_fights_list = None
-    tmp_data_local_path = str(today) + str(int(random.random()*1e6))
     minio_client = initialize_minio_client(
         ipaddr=minio_container_ipaddr(),
         access_key=MINIO_ACCESS_KEY,
         secret_key=MINIO_SECRET_KEY,
         port_number=9000
     )
-
-    logging.info('load_json_from_minio')
-    all_fights_list = load_json_from_minio(
+    manifest_name = manifest_object_name(object_name=args.minio_object_name)
+    # fingerprints of fights of the events written in this run, saved along with the manifest
+    events_fingerprints = {}
+    manifest = load_manifest_from_minio(
         minio_client=minio_client,
         bucket_name=args.minio_bucket_name,
-        object_name=args.minio_object_name,
+        manifest_name=manifest_name,
     )
-    print(f"len(all_fights_list): {len(all_fights_list):,}")
-    logging.info(f"len(all_fights_list): {len(all_fights_list):,}")
+    if manifest is None:
+        # the first run with manifest - it's built from already saved fights
+        logging.info('iter_json_from_minio')
+        all_fights_list = list(iter_json_from_minio(
+            minio_client=minio_client,
+            bucket_name=args.minio_bucket_name,
+            object_name=args.minio_object_name,
+        ))
+        manifest = update_manifest(
+            manifest=new_manifest(), 
+            fights=all_fights_list, 
+            object_name=args.minio_object_name, 
+            events_fingerprints=events_fingerprints,
+        )
+    print(f"n_fights in manifest: {manifest['n_fights']:,}")
+    logging.info(f"n_fights in manifest: {manifest['n_fights']:,}")
 
     ############################### Getting parsed events set ####################################
     logging.info('\n'+ '='*60 + 'Getting parsed events set' + '='*60 + '\n')
-    events_set = set([fight_info['event_uri'] for fight_info in all_fights_list])
+    events_set = set(manifest['events'])
     
     ############################### Parsing fights not in events_set ####################################
     logging.info('\n'+ '='*60 + "Parsing fights that aren't parsed yet" + '='*60 + '\n')
@@ -97,20 +126,61 @@ if __name__ == '__main__':
         save_path=None,
         parsed_events_set=events_set,
     )
-    if all_fights_list is None:
-        all_fights_list = all_fights_list_added
-    else:
-        all_fights_list.extend(all_fights_list_added)
-    print(f"len(all_fights_list): {len(all_fights_list):,}")
-    logging.info(f"len(all_fights_list): {len(all_fights_list):,}")
+    print(f"len(all_fights_list_added): {len(all_fights_list_added):,}")
+    logging.info(f"len(all_fights_list_added): {len(all_fights_list_added):,}")
 
     ############################### Saving to minio ####################################
-    logging.info("Saving all_fights_list to minio...")
-    save_json_to_minio(
-        obj=all_fights_list,
-        minio_client=minio_client,
-        bucket_name=args.minio_bucket_name,
-        object_name=args.minio_object_name,
-    )
+    if len(all_fights_list_added) > 0:
+        if all_fights_list is None:
+            logging.info('iter_json_from_minio')
+            all_fights_list = list(iter_json_from_minio(
+                minio_client=minio_client,
+                bucket_name=args.minio_bucket_name,
+                object_name=args.minio_object_name,
+            ))
+        all_fights_list.extend(all_fights_list_added)
+        print(f"len(all_fights_list): {len(all_fights_list):,}")
+        logging.info(f"len(all_fights_list): {len(all_fights_list):,}")
+
+        logging.info("Saving all_fights_list to minio...")
+        object_hash = save_json_to_minio(
+            obj=all_fights_list,
+            minio_client=minio_client,
+            bucket_name=args.minio_bucket_name,
+            object_name=args.minio_object_name,
+            compression=None if str(args.minio_compression).lower() == 'none' else args.minio_compression,
+        )
+        logging.info("Saving change set to minio...")
+        manifest['revision'] = save_changes_to_minio(
+            previous_revision=manifest.get('revision', 0),
+            fights=all_fights_list_added,
+            minio_client=minio_client,
+            bucket_name=args.minio_bucket_name,
+            manifest_name=manifest_name,
+        )
+        # only fights of new events are added, entries of the other events haven't changed
+        manifest = update_manifest(
+            manifest=manifest,
+            fights=all_fights_list_added,
+            objects_hashes={args.minio_object_name: object_hash},
+            object_name=args.minio_object_name,
+            events_fingerprints=events_fingerprints,
+        )
+
+    if len(all_fights_list_added) > 0 or all_fights_list is not None:
+        # manifest is saved after the data, so it never lists fights that aren't saved
+        logging.info("Saving fingerprints to minio...")
+        save_fingerprints_to_minio(
+            events_fingerprints=events_fingerprints,
+            minio_client=minio_client,
+            bucket_name=args.minio_bucket_name,
+            manifest_name=manifest_name,
+        )
+        logging.info("Saving manifest to minio...")
+        save_manifest_to_minio(
+            manifest=manifest,
+            minio_client=minio_client,
+            bucket_name=args.minio_bucket_name,
+            manifest_name=manifest_name,
+        )
     logging.info("Done!")
-
@@ -1,11 +1,15 @@
+import json
+import hashlib
 from tqdm import tqdm
 from collections import deque
-from typing import List, Tuple, Dict, Set, Any, Optional, Callable, Union
+from itertools import islice
+from typing import List, Tuple, Dict, Set, Any, Optional, Callable, Union, Iterable, Iterator
 import pandas as pd
 
 from sqlalchemy.engine.base import Engine
 
-from src.db_utils import get_pg_engine
+from src.db_utils import copy_rows, get_pg_engine
+from src.serialization_utils import dumps_json
 
 
 def eventslist2df(events_list: List[Dict[str, str]]) -> pd.DataFrame:
@@ -27,6 +31,98 @@ def eventslist2df(events_list: List[Dict[str, str]]) -> pd.DataFrame:
     return pd.DataFrame(transformed_dict)
 
 
+def fight_fingerprint(fight_stats_dict: Dict[str, Any]) -> str:
+    """Returns sha256 of fight's statistics, which changes only when fight's statistics change 
+    (ex. result is overturned)"""
+    return hashlib.sha256(
+        json.dumps(fight_stats_dict, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+
+def get_fights_index(all_fights_list: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Returns {fight_uri: fight_fingerprint} of already parsed fights"""
+    return {
+        fight_stats_dict['fight_uri']: fight_fingerprint(fight_stats_dict) 
+        for fight_stats_dict in all_fights_list
+    }
+
+
+def is_changed_fight(known_fights: Dict[str, str], fight_stats_dict: Dict[str, Any]) -> bool:
+    """Whether the fight is not in known_fights (see get_fights_index) or has changed since"""
+    return known_fights.get(fight_stats_dict['fight_uri']) != fight_fingerprint(fight_stats_dict)
+
+
+def get_changed_events(
+    known_fights: Dict[str, str],
+    all_fights_list: Iterable[Dict[str, Any]],
+) -> Set[str]:
+    """Returns event_uris of events, which have fights that are not in known_fights 
+    (see get_fights_index) or have changed since"""
+    return set(
+        fight_stats_dict['event_uri'] for fight_stats_dict in all_fights_list
+        if is_changed_fight(known_fights=known_fights, fight_stats_dict=fight_stats_dict)
+    )
+
+
+def get_changed_fights(
+    known_fights: Dict[str, str],
+    all_fights_list: Iterable[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """Returns fights, which are not in known_fights (see get_fights_index) or have changed since"""
+    return [
+        fight_stats_dict for fight_stats_dict in all_fights_list
+        if is_changed_fight(known_fights=known_fights, fight_stats_dict=fight_stats_dict)
+    ]
+
+
+def merge_fights(
+    all_fights_list: List[Dict[str, Any]],
+    new_fights_list: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """Replaces fights from all_fights_list with their new versions from new_fights_list 
+    (matched by fight_uri) and appends fights, which weren't there yet. all_fights_list is changed inplace
+
+    Args:
+        all_fights_list: already parsed fights
+        new_fights_list: new and changed fights
+    Returns:
+        all_fights_list with merged fights
+    """
+
+    fight_positions = {
+        fight_stats_dict['fight_uri']: i for i, fight_stats_dict in enumerate(all_fights_list)
+    }
+    for fight_stats_dict in new_fights_list:
+        if fight_stats_dict['fight_uri'] in fight_positions:
+            all_fights_list[fight_positions[fight_stats_dict['fight_uri']]] = fight_stats_dict
+        else:
+            fight_positions[fight_stats_dict['fight_uri']] = len(all_fights_list)
+            all_fights_list.append(fight_stats_dict)
+    return all_fights_list
+
+
+def save_fights_to_json(fights: Iterable[Dict[str, Any]], save_path: str) -> int:
+    """Writes fights to save_path one by one, so that the whole list doesn't have to be in memory.
+    The file is the same as json.dump(list(fights), f, ensure_ascii=False, indent=2) gives
+
+    Args:
+        fights: list or iterator of fights dicts (ex. parse_all_fights.iter_fights())
+        save_path: where to save fights
+    Returns:
+        int: number of written fights
+    """
+
+    n_fights = 0
+    with open(save_path, mode='wb') as f:
+        f.write(b'[')
+        for fight_stats_dict in fights:
+            f.write(b',\n  ' if n_fights > 0 else b'\n  ')
+            f.write(dumps_json(fight_stats_dict, indent=2).replace(b'\n', b'\n  '))
+            n_fights += 1
+        f.write(b'\n]' if n_fights > 0 else b']')
+    return n_fights
+
+
 def bfs_dict(
     one_fight_dict: Dict[Any, Any],
     union_filed_identifier: str='__',
@@ -103,54 +199,319 @@ def bfs_dict(
             resulting_dict[k] = v
     return resulting_dict
             
+def iter_flat_fights(
+    all_fights_list: Iterable[Dict[Any, Any]],
+    union_filed_identifier: str='__',
+    verbose: bool=True
+) -> Iterator[Dict[str, Union[str, int, float]]]:
+    """Applies bfs_dict to fights dicts one by one and yields flattened dicts
+
+    Args:
+        all_fights_list: list or iterator of fights' info
+        union_filed_identifier: which separator to use to unite field in dict
+        verbose: whether to show a progress with tqdm
+    Returns:
+        Iterator: flattened fights dicts
+    """
+
+    for i, one_fight in enumerate(tqdm(all_fights_list) if verbose else all_fights_list):
+        try:
+            yield bfs_dict(one_fight_dict=one_fight, union_filed_identifier=union_filed_identifier)
+        except Exception as e:
+            if verbose:
+                print(f'Problem with transforming {i}`th fight')
+                print(e, end='\n')
+
+
 def minio_data_to_pandas(
-    all_fights_list: List[Dict[Any, Any]],
+    all_fights_list: Iterable[Dict[Any, Any]],
     union_filed_identifier: str='__',
     verbose: bool=True
 ) -> pd.DataFrame:
     """Applies bfs_dict to all fights dicts in all_fights_list list
 
     Args:
-        all_fights_list: list of all fights' info
+        all_fights_list: list or iterator of all fights' info
         union_filed_identifier: which separator to use to unite field in dict
         verbose: whether to show a progress with tqdm
     Returns:
         pd.DataFrame: 
     """
     
-    res_list = []
-    for i, one_fight in tqdm(enumerate(all_fights_list)) if verbose else all_fights_list:
-        try:
-            curr_dict = bfs_dict(one_fight_dict=one_fight, union_filed_identifier=union_filed_identifier)
-            res_list.append(curr_dict)
-        except Exception as e:
-            if verbose:
-                print('Problem with transforming {i}`th fight')
-                print(e, end='\n')
-    return pd.DataFrame(res_list)
+    return pd.DataFrame(list(iter_flat_fights(
+        all_fights_list=all_fights_list, union_filed_identifier=union_filed_identifier, verbose=verbose
+    )))
+
+
+_PG_COLUMN_TYPES = {bool: 'BOOLEAN', int: 'BIGINT', float: 'DOUBLE PRECISION'}
+LOADED_REVISIONS_TABLE = 'loaded_revisions'
+
+
+def _columns_types(flat_fights: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Returns {column: postgres type} in order of columns' appearance. 
+    Type is taken from the first not None value of the column"""
+    columns_types = {}
+    for flat_fight in flat_fights:
+        for column, value in flat_fight.items():
+            if columns_types.get(column) is None:
+                columns_types[column] = None if value is None else _PG_COLUMN_TYPES.get(type(value), 'TEXT')
+    return {column: column_type or 'TEXT' for column, column_type in columns_types.items()}
+
+
+def loaded_revisions_ddl(schema: str) -> str:
+    """Returns statement, which creates schema.loaded_revisions (if it doesn't exist yet)"""
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{schema}"."{LOADED_REVISIONS_TABLE}" '
+        '(table_name TEXT PRIMARY KEY, revision BIGINT NOT NULL, loaded_at TIMESTAMP NOT NULL DEFAULT now())'
+    )
+
+
+def record_loaded_revision_sql(schema: str, table_name_param: str='%s', revision_param: str='%s') -> str:
+    """Returns statement, which records revision of the table in schema.loaded_revisions.
+    Params are placeholders of the driver (ex. '%s' for psycopg2 or '$1' and '$2' for asyncpg)"""
+    return (
+        f'INSERT INTO "{schema}"."{LOADED_REVISIONS_TABLE}" (table_name, revision) '
+        f'VALUES ({table_name_param}, {revision_param}) '
+        'ON CONFLICT (table_name) DO UPDATE SET revision = EXCLUDED.revision, loaded_at = now()'
+    )
+
+
+def record_loaded_revision(cursor: Any, schema: str, table_name: str, revision: int) -> None:
+    """Records which dataset revision (see manifest_utils.save_changes_to_minio) schema.table_name has"""
+    cursor.execute(loaded_revisions_ddl(schema=schema))
+    cursor.execute(record_loaded_revision_sql(schema=schema), (table_name, revision))
+
+
+def get_loaded_revision(
+        schema: str='raw_data',
+        table_name: str='all_fights_info',
+        engine: Optional[Engine]=None,
+    ) -> Optional[int]:
+    """Returns dataset revision loaded to schema.table_name or None if the table doesn't exist 
+    or was loaded without revision"""
+
+    if engine is None:
+        engine = get_pg_engine()
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            'SELECT to_regclass(%s), to_regclass(%s)', 
+            (f'"{schema}"."{table_name}"', f'"{schema}"."{LOADED_REVISIONS_TABLE}"')
+        )
+        table_exists, revisions_table_exists = cursor.fetchone()
+        if table_exists is None or revisions_table_exists is None:
+            return None
+        cursor.execute(
+            f'SELECT revision FROM "{schema}"."{LOADED_REVISIONS_TABLE}" WHERE table_name = %s', (table_name,)
+        )
+        row = cursor.fetchone()
+        return int(row[0]) if row is not None else None
+    finally:
+        connection.close()
+
+
+def _table_columns(cursor: Any, schema: str, table_name: str) -> List[str]:
+    """Returns columns of schema.table_name in their order (empty list if there is no such table)"""
+    cursor.execute(
+        'SELECT column_name FROM information_schema.columns '
+        'WHERE table_schema = %s AND table_name = %s ORDER BY ordinal_position', 
+        (schema, table_name)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _dependent_views(cursor: Any, schema: str, table_name: str) -> List[str]:
+    """Returns views and materialized views, which select from schema.table_name"""
+    cursor.execute(
+        'SELECT DISTINCT view_class.oid::regclass::text FROM pg_depend '
+        'JOIN pg_rewrite ON pg_rewrite.oid = pg_depend.objid '
+        'JOIN pg_class AS view_class ON view_class.oid = pg_rewrite.ev_class '
+        'WHERE pg_depend.refobjid = to_regclass(%s) AND view_class.oid <> pg_depend.refobjid', 
+        (f'"{schema}"."{table_name}"',)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _grants_and_indexes_sql(cursor: Any, schema: str, table_name: str) -> List[str]:
+    """Returns GRANT and CREATE INDEX statements, which give the table recreated under the same name 
+    the grants (except the owner's ones) and indexes of schema.table_name. Indexes of constraints 
+    are recreated as plain indexes, constraints themselves aren't recreated"""
+    table_sql = f'"{schema}"."{table_name}"'
+    cursor.execute(
+        "SELECT CASE WHEN acl.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(acl.grantee)) END, "
+        'acl.privilege_type, acl.is_grantable '
+        'FROM pg_class, aclexplode(pg_class.relacl) AS acl '
+        'WHERE pg_class.oid = to_regclass(%s) AND acl.grantee <> pg_class.relowner', 
+        (table_sql,)
+    )
+    statements = [
+        f'GRANT {privilege_type} ON {table_sql} TO {grantee}' + (' WITH GRANT OPTION' if is_grantable else '')
+        for grantee, privilege_type, is_grantable in cursor.fetchall()
+    ]
+    cursor.execute('SELECT indexdef FROM pg_indexes WHERE schemaname = %s AND tablename = %s', (schema, table_name))
+    statements.extend(row[0] for row in cursor.fetchall())
+    return statements
 
 
 def minio_data_to_postgres(
-        all_fights_list: List[Any],
+        all_fights_list: Iterable[Any],
         schema: str='raw_data',
         table_name: str='all_fights_info',
         engine: Optional[Engine]=None,
+        batch_size: int=10000,
+        revision: Optional[int]=None,
     ) -> None:
+    """Flattens fights with bfs_dict and replaces schema.table_name with them. Fights are flattened 
+    and streamed with COPY FROM STDIN by batch_size into <table_name>__staging table, so all_fights_list 
+    could be an iterator (ex. parse_all_fights.iter_fights()) and only one batch of flattened fights 
+    is in memory at a time. Columns, which appear only in later batches, are added to the staging table. 
+    Everything is done in one transaction, in which the staging table finally replaces schema.table_name, 
+    so readers see either the old or the new table, but never a half-loaded one. Grants and indexes 
+    of the replaced table are recreated on the new one (constraints aren't). 
+    If views depend on schema.table_name, it can't be dropped, so instead it's truncated and fights are 
+    copied right into it in the same transaction: views, grants, indexes and constraints stay in place 
+    and columns, which aren't in the new fights anymore, are left empty. 
+    Use upsert_fights_to_postgres to load only new and changed fights into the existing table
+    """
 
-    from sqlalchemy.schema import CreateSchema
+    if engine is None:
+        engine = get_pg_engine()
+
+    staging_table_name = f'{table_name}__staging'
+    flat_fights = iter_flat_fights(all_fights_list=all_fights_list)
+    table_columns = None
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+        if len(_dependent_views(cursor=cursor, schema=schema, table_name=table_name)) > 0:
+            load_table_name = table_name
+            table_columns = set(_table_columns(cursor=cursor, schema=schema, table_name=table_name))
+            cursor.execute(f'TRUNCATE "{schema}"."{table_name}"')
+        else:
+            load_table_name = staging_table_name
+            restore_statements = _grants_and_indexes_sql(cursor=cursor, schema=schema, table_name=table_name)
+            cursor.execute(f'DROP TABLE IF EXISTS "{schema}"."{staging_table_name}"')
+        while True:
+            batch = list(islice(flat_fights, batch_size))
+            if len(batch) == 0 and table_columns is not None:
+                break
+            batch_columns = _columns_types(batch)
+            new_columns_ddl = [
+                f'"{column}" {column_type}' for column, column_type in batch_columns.items()
+                if table_columns is None or column not in table_columns
+            ]
+            if table_columns is None:
+                cursor.execute(f'CREATE TABLE "{schema}"."{load_table_name}" ({", ".join(new_columns_ddl)})')
+            else:
+                for column_ddl in new_columns_ddl:
+                    cursor.execute(f'ALTER TABLE "{schema}"."{load_table_name}" ADD COLUMN {column_ddl}')
+            table_columns = (table_columns or set()) | set(batch_columns)
+            if len(batch) > 0:
+                copy_rows(
+                    cursor=cursor, 
+                    table_sql=f'"{schema}"."{load_table_name}"', 
+                    columns=list(batch_columns), 
+                    rows=batch,
+                )
+            if len(batch) < batch_size:
+                break
+        if load_table_name == staging_table_name:
+            cursor.execute(f'DROP TABLE IF EXISTS "{schema}"."{table_name}"')
+            cursor.execute(f'ALTER TABLE "{schema}"."{staging_table_name}" RENAME TO "{table_name}"')
+            for statement in restore_statements:
+                cursor.execute(statement)
+        if 'fight_uri' in table_columns:
+            # natural key, which upsert_fights_to_postgres relies on
+            cursor.execute(
+                f'CREATE UNIQUE INDEX IF NOT EXISTS "{table_name}_fight_uri_key" '
+                f'ON "{schema}"."{table_name}" ("fight_uri")'
+            )
+        if revision is not None:
+            record_loaded_revision(cursor=cursor, schema=schema, table_name=table_name, revision=revision)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return
+
+
+def upsert_fights_to_postgres(
+        all_fights_list: Iterable[Any],
+        schema: str='raw_data',
+        table_name: str='all_fights_info',
+        engine: Optional[Engine]=None,
+        batch_size: int=10000,
+        revision: Optional[int]=None,
+    ) -> int:
+    """Inserts new fights and updates changed ones (matched by fight_uri) in existing schema.table_name 
+    (created by minio_data_to_postgres), so the table, its indexes, grants and dependent views stay in place. 
+    Fights are flattened with bfs_dict and streamed with COPY FROM STDIN by batch_size into a temporary table, 
+    from which they are upserted with INSERT ... ON CONFLICT (fight_uri). Rows, which haven't changed, 
+    aren't rewritten. Everything is done in one transaction
+
+    Args:
+        all_fights_list: list or iterator of new and changed fights 
+            (ex. manifest_utils.load_changes_from_minio(since_revision=get_loaded_revision()))
+        schema: table's schema
+        table_name: table to upsert fights to
+        engine: sqlalchemy engine
+        batch_size: how many fights are upserted at once
+        revision: if given - it's recorded as the table's revision (see get_loaded_revision)
+    Returns:
+        int: number of inserted and updated fights (fights, which haven't changed, aren't counted)
+    """
 
     if engine is None:
         engine = get_pg_engine()
 
-    if not engine.dialect.has_schema(engine, schema):
-        engine.execute(CreateSchema(schema))
+    table_sql = f'"{schema}"."{table_name}"'
+    staging_table_sql = f'pg_temp."{table_name}__upsert"'
+    flat_fights = iter_flat_fights(all_fights_list=all_fights_list, verbose=False)
+    n_upserted = 0
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        table_columns = _table_columns(cursor=cursor, schema=schema, table_name=table_name)
+        assert len(table_columns) > 0, f'{schema}.{table_name} should exist, use minio_data_to_postgres to create it!'
+        cursor.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{table_name}_fight_uri_key" ON {table_sql} ("fight_uri")')
+        while True:
+            batch = list(islice(flat_fights, batch_size))
+            if len(batch) == 0:
+                break
+            # one INSERT can't update the same row twice, so only the latest version of the fight is kept
+            unique_batch = list({flat_fight['fight_uri']: flat_fight for flat_fight in batch}.values())
+            batch_columns = _columns_types(unique_batch)
+            for column, column_type in batch_columns.items():
+                if column not in table_columns:
+                    cursor.execute(f'ALTER TABLE {table_sql} ADD COLUMN "{column}" {column_type}')
+                    table_columns.append(column)
 
-    res_df = minio_data_to_pandas(all_fights_list=all_fights_list)
-    res_df.to_sql(
-        name=table_name,
-        con=engine,
-        schema=schema,
-        if_exists='replace',
-        index=False
-    )
-    return 
+            cursor.execute(f'DROP TABLE IF EXISTS {staging_table_sql}')
+            cursor.execute(f'CREATE TEMP TABLE {staging_table_sql} (LIKE {table_sql}) ON COMMIT DROP')
+            copy_rows(cursor=cursor, table_sql=staging_table_sql, columns=list(batch_columns), rows=unique_batch)
+            columns_sql = ', '.join(f'"{column}"' for column in table_columns)
+            excluded_columns_sql = ', '.join(f'EXCLUDED."{column}"' for column in table_columns)
+            table_columns_sql = ', '.join(f'target."{column}"' for column in table_columns)
+            cursor.execute(
+                f'INSERT INTO {table_sql} AS target ({columns_sql}) SELECT {columns_sql} FROM {staging_table_sql} '
+                f'ON CONFLICT ("fight_uri") DO UPDATE SET ({columns_sql}) = ROW({excluded_columns_sql}) '
+                f'WHERE ROW({table_columns_sql}) IS DISTINCT FROM ROW({excluded_columns_sql})'
+            )
+            # rows, which haven't changed, are skipped by the WHERE and aren't counted
+            n_upserted += cursor.rowcount
+            if len(batch) < batch_size:
+                break
+        if revision is not None:
+            record_loaded_revision(cursor=cursor, schema=schema, table_name=table_name, revision=revision)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return n_upserted
@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import math
+import typing as t
+
+if 'PYTHONPATH' in os.environ:
+	PROJECT_PATH = os.environ["PYTHONPATH"]
+	sys.path.insert(0, PROJECT_PATH)
+else:
+	PROJECT_PATH = '..'
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+SERIALIZATIONS = ('json', 'msgpack')
+
+
+def _has_non_finite_floats(obj: t.Any) -> bool:
+    """Whether there is NaN or +-Infinity anywhere in json-like obj"""
+    stack = [obj]
+    while len(stack) > 0:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+def dumps_json(obj: t.Any, indent: t.Optional[int]=None) -> bytes:
+    """Returns the same bytes as json.dumps(obj, ensure_ascii=False, indent=indent).encode('utf-8')
+    (with compact separators when indent is None), but several times faster when orjson is installed.
+    The only difference is that orjson writes floats in exponent form without '+' (1e16 instead of 1e+16),
+    which parsed fights don't have. Objects orjson can't encode (ex. ints over 64 bits) and objects 
+    with NaN or Infinity (which orjson silently writes as null) are encoded with json"""
+    if orjson is not None and indent in (None, 2):
+        try:
+            content = orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent == 2 else 0)
+            # the object is walked only if there are nulls, which could be NaN or Infinity
+            if b'null' not in content or not _has_non_finite_floats(obj):
+                return content
+        except TypeError:
+            pass
+    separators = (',', ':') if indent is None else None
+    return json.dumps(obj, ensure_ascii=False, indent=indent, separators=separators).encode('utf-8')
+
+
+def loads_json(content: t.Union[bytes, str]) -> t.Any:
+    """json.loads, but with orjson when it's installed"""
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # ints over 64 bits, NaN, etc. which json can still read
+            pass
+    return json.loads(content)
+
+
+def is_msgpack(content: bytes) -> bool:
+    """Whether content is msgpack encoded array or map. Json text never starts with these bytes,
+    so msgpack and json objects can be told apart without any metadata"""
+    return len(content) > 0 and (0x80 <= content[0] <= 0x9f or content[0] in (0xdc, 0xdd, 0xde, 0xdf))
+
+
+def _check_msgpack() -> None:
+    assert msgpack is not None, 'msgpack should be installed to use msgpack serialization!'
+
+
+def dumps_msgpack(obj: t.Any) -> bytes:
+    """Compact binary encoding of json-like obj. loads_msgpack(dumps_msgpack(obj)) == obj for json-like obj
+    (tuples become lists just like with json)"""
+    _check_msgpack()
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def loads_msgpack(content: bytes) -> t.Any:
+    _check_msgpack()
+    return msgpack.unpackb(content, raw=False, strict_map_key=False)
+
+
+def iter_msgpack_chunks(obj: t.Any) -> t.Iterator[bytes]:
+    """Encodes obj to msgpack piece by piece: lists and tuples element by element, everything else at once.
+    The result is the same as dumps_msgpack(obj)"""
+    _check_msgpack()
+    if not isinstance(obj, (list, tuple)):
+        yield dumps_msgpack(obj)
+        return
+    packer = msgpack.Packer(use_bin_type=True)
+    yield packer.pack_array_header(len(obj))
+    for element in obj:
+        yield packer.pack(element)
+
+
+def iter_msgpack_array(chunks: t.Iterable[bytes]) -> t.Iterator[t.Any]:
+    """Incrementally parses msgpack array, which comes in chunks of bytes, and yields its elements one by one
+    (msgpack counterpart of minio_utils.iter_json_array)"""
+    _check_msgpack()
+    chunks = iter(chunks)
+    unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+
+    def read(method: t.Callable[[], t.Any]) -> t.Any:
+        while True:
+            try:
+                return method()
+            except msgpack.OutOfData:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    raise ValueError('Unexpected end of msgpack array!')
+                unpacker.feed(chunk)
+
+    n_elements = read(unpacker.read_array_header)
+    for _ in range(n_elements):
+        yield read(unpacker.unpack)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# modules import each other as src.<module>, like with PYTHONPATH=$PWD (see Readme)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
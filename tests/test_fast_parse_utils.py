@@ -0,0 +1,59 @@
+"""parse_one_fight_page_fast should give exactly what parse_one_fight_page gives.
+Pages in fixtures/fight_pages follow ufcstats.com fight page markup: utf-8 pages with 
+non-ascii names, latin-1 pages with and without declared charset and a page without 
+per round statistics (like fights from the first events)"""
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from src.parse_utils import parse_one_fight_page
+from src.fast_parse_utils import parse_one_fight_page_fast
+
+
+FIGHT_PAGES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'fight_pages')
+FIGHT_PAGES = sorted(os.listdir(FIGHT_PAGES_DIR))
+
+
+def read_fight_page(name: str) -> bytes:
+    with open(os.path.join(FIGHT_PAGES_DIR, name), mode='rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('name', FIGHT_PAGES)
+def test_fast_parser_matches_bs4_parser(name, capsys):
+    content = read_fight_page(name)
+
+    expected = parse_one_fight_page(one_fight_page=BeautifulSoup(content, 'lxml'))
+    expected_output = capsys.readouterr().out
+    result = parse_one_fight_page_fast(content)
+    output = capsys.readouterr().out
+
+    assert result == expected
+    assert output == expected_output
+
+
+@pytest.mark.parametrize('name, names', [
+    ('title_bout_utf8.html', ['Jiří Procházka', 'Glover Teixeira']),
+    ('decision_latin1.html', ['José Aldo', 'Rob Font']),
+])
+def test_fast_parser_decodes_names(name, names):
+    result = parse_one_fight_page_fast(read_fight_page(name))
+
+    assert result['names'] == names
+    assert list(result['winloose']) == names
+    assert result['per_round_stats']['Round 1']['Fighter'] == names
+
+
+def test_fast_parser_decodes_undeclared_latin1():
+    result = parse_one_fight_page_fast(read_fight_page('decision_undeclared_latin1.html'))
+
+    assert result['Referee:'] == 'Mike Beltrán'
+
+
+def test_fast_parser_without_round_stats(capsys):
+    result = parse_one_fight_page_fast(read_fight_page('missing_round_stats.html'))
+
+    assert 'per_round_stats' not in result
+    assert result['names'] == ['Royce Gracie', 'Art Jimmerson']
+    assert "can't get per round statistics!" in capsys.readouterr().out
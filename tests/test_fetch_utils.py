@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.fetch_utils import CachingFetcher, PageCache, PageFetcher
+
+
+URL = 'http://www.ufcstats.com/fight-details/72c3e5eacde4f0e5'
+
+
+class DictFetcher(PageFetcher):
+    """Serves pages from a dict and counts downloads"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.n_get = 0
+
+    def get(self, url: str) -> bytes:
+        self.n_get += 1
+        return self.pages[url]
+
+
+class ConditionalDictFetcher(DictFetcher):
+    """Serves pages from a dict with ETags and answers 304 when If-None-Match matches"""
+
+    def __init__(self, pages):
+        super().__init__(pages)
+        self.requests_headers = []
+
+    def fetch(self, url, headers=None):
+        self.requests_headers.append(headers)
+        etag = f'"{len(self.pages[url])}"'
+        if headers is not None and headers.get('If-None-Match') == etag:
+            return SimpleNamespace(status_code=304, content=b'', headers={}, url=url)
+        return SimpleNamespace(status_code=200, content=self.pages[url], headers={'ETag': etag}, url=url)
+
+
+def test_caching_fetcher_revalidates_with_fetch(tmp_path):
+    fetcher = ConditionalDictFetcher({URL: b'<html>fight</html>'})
+    caching_fetcher = CachingFetcher(cache=PageCache(cache_dir=str(tmp_path)), fetcher=fetcher, revalidate=True)
+
+    assert caching_fetcher.get(URL) == b'<html>fight</html>'
+    assert caching_fetcher.get(URL) == b'<html>fight</html>'
+    fetcher.pages[URL] = b'<html>changed fight</html>'
+    assert caching_fetcher.get(URL) == b'<html>changed fight</html>'
+
+    assert fetcher.requests_headers == [None, {'If-None-Match': '"18"'}, {'If-None-Match': '"18"'}]
+    assert fetcher.n_get == 0
+
+
+def test_caching_fetcher_without_fetch(tmp_path):
+    fetcher = DictFetcher({URL: b'<html>fight</html>'})
+    caching_fetcher = CachingFetcher(cache=PageCache(cache_dir=str(tmp_path)), fetcher=fetcher)
+
+    assert caching_fetcher.get(URL) == b'<html>fight</html>'
+    assert caching_fetcher.get(URL) == b'<html>fight</html>'
+    assert fetcher.n_get == 1
+
+
+def test_caching_fetcher_rejects_revalidation_without_fetch(tmp_path):
+    with pytest.raises(AssertionError, match="DictFetcher doesn't implement fetch"):
+        CachingFetcher(cache=PageCache(cache_dir=str(tmp_path)), fetcher=DictFetcher({}), revalidate=True)
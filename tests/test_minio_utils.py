@@ -0,0 +1,167 @@
+import os
+import re
+import json
+import inspect
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+
+import minio
+from src.minio_utils import (
+    MinioObjectCache, 
+    _check_multipart_api_version, 
+    iter_json_from_minio, 
+    load_json_from_minio, 
+    save_json_to_minio,
+)
+from src.serialization_utils import msgpack, iter_msgpack_chunks
+
+
+class FakeResponse:
+    def __init__(self, content: bytes):
+        self.content = content
+        self.headers = {}
+
+    def stream(self, chunk_size: int):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+class FakeMinio:
+    """Serves objects from a dict and counts get_object calls"""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.n_get_object = 0
+
+    def stat_object(self, bucket_name, object_name, version_id=None):
+        return SimpleNamespace(etag=hashlib.md5(self.objects[object_name]).hexdigest(), version_id=None)
+
+    def get_object(self, bucket_name, object_name, version_id=None, request_headers=None):
+        self.n_get_object += 1
+        return FakeResponse(self.objects[object_name])
+
+    def put_object(self, bucket_name, object_name, data, length, content_type=None, metadata=None):
+        self.objects[object_name] = data.read(length)
+
+    # private multipart upload methods with the signatures of minio 7.1 and 7.2
+    def _create_multipart_upload(self, bucket_name, object_name, headers):
+        self.uploads = getattr(self, 'uploads', {})
+        upload_id = str(len(self.uploads))
+        self.uploads[upload_id] = {}
+        return upload_id
+
+    def _upload_part(self, bucket_name, object_name, data, headers, upload_id, part_number):
+        self.uploads[upload_id][part_number] = data
+        return hashlib.md5(data).hexdigest()
+
+    def _complete_multipart_upload(self, bucket_name, object_name, upload_id, parts):
+        uploaded_parts = self.uploads.pop(upload_id)
+        self.objects[object_name] = b''.join(uploaded_parts[part.part_number] for part in parts)
+
+    def _abort_multipart_upload(self, bucket_name, object_name, upload_id):
+        self.uploads.pop(upload_id)
+
+
+FIGHTS = [{'fight_uri': f'http://www.ufcstats.com/fight-details/{i}', 'rounds': list(range(i))} for i in range(50)]
+
+
+@pytest.mark.parametrize('content', [
+    json.dumps(FIGHTS, indent=2).encode('utf-8'),
+    json.dumps(FIGHTS).encode('utf-8') + b'\n',
+    pytest.param(
+        msgpack.packb(FIGHTS) if msgpack is not None else b'',
+        marks=pytest.mark.skipif(msgpack is None, reason='msgpack is not installed'),
+    ),
+], ids=['json', 'json_with_trailing_newline', 'msgpack'])
+def test_iter_json_from_minio_fills_cache(tmp_path, content):
+    minio_client = FakeMinio({'ufc_stats.json': content})
+    cache = MinioObjectCache(cache_dir=str(tmp_path))
+
+    for _ in range(2):
+        assert list(iter_json_from_minio(
+            minio_client=minio_client, object_name='ufc_stats.json', chunk_size=100, cache=cache
+        )) == FIGHTS
+    assert minio_client.n_get_object == 1
+
+
+requires_msgpack = pytest.mark.skipif(msgpack is None, reason='msgpack is not installed')
+
+
+@requires_msgpack
+def test_iter_msgpack_chunks_packs_list_element_by_element():
+    chunks = list(iter_msgpack_chunks(FIGHTS))
+
+    assert len(chunks) == len(FIGHTS) + 1
+    assert b''.join(chunks) == msgpack.packb(FIGHTS)
+
+
+@requires_msgpack
+def test_save_json_to_minio_msgpack(tmp_path):
+    minio_client = FakeMinio({})
+
+    save_json_to_minio(obj=FIGHTS, minio_client=minio_client, object_name='ufc_stats.msgpack', serialization='msgpack')
+
+    assert minio_client.objects['ufc_stats.msgpack'] == msgpack.packb(FIGHTS)
+    assert load_json_from_minio(minio_client=minio_client, object_name='ufc_stats.msgpack') == FIGHTS
+
+
+@requires_msgpack
+def test_save_json_to_minio_msgpack_rejects_iterators():
+    minio_client = FakeMinio({})
+
+    with pytest.raises(AssertionError, match='length upfront'):
+        save_json_to_minio(
+            obj=iter(FIGHTS), minio_client=minio_client, object_name='ufc_stats.msgpack', serialization='msgpack'
+        )
+    assert minio_client.objects == {}
+
+
+def test_save_json_to_minio_multipart():
+    minio_client = FakeMinio({})
+
+    save_json_to_minio(obj=FIGHTS, minio_client=minio_client, object_name='ufc_stats.json', part_size=1000)
+
+    assert len(minio_client.objects['ufc_stats.json']) > 1000
+    assert json.loads(minio_client.objects['ufc_stats.json']) == FIGHTS
+    assert minio_client.uploads == {}
+
+
+def test_multipart_api_supports_pinned_minio():
+    requirements_path = os.path.join(os.path.dirname(__file__), '..', 'requirements.txt')
+    with open(requirements_path, mode='r', encoding='utf-8') as f:
+        pinned_version = re.search(r'^minio==(\S+)$', f.read(), flags=re.MULTILINE).group(1)
+
+    _check_multipart_api_version(pinned_version)
+
+
+def test_multipart_api_rejects_unchecked_minio():
+    with pytest.raises(RuntimeError, match='minio 8.0.0 is installed'):
+        _check_multipart_api_version('8.0.0')
+
+
+@pytest.mark.parametrize('method_name, parameters', [
+    ('_create_multipart_upload', ['self', 'bucket_name', 'object_name', 'headers']),
+    ('_upload_part', ['self', 'bucket_name', 'object_name', 'data', 'headers', 'upload_id', 'part_number']),
+    ('_list_parts', ['self', 'bucket_name', 'object_name', 'upload_id', 'max_parts', 'part_number_marker']),
+    ('_complete_multipart_upload', ['self', 'bucket_name', 'object_name', 'upload_id', 'parts']),
+    ('_abort_multipart_upload', ['self', 'bucket_name', 'object_name', 'upload_id']),
+])
+def test_installed_minio_multipart_api(method_name, parameters):
+    """Fails loudly when minio is upgraded to a version, which is supported by the version check, 
+    but whose private methods _MultipartApi calls have changed"""
+    _check_multipart_api_version(minio.__version__)
+    signature = inspect.signature(getattr(minio.Minio, method_name))
+
+    assert list(signature.parameters)[:len(parameters)] == parameters
+    assert all(
+        parameter.default is not inspect.Parameter.empty 
+        for parameter in list(signature.parameters.values())[len(parameters):]
+    )
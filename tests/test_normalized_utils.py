@@ -0,0 +1,30 @@
+from src.normalized_utils import fighter_career_sql
+
+
+METHODS_CONDITIONS = [
+    "fights.method LIKE 'TKO%'",
+    "fights.method LIKE 'Submission%'",
+    "fights.method LIKE 'Decision%'",
+]
+
+
+def test_fighter_career_sql():
+    statements = fighter_career_sql()
+
+    assert not any('starts_with' in statement for statement in statements)
+    assert all(condition in statements[1] for condition in METHODS_CONDITIONS)
+
+
+def test_fighter_career_sql_psycopg2_param():
+    """psycopg2 formats statements with parameters like python's %"""
+    statements = [statement % ("'{}'",) for statement in fighter_career_sql(fighters_param='%s')]
+
+    assert all("WHERE fighter = ANY('{}')" in statement for statement in statements)
+    assert all(condition in statements[1] for condition in METHODS_CONDITIONS)
+
+
+def test_fighter_career_sql_asyncpg_param():
+    statements = fighter_career_sql(fighters_param='$1::text[]')
+
+    assert all('WHERE fighter = ANY($1::text[])' in statement for statement in statements)
+    assert all(condition in statements[1] for condition in METHODS_CONDITIONS)
@@ -0,0 +1,72 @@
+"""Events listing pages in fixtures/events_list follow ufcstats.com markup: page 1 starts with 
+header, empty spacer row and the upcoming event, page 2 starts with header and right away with events"""
+import os
+
+from bs4 import BeautifulSoup
+
+from src.fetch_utils import PageFetcher
+from src.parse_utils import parse_events_list_page, get_new_events_list
+
+
+EVENTS_LIST_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'events_list')
+EVENTS_PAGE_URL_TEMPLATE = 'http://www.ufcstats.com/statistics/events/completed?page={page}'
+EVENT_URL_TEMPLATE = 'http://www.ufcstats.com/event-details/a1b2c3d4e5f6000{}'
+
+
+def read_events_list_page(page: int) -> bytes:
+    with open(os.path.join(EVENTS_LIST_DIR, f'completed_page_{page}.html'), mode='rb') as f:
+        return f.read()
+
+
+class DictFetcher(PageFetcher):
+    """Serves pages from a dict and remembers requested urls"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested_urls = []
+
+    def get(self, url: str) -> bytes:
+        self.requested_urls.append(url)
+        return self.pages[url]
+
+
+def test_parse_events_list_first_page():
+    events_list, status_ok = parse_events_list_page(
+        events_list_page=BeautifulSoup(read_events_list_page(1), 'lxml')
+    )
+
+    assert status_ok
+    assert [event['event_url'] for event in events_list] == [EVENT_URL_TEMPLATE.format(i) for i in (1, 2, 3)]
+    assert events_list[0] == {
+        'event_url': EVENT_URL_TEMPLATE.format(1),
+        'event_name': 'UFC Fight Night: Oliveira vs. Gamrot',
+        'date': 'October 11, 2025',
+        'location': 'Rio de Janeiro, Rio de Janeiro, Brazil',
+    }
+
+
+def test_parse_events_list_next_page_keeps_first_event():
+    events_list, status_ok = parse_events_list_page(
+        events_list_page=BeautifulSoup(read_events_list_page(2), 'lxml')
+    )
+
+    assert status_ok
+    assert [event['event_url'] for event in events_list] == [EVENT_URL_TEMPLATE.format(i) for i in (4, 5, 6)]
+    assert events_list[0]['event_name'] == 'UFC Fight Night: Lopes vs. Silva'
+
+
+def test_get_new_events_list_walks_pages():
+    fetcher = DictFetcher({
+        EVENTS_PAGE_URL_TEMPLATE.format(page=1): read_events_list_page(1),
+        EVENTS_PAGE_URL_TEMPLATE.format(page=2): read_events_list_page(2),
+    })
+
+    events_list, status_ok = get_new_events_list(
+        known_events_set={EVENT_URL_TEMPLATE.format(5)},
+        events_page_url_template=EVENTS_PAGE_URL_TEMPLATE,
+        fetcher=fetcher,
+    )
+
+    assert status_ok
+    assert [event['event_url'] for event in events_list] == [EVENT_URL_TEMPLATE.format(i) for i in (1, 2, 3, 4)]
+    assert fetcher.requested_urls == [EVENTS_PAGE_URL_TEMPLATE.format(page=page) for page in (1, 2)]